@@ -0,0 +1,130 @@
+# Archivo de datos históricos.
+# Los lotes vencidos hace tiempo y los pedidos cerrados (recibidos o cancelados) antiguos se mueven
+# a tablas de archivo (`models.LoteStockArchivado`, `models.PedidoArchivado`,
+# `models.DetallePedidoArchivado`) en la misma base de datos. Así las tablas activas, que recorren
+# el stock global, los avisos de vencimiento y las listas de pedidos, no crecen sin límite, y los
+# reportes solo leen el archivo cuando el rango pedido lo necesita (ver crud.obtener_costos_pedidos_por_mes_anio).
+#
+# Uso (desde el directorio gestion_medicamentos):
+#   python -m app.archivo --meses 12
+
+import argparse
+import os
+from datetime import date
+from typing import Dict, List, Optional
+
+from sqlalchemy import Date, delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Antigüedad mínima (en meses) para archivar y filas movidas por transacción.
+MESES_ARCHIVO = int(os.environ.get("GESTION_MEDICAMENTOS_MESES_ARCHIVO", "12"))
+TAMANO_BLOQUE_ARCHIVO = int(os.environ.get("GESTION_MEDICAMENTOS_TAMANO_BLOQUE_ARCHIVO", "1000"))
+
+ESTADOS_CERRADOS = (models.EstadoPedido.RECIBIDO, models.EstadoPedido.CANCELADO)
+
+def fecha_corte(meses: int = MESES_ARCHIVO, hoy: Optional[date] = None) -> date:
+    """Fecha de hace `meses` meses (el día se ajusta al último del mes si no existe, ej. 31 -> 30)."""
+    hoy = hoy or date.today()
+    total = hoy.year * 12 + (hoy.month - 1) - meses
+    anio, mes = divmod(total, 12)
+    mes += 1
+    for dia in (hoy.day, 30, 29, 28):
+        try:
+            return date(anio, mes, dia)
+        except ValueError:
+            continue
+    return date(anio, mes, 28)
+
+def _mover(db: Session, origen, destino, ids: List[int], hoy: date, columna_id=None):
+    """Copia las filas de `origen` con esos ids a `destino` (añadiendo la fecha de archivado) y las borra."""
+    tabla_origen = origen.__table__
+    tabla_destino = destino.__table__
+    columna_id = columna_id if columna_id is not None else tabla_origen.c.id
+    columnas = [c.name for c in tabla_destino.columns if c.name != "fecha_archivado"]
+    db.execute(
+        insert(tabla_destino).from_select(
+            columnas + ["fecha_archivado"],
+            select(*[tabla_origen.c[nombre] for nombre in columnas], literal(hoy, Date()))
+            .where(columna_id.in_(ids))
+        )
+    )
+    db.execute(delete(tabla_origen).where(columna_id.in_(ids)))
+
+def archivar_lotes(db: Session, corte: date, hoy: date, tamano_bloque: int = TAMANO_BLOQUE_ARCHIVO) -> int:
+    """Mueve al archivo los lotes que vencieron antes de `corte`. Devuelve la cantidad archivada."""
+    tabla = models.LoteStock.__table__
+    total = 0
+    while True:
+        ids = db.execute(
+            select(tabla.c.id).where(tabla.c.fecha_vencimiento_lote < corte).order_by(tabla.c.id).limit(tamano_bloque)
+        ).scalars().all()
+        if not ids:
+            return total
+        _mover(db, models.LoteStock, models.LoteStockArchivado, ids, hoy)
+        db.commit() # Un bloque por transacción: no se bloquea la base de datos durante todo el proceso
+        total += len(ids)
+
+def archivar_pedidos(db: Session, corte: date, hoy: date, tamano_bloque: int = TAMANO_BLOQUE_ARCHIVO) -> Dict[str, int]:
+    """
+    Mueve al archivo los pedidos recibidos o cancelados con fecha anterior a `corte`, junto con sus detalles.
+    Los pedidos pendientes nunca se archivan, por antiguos que sean.
+    """
+    tabla = models.Pedido.__table__
+    tabla_detalles = models.DetallePedido.__table__
+    totales = {"pedidos": 0, "detalles_pedido": 0}
+    while True:
+        ids = db.execute(
+            select(tabla.c.id)
+            .where(tabla.c.fecha_pedido < corte, tabla.c.estado.in_(ESTADOS_CERRADOS))
+            .order_by(tabla.c.id).limit(tamano_bloque)
+        ).scalars().all()
+        if not ids:
+            return totales
+        # Primero los detalles (referencian al pedido), luego el pedido, en la misma transacción.
+        detalles = _contar(db, tabla_detalles, tabla_detalles.c.pedido_id.in_(ids))
+        _mover(db, models.DetallePedido, models.DetallePedidoArchivado, ids, hoy, columna_id=tabla_detalles.c.pedido_id)
+        _mover(db, models.Pedido, models.PedidoArchivado, ids, hoy)
+        db.commit()
+        totales["pedidos"] += len(ids)
+        totales["detalles_pedido"] += detalles
+
+def _contar(db: Session, tabla, condicion) -> int:
+    return db.execute(select(func.count()).select_from(tabla).where(condicion)).scalar() or 0
+
+def archivar(db: Session, meses: int = MESES_ARCHIVO, hoy: Optional[date] = None,
+             tamano_bloque: int = TAMANO_BLOQUE_ARCHIVO) -> Dict[str, int]:
+    """
+    Archiva los lotes vencidos y los pedidos cerrados con más de `meses` meses de antigüedad.
+    Es idempotente: volver a ejecutarlo solo mueve lo que haya quedado por debajo del corte desde entonces.
+    """
+    hoy = hoy or date.today()
+    corte = fecha_corte(meses, hoy)
+    resultado = {"lotes_stock": archivar_lotes(db, corte, hoy, tamano_bloque)}
+    resultado.update(archivar_pedidos(db, corte, hoy, tamano_bloque))
+    return resultado
+
+def main():
+    from .database import SessionLocal, engine
+    from .migraciones import migrar
+
+    parser = argparse.ArgumentParser(description="Mueve lotes vencidos y pedidos cerrados antiguos a las tablas de archivo.")
+    parser.add_argument("--meses", type=int, default=MESES_ARCHIVO,
+                        help=f"Antigüedad mínima en meses (por defecto {MESES_ARCHIVO}).")
+    parser.add_argument("--tamano-bloque", type=int, default=TAMANO_BLOQUE_ARCHIVO,
+                        help="Filas movidas por transacción.")
+    args = parser.parse_args()
+    if args.meses < 1:
+        parser.error("--meses debe ser al menos 1.")
+
+    migrar(engine) # Crea las tablas de archivo si aún no existen
+    db = SessionLocal()
+    try:
+        resultado = archivar(db, args.meses, tamano_bloque=args.tamano_bloque)
+    finally:
+        db.close()
+    print(f"Corte: {fecha_corte(args.meses)}. Archivados: " + ", ".join(f"{k}={v}" for k, v in resultado.items()))
+
+if __name__ == "__main__":
+    main()
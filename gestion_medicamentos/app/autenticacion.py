@@ -0,0 +1,256 @@
+# Autenticación de la web: almacén de usuarios con contraseñas hasheadas, caché de verificaciones
+# y cookies de sesión firmadas.
+#
+# - Las contraseñas se guardan con PBKDF2-HMAC-SHA256 y sal aleatoria (formato
+#   'pbkdf2_sha256$iteraciones$sal$hash'). Verificar una cuesta decenas de milisegundos a propósito.
+# - Una verificación correcta se recuerda durante CACHE_TTL_SEGUNDOS, indexada por un HMAC de
+#   (usuario, contraseña) con una clave aleatoria del proceso: la contraseña en claro nunca se guarda.
+# - Tras la primera verificación la web entrega una cookie firmada con HMAC; mientras sea válida,
+#   las peticiones se autentican comprobando la firma (un HMAC, sin PBKDF2 ni caché).
+#
+# El backend es intercambiable: cualquier objeto con `obtener(nombre) -> Optional[Usuario]` sirve
+# (ver `cargar_backend`). Para el archivo de usuarios:
+#   python -m app.autenticacion agregar maria --hogar garcia
+
+import argparse
+import base64
+import getpass
+import hashlib
+import hmac
+import importlib
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+ALGORITMO = "pbkdf2_sha256"
+ITERACIONES = int(os.environ.get("GESTION_MEDICAMENTOS_PBKDF2_ITERACIONES", "200000"))
+
+ARCHIVO_USUARIOS = os.environ.get("GESTION_MEDICAMENTOS_ARCHIVO_USUARIOS")
+BACKEND_AUTENTICACION = os.environ.get("GESTION_MEDICAMENTOS_BACKEND_AUTENTICACION") # 'modulo:Clase'
+
+CACHE_TTL_SEGUNDOS = int(os.environ.get("GESTION_MEDICAMENTOS_CACHE_AUTENTICACION_TTL", "300"))
+CACHE_MAX_ENTRADAS = 10000
+
+COOKIE_SESION = "gm_sesion"
+DURACION_SESION_SEGUNDOS = int(os.environ.get("GESTION_MEDICAMENTOS_DURACION_SESION", str(8 * 3600)))
+# Con varios workers o reinicios hay que fijar la clave; si no, cada proceso genera la suya y las
+# cookies de otro proceso simplemente no validan (se vuelve a pedir la contraseña, nada más).
+CLAVE_SESION = os.environ.get("GESTION_MEDICAMENTOS_CLAVE_SESION", "").encode("utf8") or secrets.token_bytes(32)
+
+def _b64(datos: bytes) -> str:
+    return base64.urlsafe_b64encode(datos).decode("ascii").rstrip("=")
+
+def _desde_b64(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+def hashear_clave(clave: str, iteraciones: int = ITERACIONES) -> str:
+    sal = secrets.token_bytes(16)
+    derivada = hashlib.pbkdf2_hmac("sha256", clave.encode("utf8"), sal, iteraciones)
+    return f"{ALGORITMO}${iteraciones}${_b64(sal)}${_b64(derivada)}"
+
+def comprobar_clave(clave: str, hash_guardado: str) -> bool:
+    try:
+        algoritmo, iteraciones, sal, esperado = hash_guardado.split("$")
+        if algoritmo != ALGORITMO:
+            return False
+        derivada = hashlib.pbkdf2_hmac("sha256", clave.encode("utf8"), _desde_b64(sal), int(iteraciones))
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(derivada, _desde_b64(esperado))
+
+class Usuario:
+    def __init__(self, nombre: str, hash_clave: str, hogar: Optional[str] = None):
+        self.nombre = nombre
+        self.hash_clave = hash_clave
+        self.hogar = hogar # Con varios hogares (app/hogares.py), el único al que puede acceder; None = todos
+
+class BackendUsuarioUnico:
+    """Un solo usuario configurado en el código (el comportamiento original de main_web.py)."""
+
+    def __init__(self, nombre: str, clave: str):
+        self._nombre = nombre
+        self._clave = clave
+        self._usuario: Optional[Usuario] = None
+
+    def obtener(self, nombre: str) -> Optional[Usuario]:
+        if not hmac.compare_digest(nombre.encode("utf8"), self._nombre.encode("utf8")):
+            return None
+        if self._usuario is None: # Se hashea en el primer uso, no al importar main_web
+            self._usuario = Usuario(self._nombre, hashear_clave(self._clave))
+        return self._usuario
+
+class BackendArchivoUsuarios:
+    """
+    Usuarios en un archivo de texto, una línea 'usuario:hash[:hogar]' por usuario ('#' para comentarios).
+    El archivo se vuelve a leer si cambia su fecha de modificación, sin reiniciar la web.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._usuarios: Dict[str, Usuario] = {}
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _recargar_si_cambio(self):
+        try:
+            mtime = os.stat(self.ruta).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            self._usuarios = leer_archivo_usuarios(self.ruta)
+            self._mtime = mtime
+        CACHE_VERIFICACIONES.limpiar() # Una contraseña cambiada o un usuario borrado deja de valer al instante
+
+    def obtener(self, nombre: str) -> Optional[Usuario]:
+        self._recargar_si_cambio()
+        return self._usuarios.get(nombre)
+
+def leer_archivo_usuarios(ruta: str) -> Dict[str, Usuario]:
+    usuarios: Dict[str, Usuario] = {}
+    if not os.path.exists(ruta):
+        return usuarios
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea or linea.startswith("#"):
+                continue
+            partes = linea.split(":")
+            if len(partes) not in (2, 3):
+                print(f"Advertencia: línea no válida en '{ruta}': {linea[:40]}")
+                continue
+            usuarios[partes[0]] = Usuario(partes[0], partes[1], partes[2] if len(partes) == 3 and partes[2] else None)
+    return usuarios
+
+def escribir_archivo_usuarios(ruta: str, usuarios: Dict[str, Usuario]):
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        for usuario in usuarios.values():
+            f.write(f"{usuario.nombre}:{usuario.hash_clave}" + (f":{usuario.hogar}" if usuario.hogar else "") + "\n")
+    os.chmod(temporal, 0o600)
+    os.replace(temporal, ruta) # Reemplazo atómico: la web nunca lee un archivo a medio escribir
+
+class CacheVerificaciones:
+    """Verificaciones correctas recientes (LRU con caducidad). Los fallos no se guardan."""
+
+    def __init__(self, ttl: int = CACHE_TTL_SEGUNDOS, maximo: int = CACHE_MAX_ENTRADAS):
+        self.ttl = ttl
+        self.maximo = maximo
+        self._clave = secrets.token_bytes(32)
+        self._entradas: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _huella(self, nombre: str, clave: str) -> bytes:
+        return hmac.new(self._clave, f"{nombre}\x00{clave}".encode("utf8"), hashlib.sha256).digest()
+
+    def contiene(self, nombre: str, clave: str) -> bool:
+        huella = self._huella(nombre, clave)
+        with self._lock:
+            expira = self._entradas.get(huella)
+            if expira is None:
+                return False
+            if expira < time.monotonic():
+                del self._entradas[huella]
+                return False
+            self._entradas.move_to_end(huella)
+            return True
+
+    def agregar(self, nombre: str, clave: str):
+        huella = self._huella(nombre, clave)
+        with self._lock:
+            self._entradas[huella] = time.monotonic() + self.ttl
+            self._entradas.move_to_end(huella)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+CACHE_VERIFICACIONES = CacheVerificaciones()
+
+def verificar(backend, nombre: str, clave: str) -> Optional[Usuario]:
+    """Usuario si la contraseña es correcta. El hash solo se calcula si la verificación no está en caché."""
+    usuario = backend.obtener(nombre)
+    if usuario is None:
+        return None
+    if CACHE_VERIFICACIONES.contiene(nombre, clave):
+        return usuario
+    if not comprobar_clave(clave, usuario.hash_clave):
+        return None
+    CACHE_VERIFICACIONES.agregar(nombre, clave)
+    return usuario
+
+def _firmar(datos: str, usuario: Usuario) -> str:
+    # El hash de la contraseña entra en la firma: al cambiar la contraseña, las cookies anteriores dejan de valer.
+    mensaje = f"{datos}\x00{usuario.hash_clave}".encode("utf8")
+    return _b64(hmac.new(CLAVE_SESION, mensaje, hashlib.sha256).digest())
+
+def crear_cookie_sesion(usuario: Usuario, ahora: Optional[float] = None) -> str:
+    """Valor de cookie 'usuario.expiración.firma', con el usuario en base64 url-safe."""
+    expira = int((ahora or time.time()) + DURACION_SESION_SEGUNDOS)
+    datos = f"{_b64(usuario.nombre.encode('utf8'))}.{expira}"
+    return f"{datos}.{_firmar(datos, usuario)}"
+
+def usuario_de_cookie(backend, valor: Optional[str], ahora: Optional[float] = None) -> Optional[Usuario]:
+    """Usuario de una cookie de sesión válida y no caducada, o None. No calcula ningún hash de contraseña."""
+    if not valor:
+        return None
+    try:
+        nombre_b64, expira, firma = valor.split(".")
+        if int(expira) < (ahora or time.time()):
+            return None
+        usuario = backend.obtener(_desde_b64(nombre_b64).decode("utf8"))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if usuario is None or not hmac.compare_digest(firma, _firmar(f"{nombre_b64}.{expira}", usuario)):
+        return None
+    return usuario
+
+def cargar_backend(usuario_por_defecto: Tuple[str, str]):
+    """
+    Backend según la configuración: una clase propia ('modulo:Clase', construida sin argumentos),
+    el archivo de usuarios o, si no hay nada configurado, el usuario único de ejemplo.
+    """
+    if BACKEND_AUTENTICACION:
+        modulo, _, clase = BACKEND_AUTENTICACION.partition(":")
+        return getattr(importlib.import_module(modulo), clase)()
+    if ARCHIVO_USUARIOS:
+        return BackendArchivoUsuarios(ARCHIVO_USUARIOS)
+    return BackendUsuarioUnico(*usuario_por_defecto)
+
+def main():
+    parser = argparse.ArgumentParser(description="Administra el archivo de usuarios de la web.")
+    parser.add_argument("--archivo", default=ARCHIVO_USUARIOS,
+                        help="Archivo de usuarios (por defecto GESTION_MEDICAMENTOS_ARCHIVO_USUARIOS).")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    parser_agregar = subparsers.add_parser("agregar", help="Crea un usuario o cambia su contraseña.")
+    parser_agregar.add_argument("usuario")
+    parser_agregar.add_argument("--hogar", default=None, help="Limitar el usuario a un hogar.")
+    parser_eliminar = subparsers.add_parser("eliminar", help="Elimina un usuario.")
+    parser_eliminar.add_argument("usuario")
+    args = parser.parse_args()
+
+    if not args.archivo:
+        parser.error("Indique --archivo o defina GESTION_MEDICAMENTOS_ARCHIVO_USUARIOS.")
+    if ":" in args.usuario or not args.usuario.strip():
+        parser.error("El nombre de usuario no puede estar vacío ni contener ':'.")
+    usuarios = leer_archivo_usuarios(args.archivo)
+    if args.comando == "agregar":
+        clave = getpass.getpass("Contraseña: ")
+        if not clave or clave != getpass.getpass("Repita la contraseña: "):
+            parser.error("Las contraseñas no coinciden o están vacías.")
+        usuarios[args.usuario] = Usuario(args.usuario, hashear_clave(clave), args.hogar)
+        print(f"Usuario '{args.usuario}' guardado.")
+    else:
+        if usuarios.pop(args.usuario, None) is None:
+            parser.error(f"El usuario '{args.usuario}' no existe.")
+        print(f"Usuario '{args.usuario}' eliminado.")
+    escribir_archivo_usuarios(args.archivo, usuarios)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# CLI no interactiva: subcomandos para scripts y operaciones por lotes.
+# Todo el comando usa una única sesión de base de datos. Las altas aceptan un CSV (o '-' para stdin)
+# con una fila por operación y los resultados se escriben como tabla, JSON o CSV.
+#
+# Uso (desde el directorio gestion_medicamentos):
+#   python main_cli.py med listar --formato json
+#   python main_cli.py med agregar --csv medicamentos.csv
+#   python main_cli.py lote agregar --medicamento 3 --cajas 2 --unidades-por-caja 20 --vencimiento 2027-01-31
+#   python main_cli.py pedido recibir --csv - < pedidos.csv     # columna pedido_id
+#   python main_cli.py reporte costos --formato csv
+#   python main_cli.py db migrar                                # migraciones pendientes (app/migraciones.py)
+#
+# Los subcomandos también aceptan los nombres en inglés (med list, lote add, pedido receive, report costs, db migrate).
+
+import argparse
+import csv
+import json
+import sys
+from typing import Iterator, List, Optional
+
+# Solo biblioteca estándar: las acciones (SQLAlchemy, modelos, pydantic) se importan de
+# app/cli_acciones.py después de interpretar los argumentos, así `--help` o un error de uso son inmediatos.
+
+FORMATOS = ("tabla", "json", "csv")
+# Mismos nombres que models.EstadoPedido; se repiten aquí para no importar los modelos al construir el parser.
+ESTADOS_PEDIDO = ("PENDIENTE", "RECIBIDO", "CANCELADO")
+
+# --- Entrada y salida ---
+
+def escribir(filas: List[dict], formato: str, salida=None):
+    """Escribe las filas en el formato pedido. Las columnas son las claves de la primera fila."""
+    salida = salida or sys.stdout
+    if formato == "json":
+        json.dump(filas, salida, ensure_ascii=False, indent=2)
+        salida.write("\n")
+        return
+    if not filas:
+        if formato == "tabla":
+            salida.write("(sin resultados)\n")
+        return
+    columnas = list(filas[0].keys())
+    if formato == "csv":
+        escritor = csv.DictWriter(salida, fieldnames=columnas, lineterminator="\n")
+        escritor.writeheader()
+        escritor.writerows(filas)
+        return
+    textos = [["" if fila.get(c) is None else str(fila.get(c)) for c in columnas] for fila in filas]
+    anchos = [max(len(c), *(len(t[i]) for t in textos)) for i, c in enumerate(columnas)]
+    salida.write(" | ".join(c.ljust(a) for c, a in zip(columnas, anchos)) + "\n")
+    salida.write("-+-".join("-" * a for a in anchos) + "\n")
+    for t in textos:
+        salida.write(" | ".join(v.ljust(a) for v, a in zip(t, anchos)) + "\n")
+
+def leer_csv(ruta: str) -> Iterator[dict]:
+    """Filas de un CSV con cabecera ('-' para stdin). Las celdas vacías se leen como None."""
+    archivo = sys.stdin if ruta == "-" else open(ruta, encoding="utf-8", newline="")
+    try:
+        for fila in csv.DictReader(archivo):
+            yield {clave.strip(): (valor.strip() or None) if isinstance(valor, str) else valor
+                   for clave, valor in fila.items() if clave}
+    finally:
+        if archivo is not sys.stdin:
+            archivo.close()
+
+# --- Parser ---
+
+def construir_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="main_cli.py",
+        description="Gestor de Medicamentos Caseros. Sin argumentos se abre el menú interactivo.",
+    )
+    parser.add_argument("--formato", choices=FORMATOS, default="tabla", help="Formato de salida (por defecto tabla).")
+    # --formato también se acepta después del subcomando (SUPPRESS: sin él se conserva el valor global)
+    comunes = argparse.ArgumentParser(add_help=False)
+    comunes.add_argument("--formato", choices=FORMATOS, default=argparse.SUPPRESS, help="Formato de salida.")
+    entidades = parser.add_subparsers(dest="entidad", required=True, metavar="{med,lote,pedido,reporte,db}")
+
+    def comando(subparsers, nombre, alias, ayuda, funcion: str, lote=False, migrar=True):
+        sub = subparsers.add_parser(nombre, aliases=[alias], help=ayuda, parents=[comunes])
+        sub.set_defaults(funcion=funcion, es_lote=lote, migrar=migrar)
+        if lote:
+            sub.add_argument("--csv", metavar="ARCHIVO", help="CSV con cabecera, una operación por fila ('-' para stdin).")
+        return sub
+
+    def paginacion(sub):
+        sub.add_argument("--desde", type=int, default=0, help="Registros a saltar.")
+        sub.add_argument("--limite", type=int, default=100, help="Máximo de registros (por defecto 100).")
+
+    med = entidades.add_parser("med", help="Medicamentos.").add_subparsers(dest="accion", required=True)
+    sub = comando(med, "listar", "list", "Lista medicamentos.", "med_listar")
+    paginacion(sub)
+    sub.add_argument("--buscar", metavar="TEXTO", help="Buscar por nombre o marca.")
+    sub.add_argument("--activos", action="store_true", help="Solo medicamentos activos.")
+    sub = comando(med, "agregar", "add", "Añade medicamentos.", "med_agregar", lote=True)
+    sub.add_argument("--nombre")
+    sub.add_argument("--marca")
+    sub.add_argument("--unidades-por-caja", type=int)
+    sub.add_argument("--precio", type=float, help="Precio de referencia por caja.")
+
+    lote = entidades.add_parser("lote", help="Lotes de stock.").add_subparsers(dest="accion", required=True)
+    sub = comando(lote, "listar", "list", "Lista lotes por fecha de vencimiento.", "lote_listar")
+    sub.add_argument("--medicamento", type=int, help="Solo los lotes de este medicamento.")
+    sub.add_argument("--activos", action="store_true", help="Solo lotes no vencidos.")
+    sub = comando(lote, "agregar", "add", "Añade lotes de stock.", "lote_agregar", lote=True)
+    sub.add_argument("--medicamento", type=int, help="ID del medicamento.")
+    sub.add_argument("--cajas", type=int)
+    sub.add_argument("--unidades-por-caja", type=int)
+    sub.add_argument("--vencimiento", help="Fecha de vencimiento (AAAA-MM-DD).")
+    sub.add_argument("--compra", help="Fecha de compra (AAAA-MM-DD, por defecto hoy).")
+    sub.add_argument("--precio", type=float, help="Precio de compra por caja.")
+
+    pedido = entidades.add_parser("pedido", help="Pedidos.").add_subparsers(dest="accion", required=True)
+    sub = comando(pedido, "listar", "list", "Lista pedidos, del más reciente al más antiguo.", "pedido_listar")
+    paginacion(sub)
+    sub.add_argument("--estado", type=str.upper, choices=ESTADOS_PEDIDO)
+    sub = comando(pedido, "agregar", "add", "Crea pedidos.", "pedido_agregar", lote=True)
+    sub.add_argument("--fecha", help="Fecha del pedido (AAAA-MM-DD, por defecto hoy).")
+    sub.add_argument("--proveedor")
+    sub.add_argument("--estado", type=str.upper, choices=ESTADOS_PEDIDO)
+    sub = comando(pedido, "recibir", "receive", "Marca pedidos como recibidos.", "pedido_recibir", lote=True)
+    sub.add_argument("ids", nargs="*", type=int, metavar="ID")
+
+    reporte = entidades.add_parser("reporte", aliases=["report"], help="Reportes.").add_subparsers(dest="accion", required=True)
+    sub = comando(reporte, "costos", "costs", "Costo de los pedidos por mes.", "reporte_costos")
+    sub.add_argument("--anio", type=int)
+    sub.add_argument("--mes", type=int, choices=range(1, 13), metavar="MES")
+    sub.add_argument("--estado", type=str.upper, choices=ESTADOS_PEDIDO, default="RECIBIDO",
+                     help="Estado de los pedidos a sumar (por defecto RECIBIDO).")
+
+    db = entidades.add_parser("db", help="Esquema de la base de datos.").add_subparsers(dest="accion", required=True)
+    sub = comando(db, "migrar", "migrate", "Aplica las migraciones pendientes.", "db_migrar", migrar=False)
+    sub.add_argument("--hasta", metavar="ID", help="Aplica las pendientes hasta esta migración inclusive.")
+    sub.add_argument("--tamano-bloque", type=int, help="Filas por transacción en los rellenos de datos.")
+    comando(db, "estado", "status", "Lista las migraciones aplicadas y pendientes.", "db_estado", migrar=False)
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Ejecuta un subcomando. Devuelve el código de salida: 1 si alguna operación falló, 2 si los argumentos no son válidos."""
+    args = construir_parser().parse_args(argv)
+    if getattr(args, "ids", None) == [] and not args.csv:
+        construir_parser().error("Indique los IDs de los pedidos o --csv.")
+
+    from . import cli_acciones, database, migraciones
+    # Con un --hasta desconocido migrar() nunca se detendría y aplicaría todas las pendientes
+    if getattr(args, "hasta", None) and args.hasta not in {m.id for m in migraciones.MIGRACIONES}:
+        construir_parser().error(f"Migración desconocida: '{args.hasta}'.")
+    if args.migrar:
+        cli_acciones.preparar_base_de_datos()
+    funcion = getattr(cli_acciones, args.funcion)
+    db = database.SessionLocal()
+    try:
+        if args.es_lote:
+            resultados, errores = funcion(db, args)
+        else:
+            resultados, errores = funcion(db, args), []
+    finally:
+        db.close()
+
+    escribir(resultados, args.formato)
+    for error in errores:
+        print(f"Error en la fila {error['fila']}: {error['error']}", file=sys.stderr)
+    if args.es_lote:
+        print(f"{len(resultados)} correctas, {len(errores)} con error.", file=sys.stderr)
+    return 1 if errores else 0
@@ -0,0 +1,161 @@
+# Acciones de la CLI no interactiva (ver app/cli.py).
+# Están en un módulo aparte para que construir el parser (y `main_cli.py --help`) no importe
+# SQLAlchemy ni los modelos: este módulo solo se carga cuando hay que ejecutar una acción, y
+# pydantic (los schemas) solo en las altas.
+
+import contextlib
+import enum
+import sys
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import crud, database, migraciones, models
+from .cli import leer_csv
+
+def _valor_serializable(valor):
+    if isinstance(valor, date):
+        return valor.isoformat()
+    if isinstance(valor, enum.Enum):
+        return valor.name
+    return valor
+
+def _fila_modelo(objeto, columnas: Optional[List[str]] = None) -> dict:
+    columnas = columnas or [c.name for c in objeto.__table__.columns]
+    return {nombre: _valor_serializable(getattr(objeto, nombre)) for nombre in columnas}
+
+def _mensaje_error(error: ValueError) -> str:
+    if callable(getattr(error, "errors", None)): # pydantic.ValidationError: un mensaje por campo
+        return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+def _procesar_lote(filas: Iterable[dict], operacion: Callable[[dict], dict]) -> Tuple[List[dict], List[dict]]:
+    """
+    Aplica `operacion` a cada fila. Un error en una fila (datos no válidos, duplicado, registro
+    inexistente) se anota y se sigue con la siguiente, como haría un operador con la CLI interactiva.
+    Los valores vacíos se omiten para que se apliquen los valores por defecto de los schemas.
+    """
+    resultados, errores = [], []
+    for numero, fila in enumerate(filas, start=1):
+        try:
+            resultados.append(operacion({clave: valor for clave, valor in fila.items() if valor is not None}))
+        except ValueError as e: # Incluye ValidationError de pydantic, MedicamentoDuplicadoError y EdicionConcurrenteError
+            errores.append({"fila": numero, "error": _mensaje_error(e)})
+    return resultados, errores
+
+def med_listar(db, args) -> List[dict]:
+    if args.buscar:
+        medicamentos = crud.buscar_medicamentos(db, args.buscar, limit=args.limite)
+    else:
+        medicamentos = crud.obtener_medicamentos(db, skip=args.desde, limit=args.limite)
+    if args.activos:
+        medicamentos = [m for m in medicamentos if m.esta_activo]
+    return [_fila_modelo(m) for m in medicamentos]
+
+def med_agregar(db, args):
+    from . import schemas # pydantic solo se importa para las altas
+
+    def crear(fila: dict) -> dict:
+        datos = schemas.MedicamentoCreate(**fila)
+        return _fila_modelo(crud.crear_medicamento(db, **datos.dict()))
+    return _procesar_lote(_filas_de_args(args, {
+        "nombre": args.nombre, "marca": args.marca, "unidades_por_caja": args.unidades_por_caja,
+        "precio_por_caja_referencia": args.precio,
+    }), crear)
+
+def lote_listar(db, args) -> List[dict]:
+    if args.medicamento is not None:
+        lotes = crud.obtener_lotes_por_medicamento(db, args.medicamento, solo_activos=args.activos)
+    else:
+        lotes = crud.obtener_lotes_stock_ordenados_por_vencimiento(db)
+        if args.activos:
+            hoy = date.today()
+            lotes = [l for l in lotes if l.fecha_vencimiento_lote >= hoy]
+    return [_fila_modelo(l) for l in lotes]
+
+def lote_agregar(db, args):
+    from . import schemas
+
+    def crear(fila: dict) -> dict:
+        medicamento_id = fila.pop("medicamento_id", None)
+        if medicamento_id is None:
+            raise ValueError("Falta medicamento_id.")
+        datos = schemas.LoteStockCreate(**fila)
+        return _fila_modelo(crud.agregar_lote_stock(db, medicamento_id=int(medicamento_id), **datos.dict()))
+    return _procesar_lote(_filas_de_args(args, {
+        "medicamento_id": args.medicamento, "cantidad_cajas": args.cajas,
+        "unidades_por_caja_lote": args.unidades_por_caja, "fecha_vencimiento_lote": args.vencimiento,
+        "fecha_compra_lote": args.compra, "precio_compra_lote_por_caja": args.precio,
+    }), crear)
+
+def pedido_listar(db, args) -> List[dict]:
+    pedidos = crud.obtener_pedidos(db, skip=args.desde, limit=args.limite)
+    if args.estado:
+        pedidos = [p for p in pedidos if p.estado.name == args.estado]
+    return [_fila_modelo(p) for p in pedidos]
+
+def pedido_agregar(db, args):
+    from . import schemas
+
+    def crear(fila: dict) -> dict:
+        if "estado" in fila: # Por nombre (PENDIENTE, RECIBIDO...), como en el formulario web
+            try:
+                fila["estado"] = models.EstadoPedido[str(fila["estado"]).upper()]
+            except KeyError:
+                raise ValueError(f"Valor de estado no válido: {fila['estado']!r}")
+        datos = schemas.PedidoCreate(**fila)
+        return _fila_modelo(crud.crear_pedido(db, **datos.dict()))
+    return _procesar_lote(_filas_de_args(args, {
+        "fecha_pedido": args.fecha, "proveedor": args.proveedor, "estado": args.estado,
+    }), crear)
+
+def pedido_recibir(db, args):
+    """Marca pedidos como RECIBIDO: por ID en la línea de comandos o una columna pedido_id (o id) en el CSV."""
+    if args.csv:
+        filas = ({"pedido_id": fila.get("pedido_id") or fila.get("id")} for fila in leer_csv(args.csv))
+    else:
+        filas = ({"pedido_id": pedido_id} for pedido_id in args.ids)
+
+    def recibir(fila: dict) -> dict:
+        if not str(fila.get("pedido_id", "")).isdigit():
+            raise ValueError(f"ID de pedido no válido: {fila.get('pedido_id')!r}")
+        pedido_id = int(fila["pedido_id"])
+        pedido = crud.actualizar_pedido(db, pedido_id, {"estado": models.EstadoPedido.RECIBIDO})
+        if pedido is None:
+            raise ValueError(f"No se encontró el pedido con ID {pedido_id}")
+        return _fila_modelo(pedido, ["id", "estado", "version"]) # Solo lo que devuelve el UPDATE, sin releer la fila
+    return _procesar_lote(filas, recibir)
+
+def reporte_costos(db, args) -> List[dict]:
+    estado = models.EstadoPedido[args.estado] if args.estado else None
+    if args.anio and args.mes:
+        meses = [{"anio": args.anio, "mes": args.mes}]
+    else:
+        meses = crud.obtener_meses_con_pedidos(db, estado_filtro=estado)
+        if args.anio:
+            meses = [m for m in meses if m["anio"] == args.anio]
+    return [
+        {"anio": m["anio"], "mes": m["mes"],
+         "costo_total": round(crud.obtener_costos_pedidos_por_mes_anio(db, m["anio"], m["mes"], estado_filtro=estado), 2)}
+        for m in meses
+    ]
+
+def db_migrar(db, args) -> List[dict]:
+    with contextlib.redirect_stdout(sys.stderr):
+        aplicadas = migraciones.migrar(
+            db.get_bind(), tamano_bloque=args.tamano_bloque or migraciones.TAMANO_BLOQUE_MIGRACION, hasta=args.hasta)
+    return [{"id": identificador} for identificador in aplicadas]
+
+def db_estado(db, args) -> List[dict]:
+    return [{"id": fila["id"], "aplicada_en": _valor_serializable(fila["aplicada_en"]), "descripcion": fila["descripcion"]}
+            for fila in migraciones.estado(db.get_bind())]
+
+def _filas_de_args(args, valores: Dict[str, object]) -> Iterable[dict]:
+    """Las filas del CSV si se indicó --csv; si no, una sola fila con los valores de las opciones."""
+    if args.csv:
+        return leer_csv(args.csv)
+    return [{clave: valor for clave, valor in valores.items() if valor is not None}]
+
+def preparar_base_de_datos():
+    """Como al arrancar la CLI interactiva (migraciones pendientes), pero con los avisos en stderr para no mezclarlos con la salida."""
+    with contextlib.redirect_stdout(sys.stderr):
+        migraciones.migrar(database.engine)
@@ -2,37 +2,212 @@
 # datos de la base de datos.
 
 # Importaciones necesarias al inicio del archivo
-from sqlalchemy.orm import Session
-from sqlalchemy.sql import func, and_
+import difflib
+import re
+import unicodedata
+from sqlalchemy import Integer, case, cast, insert, literal, select, text, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql import func, and_, or_
+from sqlalchemy.sql.expression import ClauseElement
 from . import models # models.py en el mismo directorio
-from datetime import date
+from .database import FTS_TABLE_NAME, FTS_VOCAB_TABLE_NAME
+from datetime import date, timedelta
 from typing import List, Optional, Type # Para type hints
 
 # Más adelante añadiremos aquí las funciones CRUD específicas.
 
+class MedicamentoDuplicadoError(ValueError):
+    """
+    Ya existe un medicamento con ese nombre (sin distinguir mayúsculas).
+    La detecta el índice único `models.UQ_MEDICAMENTO_NOMBRE` al hacer el INSERT/UPDATE,
+    por lo que no hace falta (ni es seguro ante concurrencia) consultar antes por nombre.
+    """
+    def __init__(self, nombre: str):
+        super().__init__(f"Ya existe un medicamento con el nombre '{nombre}'.")
+        self.nombre = nombre
+
+def _es_nombre_duplicado(error: IntegrityError) -> bool:
+    return models.UQ_MEDICAMENTO_NOMBRE in str(error.orig)
+
+class EdicionConcurrenteError(ValueError):
+    """
+    El registro fue modificado (por otra pestaña, usuario o worker) después de que se cargara
+    la versión que se intenta guardar. Quien edita debe recargar los datos actuales y reintentar.
+    """
+    def __init__(self, entidad: str, registro_id: int):
+        super().__init__(f"{entidad} ID {registro_id} fue modificado por otra edición. Recargue los datos y vuelva a intentarlo.")
+        self.entidad = entidad
+        self.registro_id = registro_id
+
+# --- Escrituras en una sola sentencia ---
+# INSERT/UPDATE ... RETURNING devuelven la fila escrita en el mismo viaje a la base de datos, así que no
+# hace falta el SELECT de `db.refresh` tras el commit. SQLAlchemy 1.4 solo compila RETURNING para motores
+# como PostgreSQL; en SQLite se usa `lastrowid` y los valores ya conocidos (los enviados en la sentencia),
+# y cualquier otra columna se carga recién si se accede a ella.
+
+def _soporta_returning(db: Session) -> bool:
+    return db.get_bind().dialect.full_returning
+
+def _con_valores_por_defecto(tabla, valores: dict) -> dict:
+    """Completa `valores` con los defaults escalares de las columnas (ej. version=1, esta_activo=True)."""
+    completos = dict(valores)
+    for columna in tabla.columns:
+        if columna.key not in completos and columna.default is not None and columna.default.is_scalar:
+            completos[columna.key] = columna.default.arg
+    return completos
+
+def _hidratar(db: Session, modelo, valores: dict):
+    """
+    Devuelve el objeto persistente de `modelo` con los `valores` dados (deben incluir el id) sin consultar
+    la base de datos. Si el objeto ya estaba en la sesión se actualizan sus atributos.
+    """
+    objeto = db.identity_map.get(Session.identity_key(modelo, valores["id"]))
+    if objeto is None:
+        objeto = modelo(**valores)
+        make_transient_to_detached(objeto) # Pasa a tener identidad sin INSERT ni SELECT
+        db.add(objeto)
+    else:
+        for key, value in valores.items():
+            set_committed_value(objeto, key, value)
+    return objeto
+
+def _insertar(db: Session, modelo, valores: dict, condicion=None) -> Optional[dict]:
+    """
+    Un único INSERT. Con `condicion` se usa `INSERT ... SELECT ... WHERE <condicion>`, que permite
+    comprobar en la misma sentencia que existan las filas referenciadas (SQLite no exige las claves
+    foráneas por defecto). Devuelve los valores de la fila insertada, o None si la condición no se cumplió.
+    No hace commit.
+    """
+    tabla = modelo.__table__
+    valores = _con_valores_por_defecto(tabla, valores)
+    if condicion is None:
+        sentencia = insert(tabla).values(**valores)
+    else:
+        columnas = list(valores)
+        fila = select(*[literal(valores[c], tabla.c[c].type) for c in columnas]).where(condicion)
+        sentencia = insert(tabla).from_select(columnas, fila)
+    if _soporta_returning(db):
+        fila_insertada = db.execute(sentencia.returning(*tabla.columns)).first()
+        return dict(fila_insertada._mapping) if fila_insertada else None
+    resultado = db.execute(sentencia)
+    return dict(valores, id=resultado.lastrowid) if resultado.rowcount else None
+
+def _actualizar_con_version(db: Session, modelo, registro_id: int, valores: dict,
+                            version_esperada: Optional[int]) -> Optional[dict]:
+    """
+    Ejecuta un único `UPDATE ... SET <valores>, version = version + 1 WHERE id = :id AND version = :version`
+    (con RETURNING si el motor lo admite). Sin `version_esperada` (ej. desde la CLI sin formulario de por
+    medio) no se comprueba la versión. Devuelve los valores conocidos de la fila actualizada, None si el
+    registro no existe, y lanza `EdicionConcurrenteError` si existe pero otra edición ya lo modificó.
+    Solo en esos dos últimos casos se hace una segunda consulta, para distinguirlos. No hace commit.
+    """
+    tabla = modelo.__table__
+    if not valores and "version" not in tabla.c:
+        # Nada que actualizar (un UPDATE con el SET vacío no es SQL válido): la fila actual, o None si no existe
+        fila = db.execute(select(tabla).where(tabla.c.id == registro_id)).first()
+        return dict(fila._mapping) if fila else None
+    sentencia = update(tabla).where(tabla.c.id == registro_id)
+    if version_esperada is not None:
+        sentencia = sentencia.where(tabla.c.version == version_esperada)
+    if "version" in tabla.c: # DetallePedido no tiene control de versión
+        valores = dict(valores, version=tabla.c.version + 1)
+    sentencia = sentencia.values(**valores)
+    if _soporta_returning(db):
+        fila = db.execute(sentencia.returning(*tabla.columns)).first()
+        datos = dict(fila._mapping) if fila else None
+    elif db.execute(sentencia).rowcount:
+        # Las expresiones SQL (ej. version + 1) no tienen un valor conocido: esas columnas se cargan al accederse
+        datos = {k: v for k, v in valores.items() if not isinstance(v, ClauseElement)}
+        datos["id"] = registro_id
+        if version_esperada is not None:
+            datos["version"] = version_esperada + 1
+    else:
+        datos = None
+    if datos is None and version_esperada is not None and db.query(modelo.id).filter(modelo.id == registro_id).first():
+        raise EdicionConcurrenteError(modelo.__name__, registro_id)
+    return datos
+
+class PedidoNoEditableError(ValueError):
+    """Se intentó añadir un ítem a un pedido que no está en el estado requerido (ej. ya recibido)."""
+    def __init__(self, pedido_id: int, estado: models.EstadoPedido):
+        super().__init__(f"El pedido ID {pedido_id} está en estado '{estado.value}' y no admite nuevos ítems.")
+        self.pedido_id = pedido_id
+        self.estado = estado
+
+def _valores_validos(modelo, datos_actualizacion: dict) -> dict:
+    """Filtra los campos que no son columnas del modelo (avisando, como hacían los setattr) y la versión."""
+    columnas = modelo.__table__.columns.keys()
+    valores = {}
+    for key, value in datos_actualizacion.items():
+        if key in columnas and key not in ("id", "version"):
+            valores[key] = value
+        else:
+            print(f"Advertencia: El campo '{key}' no existe en el modelo {modelo.__name__} y será ignorado.")
+    return valores
+
 # --- Funciones CRUD para Medicamento ---
 
+def duracion_por_caja_dias(unidades_por_caja: Optional[int], consumo_diario_unidades: Optional[float]) -> Optional[int]:
+    """Días enteros que dura una caja al consumo indicado, o None si no hay consumo."""
+    if not unidades_por_caja or not consumo_diario_unidades or consumo_diario_unidades <= 0:
+        return None
+    return int(unidades_por_caja / consumo_diario_unidades)
+
+def expresion_duracion_por_caja_dias(dialecto: str, unidades_por_caja, consumo_diario_unidades):
+    """
+    La misma cuenta que `duracion_por_caja_dias` en SQL, para actualizar la columna sin leer la fila.
+    CAST a entero trunca en SQLite pero redondea en PostgreSQL, así que ahí se aplica FLOOR antes.
+    """
+    cociente = unidades_por_caja / consumo_diario_unidades
+    entero = cast(cociente, Integer) if dialecto == "sqlite" else cast(func.floor(cociente), Integer)
+    return case((consumo_diario_unidades > 0, entero), else_=None)
+
+def _con_duracion_por_caja(db: Session, valores: dict) -> dict:
+    """Añade `duracion_por_caja_dias` si cambia alguno de los campos de los que depende."""
+    if "unidades_por_caja" not in valores and "consumo_diario_unidades" not in valores:
+        return valores
+    if "unidades_por_caja" in valores and "consumo_diario_unidades" in valores:
+        duracion = duracion_por_caja_dias(valores["unidades_por_caja"], valores["consumo_diario_unidades"])
+    else:
+        # Solo cambia uno de los dos: el otro se toma de la fila en el mismo UPDATE.
+        tabla = models.Medicamento.__table__
+        duracion = expresion_duracion_por_caja_dias(
+            db.get_bind().dialect.name,
+            valores.get("unidades_por_caja", tabla.c.unidades_por_caja),
+            valores.get("consumo_diario_unidades", tabla.c.consumo_diario_unidades),
+        )
+    return dict(valores, duracion_por_caja_dias=duracion)
+
 def crear_medicamento(db: Session, nombre: str, marca: Optional[str], unidades_por_caja: int,
                       precio_por_caja_referencia: Optional[float] = None,
                       esta_activo: bool = True,
                       vencimiento_receta: Optional[date] = None,
                       consumo_diario_unidades: Optional[float] = None) -> models.Medicamento:
     """
-    Crea un nuevo registro de medicamento en la base de datos.
-    """
-    db_medicamento = models.Medicamento(
-        nombre=nombre,
-        marca=marca,
-        unidades_por_caja=unidades_por_caja,
-        precio_por_caja_referencia=precio_por_caja_referencia,
-        esta_activo=esta_activo,
-        vencimiento_receta=vencimiento_receta,
-        consumo_diario_unidades=consumo_diario_unidades
-    )
-    db.add(db_medicamento)
-    db.commit()
-    db.refresh(db_medicamento)
-    return db_medicamento
+    Crea un nuevo registro de medicamento en la base de datos con un único INSERT.
+    Lanza `MedicamentoDuplicadoError` si el nombre ya existe (sin distinguir mayúsculas).
+    """
+    valores = {
+        "nombre": nombre,
+        "marca": marca,
+        "unidades_por_caja": unidades_por_caja,
+        "precio_por_caja_referencia": precio_por_caja_referencia,
+        "esta_activo": esta_activo,
+        "vencimiento_receta": vencimiento_receta,
+        "consumo_diario_unidades": consumo_diario_unidades,
+        "duracion_por_caja_dias": duracion_por_caja_dias(unidades_por_caja, consumo_diario_unidades),
+    }
+    try:
+        datos = _insertar(db, models.Medicamento, valores)
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if _es_nombre_duplicado(e):
+            raise MedicamentoDuplicadoError(nombre) from e
+        raise
+    return _hidratar(db, models.Medicamento, datos)
 
 def obtener_medicamento(db: Session, medicamento_id: int) -> Optional[models.Medicamento]:
     """
@@ -42,7 +217,9 @@ def obtener_medicamento(db: Session, medicamento_id: int) -> Optional[models.Med
 
 def obtener_medicamento_por_nombre(db: Session, nombre: str) -> Optional[models.Medicamento]:
     """
-    Obtiene un medicamento por su nombre.
+    Obtiene un medicamento por su nombre (sin distinguir mayúsculas).
+    La expresión `lower(nombre)` coincide con la del índice `models.UQ_MEDICAMENTO_NOMBRE`,
+    así que la consulta usa el índice.
     """
     return db.query(models.Medicamento).filter(func.lower(models.Medicamento.nombre) == func.lower(nombre)).first()
 
@@ -52,23 +229,102 @@ def obtener_medicamentos(db: Session, skip: int = 0, limit: int = 100) -> List[m
     """
     return db.query(models.Medicamento).offset(skip).limit(limit).all()
 
-def actualizar_medicamento(db: Session, medicamento_id: int, datos_actualizacion: dict) -> Optional[models.Medicamento]:
-    """
-    Actualiza un medicamento existente.
+# --- Búsqueda de Medicamentos ---
+
+def _normalizar_termino(termino: str) -> str:
+    """Pasa a minúsculas y elimina tildes, igual que el tokenizer `unicode61 remove_diacritics 2`."""
+    descompuesto = unicodedata.normalize("NFKD", termino.lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+def _tokenizar_busqueda(texto: str) -> List[str]:
+    return [_normalizar_termino(t) for t in re.findall(r"\w+", texto or "")]
+
+def _ids_por_fts(db: Session, terminos: List[str], limit: int) -> List[int]:
+    """
+    Consulta el índice FTS5. Cada término se usa como prefijo ("ibu" encuentra "Ibuprofeno")
+    y todos deben aparecer en `nombre` o `marca`. Los resultados se ordenan por relevancia (bm25).
+    """
+    consulta_fts = " AND ".join(f'"{t}"*' for t in terminos)
+    filas = db.execute(
+        text(f"SELECT rowid FROM {FTS_TABLE_NAME} WHERE {FTS_TABLE_NAME} MATCH :q "
+             f"ORDER BY bm25({FTS_TABLE_NAME}) LIMIT :limit"),
+        {"q": consulta_fts, "limit": limit}
+    ).fetchall()
+    return [fila[0] for fila in filas]
+
+def _corregir_terminos(db: Session, terminos: List[str]) -> List[str]:
+    """
+    Tolerancia a errores de tipeo: reemplaza cada término por el más parecido del vocabulario
+    del índice (difflib). El vocabulario tiene un término por palabra distinta, no por fila,
+    así que esto no recorre la tabla de medicamentos.
+    """
+    vocabulario = [fila[0] for fila in db.execute(text(f"SELECT term FROM {FTS_VOCAB_TABLE_NAME}"))]
+    corregidos = []
+    for termino in terminos:
+        candidatos = difflib.get_close_matches(termino, vocabulario, n=1, cutoff=0.7)
+        corregidos.append(candidatos[0] if candidatos else termino)
+    return corregidos
+
+def _buscar_por_like(db: Session, terminos: List[str], limit: int) -> List[models.Medicamento]:
+    """Búsqueda sin índice de texto completo: cada término debe aparecer en `nombre` o `marca`."""
+    query = db.query(models.Medicamento)
+    for termino in terminos:
+        patron = f"%{termino}%"
+        query = query.filter(or_(models.Medicamento.nombre.ilike(patron), models.Medicamento.marca.ilike(patron)))
+    return query.order_by(models.Medicamento.nombre).limit(limit).all()
+
+def buscar_medicamentos(db: Session, texto: str, limit: int = 20) -> List[models.Medicamento]:
+    """
+    Busca medicamentos por `nombre` o `marca` usando el índice FTS5 (ver `database.crear_indice_busqueda`).
+    Admite búsquedas parciales por prefijo y, si no hay coincidencias exactas, reintenta corrigiendo
+    errores de tipeo. En otros motores (PostgreSQL) o si el índice no existe, usa un ILIKE sobre ambas columnas.
+    """
+    terminos = _tokenizar_busqueda(texto)
+    if not terminos:
+        return []
+    if db.get_bind().dialect.name != "sqlite":
+        return _buscar_por_like(db, terminos, limit)
+
+    try:
+        ids = _ids_por_fts(db, terminos, limit)
+        if not ids:
+            terminos_corregidos = _corregir_terminos(db, terminos)
+            if terminos_corregidos != terminos:
+                ids = _ids_por_fts(db, terminos_corregidos, limit)
+    except OperationalError:
+        return _buscar_por_like(db, terminos, limit)
+
+    if not ids:
+        return []
+    medicamentos_por_id = {
+        med.id: med for med in db.query(models.Medicamento).filter(models.Medicamento.id.in_(ids)).all()
+    }
+    return [medicamentos_por_id[i] for i in ids if i in medicamentos_por_id] # Mantener el orden por relevancia
+
+def actualizar_medicamento(db: Session, medicamento_id: int, datos_actualizacion: dict,
+                           version_esperada: Optional[int] = None) -> Optional[models.Medicamento]:
+    """
+    Actualiza un medicamento existente con una sola sentencia UPDATE.
     `datos_actualizacion` es un diccionario con los campos a actualizar.
     Ej: {'nombre': 'Nuevo Nombre', 'marca': 'Nueva Marca'}
-    """
-    db_medicamento = obtener_medicamento(db, medicamento_id)
-    if db_medicamento:
-        for key, value in datos_actualizacion.items():
-            if hasattr(db_medicamento, key):
-                setattr(db_medicamento, key, value)
-            else:
-                # Opcional: lanzar un error si la clave no es válida
-                print(f"Advertencia: El campo '{key}' no existe en el modelo Medicamento y será ignorado.")
+    `version_esperada` es la versión que tenía el medicamento al cargarse el formulario.
+    Devuelve el medicamento actualizado (sin releerlo) o None si no existe.
+    Lanza `MedicamentoDuplicadoError` si el nuevo nombre ya pertenece a otro medicamento y
+    `EdicionConcurrenteError` si otra edición lo modificó antes.
+    """
+    valores = _con_duracion_por_caja(db, _valores_validos(models.Medicamento, datos_actualizacion))
+    try:
+        datos = _actualizar_con_version(db, models.Medicamento, medicamento_id, valores, version_esperada)
         db.commit()
-        db.refresh(db_medicamento)
-    return db_medicamento
+    except IntegrityError as e:
+        db.rollback()
+        if _es_nombre_duplicado(e):
+            raise MedicamentoDuplicadoError(datos_actualizacion.get('nombre')) from e
+        raise
+    except EdicionConcurrenteError:
+        db.rollback()
+        raise
+    return _hidratar(db, models.Medicamento, datos) if datos else None
 
 def eliminar_medicamento(db: Session, medicamento_id: int) -> bool:
     """
@@ -154,20 +410,17 @@ def calcular_fecha_vencimiento_proxima(db: Session, medicamento_id: int) -> Opti
 def crear_pedido(db: Session, fecha_pedido: Optional[date] = None, proveedor: Optional[str] = None,
                  estado: models.EstadoPedido = models.EstadoPedido.PENDIENTE) -> models.Pedido:
     """
-    Crea un nuevo pedido.
-    Si fecha_pedido no se proporciona, se usará la fecha actual por defecto del modelo.
+    Crea un nuevo pedido con un único INSERT.
+    Si fecha_pedido no se proporciona, se usa la fecha actual.
     """
-    db_pedido = models.Pedido(
-        proveedor=proveedor,
-        estado=estado
-    )
-    if fecha_pedido: # Solo asignar si se proporciona, sino usa el default del modelo
-        db_pedido.fecha_pedido = fecha_pedido
-
-    db.add(db_pedido)
+    valores = {
+        "fecha_pedido": fecha_pedido or date.today(), # Se fija aquí para conocerla sin releer la fila
+        "proveedor": proveedor,
+        "estado": estado,
+    }
+    datos = _insertar(db, models.Pedido, valores)
     db.commit()
-    db.refresh(db_pedido)
-    return db_pedido
+    return _hidratar(db, models.Pedido, datos)
 
 def obtener_pedido(db: Session, pedido_id: int) -> Optional[models.Pedido]:
     """
@@ -183,29 +436,31 @@ def obtener_pedidos(db: Session, skip: int = 0, limit: int = 100) -> List[models
     """
     return db.query(models.Pedido).order_by(models.Pedido.fecha_pedido.desc()).offset(skip).limit(limit).all()
 
-def actualizar_pedido(db: Session, pedido_id: int, datos_actualizacion: dict) -> Optional[models.Pedido]:
+def actualizar_pedido(db: Session, pedido_id: int, datos_actualizacion: dict,
+                      version_esperada: Optional[int] = None) -> Optional[models.Pedido]:
     """
-    Actualiza un pedido existente.
+    Actualiza un pedido existente con una sola sentencia UPDATE.
     `datos_actualizacion` es un diccionario con los campos a actualizar.
     Ej: {'proveedor': 'Farmacia Central', 'estado': models.EstadoPedido.RECIBIDO}
-    """
-    db_pedido = obtener_pedido(db, pedido_id)
-    if db_pedido:
-        for key, value in datos_actualizacion.items():
-            if hasattr(db_pedido, key):
-                # Especial manejo para el Enum si se pasa como string
-                if key == "estado" and isinstance(value, str):
-                    try:
-                        value = models.EstadoPedido[value.upper()]
-                    except KeyError:
-                        print(f"Advertencia: Valor de estado '{value}' no válido. Se ignora la actualización de estado.")
-                        continue
-                setattr(db_pedido, key, value)
-            else:
-                print(f"Advertencia: El campo '{key}' no existe en el modelo Pedido y será ignorado.")
-        db.commit()
-        db.refresh(db_pedido)
-    return db_pedido
+    Devuelve el pedido actualizado (sin releerlo) o None si no existe.
+    Lanza `EdicionConcurrenteError` si `version_esperada` ya no coincide con la del pedido.
+    """
+    datos = dict(datos_actualizacion)
+    # Especial manejo para el Enum si se pasa como string
+    if isinstance(datos.get("estado"), str):
+        try:
+            datos["estado"] = models.EstadoPedido[datos["estado"].upper()]
+        except KeyError:
+            print(f"Advertencia: Valor de estado '{datos['estado']}' no válido. Se ignora la actualización de estado.")
+            del datos["estado"]
+    valores = _valores_validos(models.Pedido, datos)
+    try:
+        datos = _actualizar_con_version(db, models.Pedido, pedido_id, valores, version_esperada)
+    except EdicionConcurrenteError:
+        db.rollback()
+        raise
+    db.commit()
+    return _hidratar(db, models.Pedido, datos) if datos else None
 
 def eliminar_pedido(db: Session, pedido_id: int) -> bool:
     """
@@ -244,25 +499,82 @@ def calcular_costo_total_pedido(db: Session, pedido_id: int) -> float:
 
 # --- Funciones para Reportes ---
 
+def _rango_mes(anio: int, mes: int):
+    """
+    Primer día del mes y primer día del mes siguiente. Filtrar por este rango en lugar de comparar
+    EXTRACT(year/month ...) es igual en SQLite y PostgreSQL y permite usar un índice sobre la fecha.
+    """
+    inicio = date(anio, mes, 1)
+    siguiente = date(anio + 1, 1, 1) if mes == 12 else date(anio, mes + 1, 1)
+    return inicio, siguiente
+
+def _costo_pedidos_en_rango(db: Session, modelo_pedido, modelo_detalle, inicio: date, fin: date,
+                            estado_filtro: Optional[models.EstadoPedido]) -> float:
+    """SUM(cantidad * precio) de los detalles de los pedidos con fecha en [inicio, fin), en una sola consulta."""
+    query = (
+        db.query(func.sum(modelo_detalle.cantidad_cajas_pedidas * modelo_detalle.precio_unitario_compra_caja))
+        .select_from(modelo_detalle)
+        .join(modelo_pedido, modelo_detalle.pedido_id == modelo_pedido.id)
+        .filter(modelo_pedido.fecha_pedido >= inicio, modelo_pedido.fecha_pedido < fin)
+    )
+    if estado_filtro:
+        query = query.filter(modelo_pedido.estado == estado_filtro)
+    return float(query.scalar() or 0.0)
+
+def _archivo_cubre_desde(db: Session, inicio: date) -> bool:
+    """
+    Si el archivo de pedidos tiene algo en `inicio` o después. Es una sola lectura de MAX(fecha_pedido)
+    sobre el índice, de modo que los reportes de meses recientes no tocan las tablas de archivo.
+    """
+    ultima_archivada = db.query(func.max(models.PedidoArchivado.fecha_pedido)).scalar()
+    return ultima_archivada is not None and ultima_archivada >= inicio
+
 def obtener_costos_pedidos_por_mes_anio(db: Session, anio: int, mes: int, estado_filtro: Optional[models.EstadoPedido] = models.EstadoPedido.RECIBIDO) -> float:
     """
     Calcula el costo total de los pedidos para un mes y año específicos,
     opcionalmente filtrando por estado del pedido (por defecto 'RECIBIDO').
+    Incluye los pedidos archivados (ver app/archivo.py) solo si el archivo llega a ese mes.
     """
-    query = db.query(models.Pedido).filter(
-        func.extract('year', models.Pedido.fecha_pedido) == anio,
-        func.extract('month', models.Pedido.fecha_pedido) == mes
+    inicio_mes, inicio_mes_siguiente = _rango_mes(anio, mes)
+    costo_total_mes = _costo_pedidos_en_rango(
+        db, models.Pedido, models.DetallePedido, inicio_mes, inicio_mes_siguiente, estado_filtro
     )
-    if estado_filtro:
-        query = query.filter(models.Pedido.estado == estado_filtro)
-
-    pedidos_del_mes = query.all()
+    if _archivo_cubre_desde(db, inicio_mes):
+        costo_total_mes += _costo_pedidos_en_rango(
+            db, models.PedidoArchivado, models.DetallePedidoArchivado, inicio_mes, inicio_mes_siguiente, estado_filtro
+        )
+    return costo_total_mes
 
-    costo_total_mes = 0.0
-    for pedido in pedidos_del_mes:
-        costo_total_mes += calcular_costo_total_pedido(db, pedido.id) # Reutilizamos la función existente
+def calcular_valor_total_stock(db: Session) -> float:
+    """
+    Valor total del stock activo (lotes no vencidos) a precio de referencia por unidad.
+    Es el mismo total que muestra la vista de stock global, pero en una sola consulta agregada.
+    """
+    valor = (
+        db.query(func.sum(
+            models.LoteStock.cantidad_cajas * models.LoteStock.unidades_por_caja_lote
+            * models.Medicamento.precio_por_caja_referencia / models.Medicamento.unidades_por_caja
+        ))
+        .select_from(models.LoteStock)
+        .join(models.Medicamento, models.LoteStock.medicamento_id == models.Medicamento.id)
+        .filter(models.LoteStock.fecha_vencimiento_lote >= date.today())
+        .filter(models.Medicamento.precio_por_caja_referencia.isnot(None))
+        .filter(models.Medicamento.unidades_por_caja > 0)
+        .scalar()
+    )
+    return float(valor or 0.0)
 
-    return costo_total_mes
+def contar_lotes_por_vencer(db: Session, dias: int = 30) -> int:
+    """
+    Cuenta los lotes aún no vencidos cuya fecha de vencimiento cae dentro de los próximos `dias` días.
+    """
+    hoy = date.today()
+    return (
+        db.query(func.count(models.LoteStock.id))
+        .filter(models.LoteStock.fecha_vencimiento_lote >= hoy)
+        .filter(models.LoteStock.fecha_vencimiento_lote <= hoy + timedelta(days=dias))
+        .scalar()
+    )
 
 def obtener_meses_con_pedidos(db: Session, estado_filtro: Optional[models.EstadoPedido] = models.EstadoPedido.RECIBIDO) -> List[dict]:
     """
@@ -270,18 +582,20 @@ def obtener_meses_con_pedidos(db: Session, estado_filtro: Optional[models.Estado
     existen pedidos, opcionalmente filtrando por estado (por defecto 'RECIBIDO').
     Los resultados se devuelven ordenados por año y mes descendente.
     """
-    query = db.query(
-        func.extract('year', models.Pedido.fecha_pedido).label('anio'),
-        func.extract('month', models.Pedido.fecha_pedido).label('mes')
-    ).distinct()
-
-    if estado_filtro:
-        query = query.filter(models.Pedido.estado == estado_filtro)
-
-    # Ordenar por año descendente, luego por mes descendente
-    resultados = query.order_by(
-        func.extract('year', models.Pedido.fecha_pedido).desc(),
-        func.extract('month', models.Pedido.fecha_pedido).desc()
+    # EXTRACT devuelve un entero en SQLite pero un numeric/double en PostgreSQL: se convierte a Integer
+    # en la propia consulta para que la UNION y el orden se comporten igual en ambos motores.
+    def _meses(modelo_pedido):
+        anio_col = cast(func.extract('year', modelo_pedido.fecha_pedido), Integer)
+        mes_col = cast(func.extract('month', modelo_pedido.fecha_pedido), Integer)
+        consulta = select(anio_col.label('anio'), mes_col.label('mes'))
+        if estado_filtro:
+            consulta = consulta.where(modelo_pedido.estado == estado_filtro)
+        return consulta
+
+    # UNION (sin ALL) ya elimina los meses repetidos entre las tablas activas y el archivo.
+    meses = _meses(models.Pedido).union(_meses(models.PedidoArchivado)).subquery()
+    resultados = db.execute(
+        select(meses.c.anio, meses.c.mes).order_by(meses.c.anio.desc(), meses.c.mes.desc())
     ).all()
 
     # Convertir los resultados (Row objects) a una lista de diccionarios
@@ -295,28 +609,37 @@ def obtener_meses_con_pedidos(db: Session, estado_filtro: Optional[models.Estado
 # --- Funciones CRUD para DetallePedido ---
 
 def agregar_detalle_pedido(db: Session, pedido_id: int, medicamento_id: int, cantidad_cajas_pedidas: int,
-                           precio_unitario_compra_caja: Optional[float] = None) -> models.DetallePedido:
+                           precio_unitario_compra_caja: Optional[float] = None,
+                           estado_requerido: Optional[models.EstadoPedido] = None) -> models.DetallePedido:
     """
     Agrega un detalle (ítem) a un pedido existente.
-    """
-    # Verificar que el pedido y el medicamento existan
-    pedido = obtener_pedido(db, pedido_id)
-    if not pedido:
-        raise ValueError(f"No se encontró el pedido con ID {pedido_id}")
-    medicamento = obtener_medicamento(db, medicamento_id)
-    if not medicamento:
-        raise ValueError(f"No se encontró el medicamento con ID {medicamento_id}")
-
-    db_detalle_pedido = models.DetallePedido(
-        pedido_id=pedido_id,
-        medicamento_id=medicamento_id,
-        cantidad_cajas_pedidas=cantidad_cajas_pedidas,
-        precio_unitario_compra_caja=precio_unitario_compra_caja
+    La existencia del pedido y del medicamento (y, si se indica, el `estado_requerido` del pedido) se
+    comprueba en el mismo INSERT; solo si falla se consulta qué condición no se cumplió.
+    """
+    valores = {
+        "pedido_id": pedido_id,
+        "medicamento_id": medicamento_id,
+        "cantidad_cajas_pedidas": cantidad_cajas_pedidas,
+        "precio_unitario_compra_caja": precio_unitario_compra_caja,
+    }
+    condicion_pedido = models.Pedido.id == pedido_id
+    if estado_requerido is not None:
+        condicion_pedido = and_(condicion_pedido, models.Pedido.estado == estado_requerido)
+    condicion = and_(
+        select(models.Pedido.id).where(condicion_pedido).exists(),
+        select(models.Medicamento.id).where(models.Medicamento.id == medicamento_id).exists(),
     )
-    db.add(db_detalle_pedido)
+    datos = _insertar(db, models.DetallePedido, valores, condicion)
+    if datos is None:
+        db.rollback()
+        pedido = obtener_pedido(db, pedido_id)
+        if not pedido:
+            raise ValueError(f"No se encontró el pedido con ID {pedido_id}")
+        if not obtener_medicamento(db, medicamento_id):
+            raise ValueError(f"No se encontró el medicamento con ID {medicamento_id}")
+        raise PedidoNoEditableError(pedido_id, pedido.estado)
     db.commit()
-    db.refresh(db_detalle_pedido)
-    return db_detalle_pedido
+    return _hidratar(db, models.DetallePedido, datos)
 
 def obtener_detalle_pedido(db: Session, detalle_id: int) -> Optional[models.DetallePedido]:
     """
@@ -332,19 +655,13 @@ def obtener_detalles_por_pedido(db: Session, pedido_id: int) -> List[models.Deta
 
 def actualizar_detalle_pedido(db: Session, detalle_id: int, datos_actualizacion: dict) -> Optional[models.DetallePedido]:
     """
-    Actualiza un detalle de pedido existente.
+    Actualiza un detalle de pedido existente con una sola sentencia UPDATE.
     `datos_actualizacion` es un diccionario con los campos a actualizar.
     """
-    db_detalle = obtener_detalle_pedido(db, detalle_id)
-    if db_detalle:
-        for key, value in datos_actualizacion.items():
-            if hasattr(db_detalle, key):
-                setattr(db_detalle, key, value)
-            else:
-                print(f"Advertencia: El campo '{key}' no existe en el modelo DetallePedido y será ignorado.")
-        db.commit()
-        db.refresh(db_detalle)
-    return db_detalle
+    valores = _valores_validos(models.DetallePedido, datos_actualizacion)
+    datos = _actualizar_con_version(db, models.DetallePedido, detalle_id, valores, None)
+    db.commit()
+    return _hidratar(db, models.DetallePedido, datos) if datos else None
 
 def eliminar_detalle_pedido(db: Session, detalle_id: int) -> bool:
     """
@@ -364,28 +681,24 @@ def agregar_lote_stock(db: Session, medicamento_id: int, cantidad_cajas: int, un
                        fecha_vencimiento_lote: date, fecha_compra_lote: Optional[date] = None,
                        precio_compra_lote_por_caja: Optional[float] = None) -> models.LoteStock:
     """
-    Agrega un nuevo lote de stock para un medicamento existente.
-    Si fecha_compra_lote no se proporciona, se usará la fecha actual por defecto del modelo.
-    """
-    # Verificar que el medicamento exista
-    medicamento = obtener_medicamento(db, medicamento_id)
-    if not medicamento:
+    Agrega un nuevo lote de stock para un medicamento existente con un único INSERT, que también
+    comprueba que el medicamento exista. Si fecha_compra_lote no se proporciona, se usa la fecha actual.
+    """
+    valores = {
+        "medicamento_id": medicamento_id,
+        "cantidad_cajas": cantidad_cajas,
+        "unidades_por_caja_lote": unidades_por_caja_lote,
+        "fecha_compra_lote": fecha_compra_lote or date.today(), # Se fija aquí para conocerla sin releer la fila
+        "fecha_vencimiento_lote": fecha_vencimiento_lote,
+        "precio_compra_lote_por_caja": precio_compra_lote_por_caja,
+    }
+    condicion = select(models.Medicamento.id).where(models.Medicamento.id == medicamento_id).exists()
+    datos = _insertar(db, models.LoteStock, valores, condicion)
+    if datos is None:
+        db.rollback()
         raise ValueError(f"No se encontró el medicamento con ID {medicamento_id}")
-
-    db_lote = models.LoteStock(
-        medicamento_id=medicamento_id,
-        cantidad_cajas=cantidad_cajas,
-        unidades_por_caja_lote=unidades_por_caja_lote,
-        fecha_vencimiento_lote=fecha_vencimiento_lote,
-        precio_compra_lote_por_caja=precio_compra_lote_por_caja
-    )
-    if fecha_compra_lote: # Solo asignar si se proporciona, sino usa el default del modelo
-        db_lote.fecha_compra_lote = fecha_compra_lote
-
-    db.add(db_lote)
     db.commit()
-    db.refresh(db_lote)
-    return db_lote
+    return _hidratar(db, models.LoteStock, datos)
 
 def obtener_lote_stock(db: Session, lote_id: int) -> Optional[models.LoteStock]:
     """
@@ -403,21 +716,22 @@ def obtener_lotes_por_medicamento(db: Session, medicamento_id: int, solo_activos
         query = query.filter(models.LoteStock.fecha_vencimiento_lote >= date.today())
     return query.order_by(models.LoteStock.fecha_vencimiento_lote).all() # Ordenar por fecha de vencimiento
 
-def actualizar_lote_stock(db: Session, lote_id: int, datos_actualizacion: dict) -> Optional[models.LoteStock]:
+def actualizar_lote_stock(db: Session, lote_id: int, datos_actualizacion: dict,
+                          version_esperada: Optional[int] = None) -> Optional[models.LoteStock]:
     """
-    Actualiza un lote de stock existente.
+    Actualiza un lote de stock existente con una sola sentencia UPDATE.
     `datos_actualizacion` es un diccionario con los campos a actualizar.
-    """
-    db_lote = obtener_lote_stock(db, lote_id)
-    if db_lote:
-        for key, value in datos_actualizacion.items():
-            if hasattr(db_lote, key):
-                setattr(db_lote, key, value)
-            else:
-                print(f"Advertencia: El campo '{key}' no existe en el modelo LoteStock y será ignorado.")
-        db.commit()
-        db.refresh(db_lote)
-    return db_lote
+    Devuelve el lote actualizado (sin releerlo) o None si no existe.
+    Lanza `EdicionConcurrenteError` si `version_esperada` ya no coincide con la del lote.
+    """
+    valores = _valores_validos(models.LoteStock, datos_actualizacion)
+    try:
+        datos = _actualizar_con_version(db, models.LoteStock, lote_id, valores, version_esperada)
+    except EdicionConcurrenteError:
+        db.rollback()
+        raise
+    db.commit()
+    return _hidratar(db, models.LoteStock, datos) if datos else None
 
 def eliminar_lote_stock(db: Session, lote_id: int) -> bool:
     """
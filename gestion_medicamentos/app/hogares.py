@@ -0,0 +1,180 @@
+# Varios hogares en un mismo proceso.
+# Cada hogar tiene su propio archivo SQLite en GESTION_MEDICAMENTOS_DIRECTORIO_HOGARES
+# (ej. /var/lib/medicamentos/garcia.db), de modo que los datos de un hogar nunca se mezclan con los
+# de otro y ninguna consulta de crud.py necesita filtrar por hogar. El hogar de cada petición se
+# resuelve por el subdominio (garcia.medicamentos.example.com) o por la cabecera X-Hogar que añade
+# un proxy.
+#
+# Los engines y las factorías de sesión de los hogares usados recientemente se guardan en una caché
+# LRU acotada: un proceso puede atender miles de hogares manteniendo abiertos solo los activos.
+# Las migraciones pendientes de cada hogar (ver app/migraciones.py) se aplican una sola vez por
+# proceso, la primera vez que se usa.
+#
+# Uso (desde el directorio gestion_medicamentos):
+#   python -m app.hogares crear garcia
+#   python -m app.hogares listar
+
+import argparse
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from sqlalchemy.orm import sessionmaker
+
+from . import database, migraciones
+
+# Sin directorio configurado la aplicación funciona como siempre, con una sola base de datos.
+DIRECTORIO_HOGARES = os.environ.get("GESTION_MEDICAMENTOS_DIRECTORIO_HOGARES")
+# Dominio base para resolver el hogar por subdominio (ej. 'medicamentos.example.com').
+DOMINIO_HOGARES = os.environ.get("GESTION_MEDICAMENTOS_DOMINIO_HOGARES")
+CABECERA_HOGAR = "x-hogar"
+# Hogares con engine abierto a la vez. Con SQLite cada engine no mantiene conexiones abiertas
+# (se abren por sesión), así que el coste de un hogar en la caché es pequeño.
+MAX_HOGARES_ABIERTOS = int(os.environ.get("GESTION_MEDICAMENTOS_MAX_HOGARES_ABIERTOS", "256"))
+
+# Los identificadores se usan como nombre de archivo: solo minúsculas, dígitos, '-' y '_'.
+PATRON_HOGAR = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+class HogarNoEncontradoError(LookupError):
+    """El identificador de hogar no es válido o su base de datos no existe."""
+    def __init__(self, hogar: Optional[str]):
+        super().__init__(f"Hogar '{hogar}' no encontrado." if hogar else "No se indicó el hogar.")
+        self.hogar = hogar
+
+def multi_hogar() -> bool:
+    return bool(DIRECTORIO_HOGARES)
+
+def ruta_hogar(hogar: str) -> str:
+    if not PATRON_HOGAR.match(hogar or ""):
+        raise HogarNoEncontradoError(hogar)
+    return os.path.join(DIRECTORIO_HOGARES, f"{hogar}.db")
+
+class ConexionesHogar:
+    """Engines y factorías de sesión (escritura y solo lectura) de un hogar."""
+
+    def __init__(self, hogar: str, url: str):
+        self.hogar = hogar
+        self.engine = database.crear_engine(url)
+        self.engine_lectura = database.crear_engine_lectura(url, url_replica=None) or self.engine
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.SessionLectura = sessionmaker(autocommit=False, autoflush=False, bind=self.engine_lectura)
+        self._preparado = False
+        self._lock = threading.Lock()
+
+    def preparar(self):
+        """Crea o actualiza el esquema del hogar, una sola vez por proceso."""
+        if self._preparado:
+            return
+        with self._lock:
+            if self._preparado:
+                return
+            migraciones.migrar(self.engine)
+            self._preparado = True
+
+    def cerrar(self):
+        # Las sesiones en curso conservan su conexión; dispose solo descarta las del pool.
+        self.engine.dispose()
+        if self.engine_lectura is not self.engine:
+            self.engine_lectura.dispose()
+
+class CacheHogares:
+    """Caché LRU de `ConexionesHogar`, segura entre threads."""
+
+    def __init__(self, maximo: int = MAX_HOGARES_ABIERTOS):
+        self.maximo = maximo
+        self._hogares: "OrderedDict[str, ConexionesHogar]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, hogar: str, crear: bool = False) -> ConexionesHogar:
+        with self._lock:
+            conexiones = self._hogares.get(hogar)
+            if conexiones is not None:
+                self._hogares.move_to_end(hogar)
+            else:
+                ruta = ruta_hogar(hogar)
+                if not crear and not os.path.exists(ruta):
+                    # No se crean archivos por subdominios o cabeceras arbitrarias: ver `crear_hogar`.
+                    raise HogarNoEncontradoError(hogar)
+                conexiones = self._hogares[hogar] = ConexionesHogar(hogar, f"sqlite:///{ruta}")
+                while len(self._hogares) > self.maximo:
+                    _, expulsado = self._hogares.popitem(last=False)
+                    expulsado.cerrar()
+        conexiones.preparar() # Fuera del lock global: preparar un hogar nuevo no frena a los demás
+        return conexiones
+
+    def abiertos(self) -> int:
+        return len(self._hogares)
+
+    def engines(self) -> List:
+        """Engines de escritura de los hogares abiertos."""
+        with self._lock:
+            return [conexiones.engine for conexiones in self._hogares.values()]
+
+    def cerrar_todos(self):
+        with self._lock:
+            while self._hogares:
+                self._hogares.popitem()[1].cerrar()
+
+CACHE_HOGARES = CacheHogares()
+
+def hogar_de_peticion(cabeceras) -> Optional[str]:
+    """
+    Hogar de una petición a partir de sus cabeceras: X-Hogar si está presente; si no, el subdominio
+    de Host bajo DOMINIO_HOGARES. Devuelve None si no se puede determinar.
+    """
+    hogar = cabeceras.get(CABECERA_HOGAR)
+    if hogar:
+        return hogar.strip().lower()
+    if DOMINIO_HOGARES:
+        host = cabeceras.get("host", "").split(":")[0].lower()
+        sufijo = "." + DOMINIO_HOGARES.lower()
+        if host.endswith(sufijo):
+            return host[: -len(sufijo)]
+    return None
+
+def conexiones_de_peticion(cabeceras) -> ConexionesHogar:
+    """Conexiones del hogar de la petición. Lanza HogarNoEncontradoError si no hay hogar o no existe."""
+    hogar = hogar_de_peticion(cabeceras)
+    if not hogar:
+        raise HogarNoEncontradoError(None)
+    return CACHE_HOGARES.obtener(hogar)
+
+def crear_hogar(hogar: str) -> str:
+    """Crea la base de datos de un hogar nuevo (idempotente) y devuelve la ruta del archivo."""
+    if not multi_hogar():
+        raise RuntimeError("Defina GESTION_MEDICAMENTOS_DIRECTORIO_HOGARES para usar varios hogares.")
+    os.makedirs(DIRECTORIO_HOGARES, exist_ok=True)
+    CACHE_HOGARES.obtener(hogar, crear=True)
+    return ruta_hogar(hogar)
+
+def listar_hogares() -> List[str]:
+    if not multi_hogar() or not os.path.isdir(DIRECTORIO_HOGARES):
+        return []
+    return sorted(nombre[:-3] for nombre in os.listdir(DIRECTORIO_HOGARES)
+                  if nombre.endswith(".db") and PATRON_HOGAR.match(nombre[:-3]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Administra las bases de datos de los hogares.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    parser_crear = subparsers.add_parser("crear", help="Crea la base de datos de un hogar.")
+    parser_crear.add_argument("hogar", help="Identificador: minúsculas, dígitos, '-' y '_'.")
+    subparsers.add_parser("listar", help="Lista los hogares existentes.")
+    args = parser.parse_args()
+
+    if not multi_hogar():
+        parser.error("Defina GESTION_MEDICAMENTOS_DIRECTORIO_HOGARES.")
+    if args.comando == "crear":
+        try:
+            print(f"Hogar '{args.hogar}' listo en {crear_hogar(args.hogar)}")
+        except HogarNoEncontradoError:
+            parser.error(f"Identificador de hogar no válido: '{args.hogar}'.")
+        finally:
+            CACHE_HOGARES.cerrar_todos()
+    else:
+        for hogar in listar_hogares():
+            print(hogar)
+
+if __name__ == "__main__":
+    main()
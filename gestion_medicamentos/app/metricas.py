@@ -0,0 +1,145 @@
+# Métricas en formato de texto de Prometheus, sin dependencias externas.
+# Los contadores e histogramas se actualizan en memoria con operaciones O(1) (un bisect
+# para el bucket del histograma); el texto solo se genera cuando se consulta /metrics.
+
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+PREFIJO = "gestion_medicamentos"
+
+# Buckets (en segundos) pensados para páginas HTML servidas desde SQLite.
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Etiquetas = Tuple[Tuple[str, str], ...]
+
+def _formatear_etiquetas(etiquetas: Etiquetas) -> str:
+    if not etiquetas:
+        return ""
+    partes = []
+    for clave, valor in etiquetas:
+        valor = str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        partes.append(f'{clave}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+def _formatear_valor(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+class Contador:
+    """Contador monótono con etiquetas (ej. consultas por resultado de caché)."""
+
+    def __init__(self, nombre: str, ayuda: str):
+        self.nombre = f"{PREFIJO}_{nombre}"
+        self.ayuda = ayuda
+        self._valores: Dict[Etiquetas, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valor: float = 1, **etiquetas: str):
+        clave = tuple(sorted(etiquetas.items()))
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def valor(self, **etiquetas: str) -> float:
+        return self._valores.get(tuple(sorted(etiquetas.items())), 0)
+
+    def exponer(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            valores = list(self._valores.items())
+        for etiquetas, valor in valores:
+            lineas.append(f"{self.nombre}{_formatear_etiquetas(etiquetas)} {_formatear_valor(valor)}")
+        return lineas
+
+class Histograma:
+    """Histograma con buckets fijos, acumulativos solo al exponerse."""
+
+    def __init__(self, nombre: str, ayuda: str, buckets: Iterable[float] = BUCKETS_LATENCIA):
+        self.nombre = f"{PREFIJO}_{nombre}"
+        self.ayuda = ayuda
+        self.buckets = tuple(sorted(buckets))
+        # Por cada combinación de etiquetas: [conteos por bucket (+Inf al final), suma, total]
+        self._series: Dict[Etiquetas, list] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, **etiquetas: str):
+        clave = tuple(sorted(etiquetas.items()))
+        indice = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exponer(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = [(etiquetas, list(s[0]), s[1], s[2]) for etiquetas, s in self._series.items()]
+        for etiquetas, conteos, suma, total in series:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float("inf"),), conteos):
+                acumulado += conteo
+                etiquetas_bucket = etiquetas + (("le", _formatear_valor(limite)),)
+                lineas.append(f"{self.nombre}_bucket{_formatear_etiquetas(etiquetas_bucket)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_formatear_etiquetas(etiquetas)} {_formatear_valor(suma)}")
+            lineas.append(f"{self.nombre}_count{_formatear_etiquetas(etiquetas)} {total}")
+        return lineas
+
+# Un gauge se calcula en el momento de la consulta a /metrics mediante una función que devuelve
+# una lista de (etiquetas, valor). Así no hay coste alguno en las rutas normales.
+FuncionGauge = Callable[[], List[Tuple[Dict[str, str], float]]]
+
+class Registro:
+    def __init__(self):
+        self._metricas: list = []
+        self._gauges: List[Tuple[str, str, FuncionGauge]] = []
+
+    def contador(self, nombre: str, ayuda: str) -> Contador:
+        metrica = Contador(nombre, ayuda)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nombre: str, ayuda: str, buckets: Iterable[float] = BUCKETS_LATENCIA) -> Histograma:
+        metrica = Histograma(nombre, ayuda, buckets)
+        self._metricas.append(metrica)
+        return metrica
+
+    def gauge(self, nombre: str, ayuda: str, funcion: FuncionGauge):
+        self._gauges.append((f"{PREFIJO}_{nombre}", ayuda, funcion))
+
+    def exponer(self) -> str:
+        lineas: List[str] = []
+        for metrica in self._metricas:
+            lineas.extend(metrica.exponer())
+        for nombre, ayuda, funcion in self._gauges:
+            try:
+                muestras = funcion()
+            except Exception as e: # Un gauge que falla no debe romper el resto de la exposición
+                lineas.append(f"# Error calculando {nombre}: {e}")
+                continue
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} gauge")
+            for etiquetas, valor in muestras:
+                lineas.append(f"{nombre}{_formatear_etiquetas(tuple(sorted(etiquetas.items())))} {_formatear_valor(valor)}")
+        return "\n".join(lineas) + "\n"
+
+REGISTRO = Registro()
+
+# --- Métricas compartidas por la web y la capa de base de datos ---
+LATENCIA_PETICIONES = REGISTRO.histograma(
+    "http_request_duration_seconds", "Duración de las peticiones HTTP por nombre de ruta."
+)
+CONSULTAS_SQL = REGISTRO.contador(
+    "db_statements_total",
+    "Sentencias SQL ejecutadas, por resultado de la caché de compilación de SQLAlchemy (hit/miss/sin_cache)."
+)
+
+def tasa_aciertos(contador: Contador, etiqueta: str = "cache") -> Optional[float]:
+    """Proporción de 'hit' sobre 'hit' + 'miss' de un contador, o None si no hubo consultas."""
+    aciertos = contador.valor(**{etiqueta: "hit"})
+    fallos = contador.valor(**{etiqueta: "miss"})
+    total = aciertos + fallos
+    return aciertos / total if total else None
@@ -0,0 +1,218 @@
+# Migraciones del esquema.
+# Cada cambio de esquema que necesita algo más que `create_all` (columnas nuevas en tablas existentes,
+# índices, columnas derivadas que hay que rellenar) es una migración numerada en `MIGRACIONES`.
+# Las aplicadas se anotan en la tabla `schema_migraciones`, así que al arrancar basta una consulta
+# para saber que no queda nada pendiente.
+#
+# Las migraciones deben ser idempotentes: si dos procesos arrancan a la vez (ej. varios workers de
+# uvicorn) ambos pueden ejecutar la misma migración, y el segundo no debe fallar ni duplicar nada.
+# Los rellenos de datos se hacen por bloques de filas, con una transacción por bloque, para que SQLite
+# no quede bloqueado para escritura durante todo el proceso.
+#
+# Uso (desde el directorio gestion_medicamentos):
+#   python -m app.migraciones             # aplica las pendientes
+#   python -m app.migraciones --estado    # lista aplicadas y pendientes sin aplicar nada
+#   python main_cli.py db migrar          # lo mismo desde la CLI
+
+import argparse
+import os
+import time
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, and_, func, select, update
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.exc import IntegrityError
+
+from . import database, models
+
+# Filas por transacción en los rellenos y pausa entre bloques (segundos) para dejar pasar a otros escritores.
+TAMANO_BLOQUE_MIGRACION = int(os.environ.get("GESTION_MEDICAMENTOS_TAMANO_BLOQUE_MIGRACION", "1000"))
+PAUSA_ENTRE_BLOQUES = float(os.environ.get("GESTION_MEDICAMENTOS_PAUSA_MIGRACION", "0"))
+
+# Fuera de models.Base: no es parte del modelo de la aplicación y create_all no debe tocarla.
+_metadata_migraciones = MetaData()
+tabla_migraciones = Table(
+    "schema_migraciones", _metadata_migraciones,
+    Column("id", String(100), primary_key=True),
+    Column("aplicada_en", DateTime, nullable=False),
+)
+
+class Migracion(NamedTuple):
+    id: str
+    descripcion: str
+    funcion: Callable # funcion(bind, tamano_bloque)
+
+MIGRACIONES: List[Migracion] = []
+
+def migracion(identificador: str, descripcion: str):
+    """Registra una migración. Se aplican en el orden en que se declaran en este módulo."""
+    def registrar(funcion):
+        MIGRACIONES.append(Migracion(identificador, descripcion, funcion))
+        return funcion
+    return registrar
+
+def rellenar_por_bloques(bind, tabla, valores: dict, condicion, tamano_bloque: int = TAMANO_BLOQUE_MIGRACION,
+                         pausa: float = PAUSA_ENTRE_BLOQUES) -> int:
+    """
+    UPDATE de `valores` en las filas de `tabla` que cumplen `condicion`, recorriéndolas por id en bloques
+    de `tamano_bloque` con una transacción por bloque. Devuelve la cantidad de filas actualizadas.
+    Si se interrumpe, volver a ejecutarla continúa donde quedó siempre que `condicion` excluya las filas
+    ya rellenadas (ej. `columna IS NULL`).
+    """
+    total = 0
+    ultimo_id = None
+    while True:
+        with bind.begin() as conn:
+            consulta = select(tabla.c.id).where(condicion).order_by(tabla.c.id).limit(tamano_bloque)
+            if ultimo_id is not None:
+                consulta = consulta.where(tabla.c.id > ultimo_id)
+            ids = conn.execute(consulta).scalars().all()
+            if not ids:
+                return total
+            conn.execute(update(tabla).where(tabla.c.id.in_(ids)).values(**valores))
+        total += len(ids)
+        ultimo_id = ids[-1]
+        if pausa:
+            time.sleep(pausa)
+
+# --- Migraciones ---
+
+@migracion("0001_esquema_base", "Tablas, columnas e índices de los modelos e índice de búsqueda FTS5")
+def _esquema_base(bind, tamano_bloque: int):
+    # Lo que antes se hacía en cada arranque. Sobre una base de datos nueva crea todo el esquema.
+    models.Base.metadata.create_all(bind=bind)
+    database.agregar_columnas_faltantes(bind)
+    database.crear_indices_faltantes(bind)
+    database.crear_indice_busqueda(bind)
+
+@migracion("0002_duracion_por_caja_dias", "Columna derivada medicamentos.duracion_por_caja_dias")
+def _duracion_por_caja_dias(bind, tamano_bloque: int):
+    from .crud import expresion_duracion_por_caja_dias # crud importa toda la capa de datos: solo si hace falta
+
+    database.agregar_columnas_faltantes(bind)
+    tabla = models.Medicamento.__table__
+    actualizadas = rellenar_por_bloques(
+        bind, tabla,
+        {"duracion_por_caja_dias": expresion_duracion_por_caja_dias(
+            bind.dialect.name, tabla.c.unidades_por_caja, tabla.c.consumo_diario_unidades)},
+        and_(tabla.c.duracion_por_caja_dias.is_(None), tabla.c.consumo_diario_unidades > 0,
+             tabla.c.unidades_por_caja > 0),
+        tamano_bloque,
+    )
+    if actualizadas:
+        print(f"duracion_por_caja_dias calculada en {actualizadas} medicamentos.")
+
+# Tablas activas cuyas filas se archivan (app/archivo.py) y su tabla de archivo.
+TABLAS_ARCHIVADAS = [
+    (models.LoteStock.__table__, models.LoteStockArchivado.__table__),
+    (models.Pedido.__table__, models.PedidoArchivado.__table__),
+    (models.DetallePedido.__table__, models.DetallePedidoArchivado.__table__),
+]
+
+def _id_maximo(conn, *tablas) -> int:
+    return max(conn.execute(select(func.max(tabla.c.id))).scalar() or 0 for tabla in tablas)
+
+@migracion("0003_ids_sin_reutilizar", "AUTOINCREMENT en lotes_stock, pedidos y detalles_pedido (ids únicos frente al archivo)")
+def _ids_sin_reutilizar(bind, tamano_bloque: int):
+    # SQLite reutiliza el id más alto liberado, así que una fila nueva podía repetir el id de una archivada
+    # y el siguiente archivado fallaba. En PostgreSQL las secuencias nunca retroceden: no hay nada que hacer.
+    if bind.dialect.name != "sqlite":
+        return
+    models.Base.metadata.create_all(bind=bind) # Tablas de archivo, si la base de datos es anterior a ellas
+    for tabla, tabla_archivo in TABLAS_ARCHIVADAS:
+        # SQLite no permite añadir AUTOINCREMENT a una tabla existente: se reconstruye (copia, borra y
+        # renombra) en una sola transacción. La aplicación no activa PRAGMA foreign_keys, así que borrar
+        # la tabla original no afecta a las que la referencian.
+        with bind.begin() as conn:
+            sql = conn.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla.name,)).scalar()
+            if "AUTOINCREMENT" not in sql.upper():
+                nueva = f"{tabla.name}_nueva"
+                ddl = str(CreateTable(tabla).compile(dialect=bind.dialect))
+                conn.exec_driver_sql(ddl.replace(f"CREATE TABLE {tabla.name} (", f"CREATE TABLE {nueva} (", 1))
+                columnas = ", ".join(columna.name for columna in tabla.columns)
+                conn.exec_driver_sql(f"INSERT INTO {nueva} ({columnas}) SELECT {columnas} FROM {tabla.name}")
+                conn.exec_driver_sql(f"DROP TABLE {tabla.name}")
+                conn.exec_driver_sql(f"ALTER TABLE {nueva} RENAME TO {tabla.name}")
+                for indice in tabla.indexes:
+                    indice.create(conn)
+            # Filas creadas después de archivar otras con el mismo id: se les da un id nuevo (y a los
+            # detalles de un pedido renumerado, su nuevo pedido_id).
+            maximo = _id_maximo(conn, tabla, tabla_archivo)
+            repetidos = select(tabla_archivo.c.id)
+            if tabla is models.Pedido.__table__:
+                detalles = models.DetallePedido.__table__
+                conn.execute(update(detalles).where(detalles.c.pedido_id.in_(repetidos))
+                             .values(pedido_id=detalles.c.pedido_id + maximo))
+            renumeradas = conn.execute(update(tabla).where(tabla.c.id.in_(repetidos)).values(id=tabla.c.id + maximo)).rowcount
+            if renumeradas:
+                print(f"{renumeradas} filas de {tabla.name} con un id ya archivado renumeradas.")
+            # El contador de AUTOINCREMENT no debe quedar por debajo de ningún id archivado
+            secuencia = max(
+                conn.exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = ?", (tabla.name,)).scalar() or 0,
+                _id_maximo(conn, tabla, tabla_archivo),
+            )
+            conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = ?", (tabla.name,))
+            conn.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (tabla.name, secuencia))
+
+# --- Ejecución ---
+
+def aplicadas(bind) -> List[str]:
+    tabla_migraciones.create(bind, checkfirst=True)
+    with bind.connect() as conn:
+        return list(conn.execute(select(tabla_migraciones.c.id)).scalars())
+
+def pendientes(bind=None) -> List[Migracion]:
+    bind = bind if bind is not None else database.obtener_engine()
+    hechas = set(aplicadas(bind))
+    return [m for m in MIGRACIONES if m.id not in hechas]
+
+def migrar(bind=None, tamano_bloque: int = TAMANO_BLOQUE_MIGRACION, hasta: Optional[str] = None) -> List[str]:
+    """
+    Aplica en orden las migraciones pendientes (hasta `hasta` inclusive, si se indica) y devuelve sus ids.
+    Con el esquema al día solo consulta `schema_migraciones`.
+    """
+    bind = bind if bind is not None else database.obtener_engine()
+    aplicadas_ahora = []
+    for m in pendientes(bind):
+        inicio = time.perf_counter()
+        m.funcion(bind, tamano_bloque)
+        try:
+            with bind.begin() as conn:
+                conn.execute(tabla_migraciones.insert().values(id=m.id, aplicada_en=datetime.now()))
+        except IntegrityError:
+            pass # Otro proceso la aplicó al mismo tiempo; las migraciones son idempotentes
+        print(f"Migración {m.id} aplicada ({(time.perf_counter() - inicio) * 1000:.0f} ms).")
+        aplicadas_ahora.append(m.id)
+        if m.id == hasta:
+            break
+    return aplicadas_ahora
+
+def estado(bind=None) -> List[dict]:
+    """Una fila por migración conocida, con la fecha en que se aplicó (None si está pendiente)."""
+    bind = bind if bind is not None else database.obtener_engine()
+    tabla_migraciones.create(bind, checkfirst=True)
+    with bind.connect() as conn:
+        fechas = dict(conn.execute(select(tabla_migraciones.c.id, tabla_migraciones.c.aplicada_en)).all())
+    return [{"id": m.id, "descripcion": m.descripcion, "aplicada_en": fechas.get(m.id)} for m in MIGRACIONES]
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplica las migraciones pendientes del esquema.")
+    parser.add_argument("--estado", action="store_true", help="Solo muestra las migraciones aplicadas y pendientes.")
+    parser.add_argument("--hasta", metavar="ID", help="Aplica las pendientes hasta esta migración inclusive.")
+    parser.add_argument("--tamano-bloque", type=int, default=TAMANO_BLOQUE_MIGRACION,
+                        help="Filas por transacción en los rellenos de datos.")
+    args = parser.parse_args()
+    if args.hasta and args.hasta not in {m.id for m in MIGRACIONES}:
+        parser.error(f"Migración desconocida: '{args.hasta}'.")
+
+    if args.estado:
+        for fila in estado():
+            print(f"{fila['id']:32} {fila['aplicada_en'] or 'pendiente'}  {fila['descripcion']}")
+        return
+    if not migrar(tamano_bloque=args.tamano_bloque, hasta=args.hasta):
+        print("El esquema está al día.")
+
+if __name__ == "__main__":
+    main()
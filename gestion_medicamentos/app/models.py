@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Date, Float, ForeignKey, Enum as SQLAlchemyEnum, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, Date, Float, ForeignKey, Enum as SQLAlchemyEnum, Boolean, Index
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func, expression # Para valores por defecto como now() y server_default=expression.true()
 import enum
@@ -18,13 +18,17 @@ class Medicamento(Base):
     marca = Column(String, nullable=True)
     unidades_por_caja = Column(Integer, nullable=False)
     # El stock_total_unidades se calculará dinámicamente a partir de LotesStock
-    # duracion_por_caja_dias = Column(Integer, nullable=True) # Considerar si es mejor calcularlo o si es fijo
+    # Días que dura una caja al consumo diario indicado (unidades_por_caja / consumo_diario_unidades,
+    # truncado). Es un valor derivado que mantiene crud.py; la migración 0002 lo rellenó en las filas existentes.
+    duracion_por_caja_dias = Column(Integer, nullable=True)
     # fecha_ultima_compra se puede obtener del lote más reciente
     # fecha_vencimiento_proxima se puede obtener del lote con vencimiento más cercano
     precio_por_caja_referencia = Column(Float, nullable=True) # Precio de referencia o último conocido
     esta_activo = Column(Boolean, default=True, nullable=False, server_default=expression.true())
     vencimiento_receta = Column(Date, nullable=True) # Fecha de vencimiento de la receta, opcional
     consumo_diario_unidades = Column(Float, nullable=True) # Unidades consumidas por día
+    # Control de concurrencia optimista: cada UPDATE incrementa la versión (ver crud._actualizar_con_version)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     lotes = relationship("LoteStock", back_populates="medicamento", cascade="all, delete-orphan")
     detalles_pedido = relationship("DetallePedido", back_populates="medicamento")
@@ -32,8 +36,20 @@ class Medicamento(Base):
     def __repr__(self):
         return f"<Medicamento(id={self.id}, nombre='{self.nombre}', marca='{self.marca}')>"
 
+# Índice único sobre lower(nombre): impide nombres repetidos sin distinguir mayúsculas
+# (incluso con dos altas concurrentes) y permite que la búsqueda por nombre de
+# `crud.obtener_medicamento_por_nombre` use el índice en lugar de recorrer la tabla.
+UQ_MEDICAMENTO_NOMBRE = "uq_medicamentos_nombre_lower"
+Index(UQ_MEDICAMENTO_NOMBRE, func.lower(Medicamento.nombre), unique=True)
+
+# Las tablas cuyas filas se archivan (ver app/archivo.py) usan AUTOINCREMENT en SQLite: sin él, SQLite
+# reutiliza el id más alto liberado y una fila nueva podría repetir el id de una ya archivada.
+# En PostgreSQL las secuencias nunca reutilizan valores. La migración 0003 lo aplica a bases de datos existentes.
+SIN_REUTILIZAR_IDS = {"sqlite_autoincrement": True}
+
 class LoteStock(Base):
     __tablename__ = "lotes_stock"
+    __table_args__ = SIN_REUTILIZAR_IDS
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     medicamento_id = Column(Integer, ForeignKey("medicamentos.id"), nullable=False)
@@ -42,6 +58,7 @@ class LoteStock(Base):
     fecha_compra_lote = Column(Date, nullable=False, default=func.current_date())
     fecha_vencimiento_lote = Column(Date, nullable=False)
     precio_compra_lote_por_caja = Column(Float, nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     medicamento = relationship("Medicamento", back_populates="lotes")
 
@@ -54,12 +71,14 @@ class LoteStock(Base):
 
 class Pedido(Base):
     __tablename__ = "pedidos"
+    __table_args__ = SIN_REUTILIZAR_IDS
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     fecha_pedido = Column(Date, nullable=False, default=func.current_date())
     proveedor = Column(String, nullable=True)
     # costo_total_pedido se calculará a partir de los DetallesPedido
     estado = Column(SQLAlchemyEnum(EstadoPedido), nullable=False, default=EstadoPedido.PENDIENTE)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     detalles = relationship("DetallePedido", back_populates="pedido", cascade="all, delete-orphan")
 
@@ -68,6 +87,7 @@ class Pedido(Base):
 
 class DetallePedido(Base):
     __tablename__ = "detalles_pedido"
+    __table_args__ = SIN_REUTILIZAR_IDS
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     pedido_id = Column(Integer, ForeignKey("pedidos.id"), nullable=False)
@@ -87,6 +107,45 @@ class DetallePedido(Base):
     def __repr__(self):
         return f"<DetallePedido(id={self.id}, pedido_id={self.pedido_id}, med_id={self.medicamento_id}, cajas={self.cantidad_cajas_pedidas})>"
 
+# --- Tablas de archivo ---
+# Los lotes vencidos y los pedidos cerrados antiguos se mueven aquí (ver app/archivo.py) para que
+# `lotes_stock`, `pedidos` y `detalles_pedido` se mantengan pequeñas. Las columnas son las mismas
+# (con el mismo id, que nunca se reutiliza en las tablas activas) más la fecha de archivado. No tienen claves foráneas hacia las tablas activas:
+# eliminar un medicamento no borra su historial archivado.
+
+class LoteStockArchivado(Base):
+    __tablename__ = "lotes_stock_archivo"
+
+    id = Column(Integer, primary_key=True, autoincrement=False) # Mismo id que tenía en lotes_stock
+    medicamento_id = Column(Integer, nullable=False, index=True)
+    cantidad_cajas = Column(Integer, nullable=False)
+    unidades_por_caja_lote = Column(Integer, nullable=False)
+    fecha_compra_lote = Column(Date, nullable=False)
+    fecha_vencimiento_lote = Column(Date, nullable=False)
+    precio_compra_lote_por_caja = Column(Float, nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    fecha_archivado = Column(Date, nullable=False)
+
+class PedidoArchivado(Base):
+    __tablename__ = "pedidos_archivo"
+
+    id = Column(Integer, primary_key=True, autoincrement=False) # Mismo id que tenía en pedidos
+    fecha_pedido = Column(Date, nullable=False, index=True)
+    proveedor = Column(String, nullable=True)
+    estado = Column(SQLAlchemyEnum(EstadoPedido), nullable=False)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    fecha_archivado = Column(Date, nullable=False)
+
+class DetallePedidoArchivado(Base):
+    __tablename__ = "detalles_pedido_archivo"
+
+    id = Column(Integer, primary_key=True, autoincrement=False) # Mismo id que tenía en detalles_pedido
+    pedido_id = Column(Integer, nullable=False, index=True)
+    medicamento_id = Column(Integer, nullable=False)
+    cantidad_cajas_pedidas = Column(Integer, nullable=False)
+    precio_unitario_compra_caja = Column(Float, nullable=True)
+    fecha_archivado = Column(Date, nullable=False)
+
 # Ejemplo de cómo se podría calcular el stock total o la fecha de vencimiento próxima en la lógica de la aplicación:
 # (Esto no va en models.py, sino en la capa de servicio/lógica)
 #
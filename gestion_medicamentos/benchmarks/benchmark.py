@@ -0,0 +1,459 @@
+# Suite de benchmarks de gestion_medicamentos.
+# Mide cada ruta de main_web.py (a través de TestClient, sin red) y las funciones clave de
+# app/crud.py sobre una base de datos generada con benchmarks/generar_datos.py.
+# Los resultados se guardan en JSON para poder compararlos entre versiones. Los casos se ejecutan
+# sobre una copia temporal de la base de datos: la original no cambia y cada ejecución mide lo mismo.
+#
+# Uso (desde el directorio gestion_medicamentos):
+#   python benchmarks/generar_datos.py --db /tmp/bench.db
+#   python benchmarks/benchmark.py --db /tmp/bench.db --salida resultados.json
+#   python benchmarks/benchmark.py --db /tmp/bench.db --comparar resultados.json   # detecta regresiones
+
+import argparse
+import atexit
+import json
+import os
+import platform
+import re
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # gestion_medicamentos
+
+import sqlalchemy
+from sqlalchemy import func
+
+from app import archivo, autenticacion, crud, database, migraciones, models
+
+AUTH = ("admin", "securepassword123") # Credenciales de ejemplo de main_web.py
+RUTAS_EXCLUIDAS = {"openapi", "swagger_ui_html", "swagger_ui_redirect", "redoc_html"}
+
+class Caso:
+    """
+    Un caso de benchmark. `ejecutar(i)` es lo que se cronometra; `preparar(i)` (opcional)
+    se ejecuta antes de cada repetición fuera de la medición (p. ej. crear el registro a eliminar)
+    y su resultado se pasa a `ejecutar`.
+    """
+    def __init__(self, nombre: str, tipo: str, ejecutar: Callable, preparar: Optional[Callable] = None,
+                 ruta: Optional[str] = None):
+        self.nombre = nombre
+        self.tipo = tipo # "http", "crud", "auth" o "arranque"
+        self.ejecutar = ejecutar
+        self.preparar = preparar
+        self.ruta = ruta # Nombre de la ruta de main_web cubierta por el caso (solo "http")
+
+def copiar_base_de_datos(ruta: str) -> str:
+    """
+    Copia la base de datos a un directorio temporal que se borra al terminar y devuelve la ruta de la copia.
+    Los casos crean, editan, eliminan y archivan datos: así cada ejecución parte de la misma base de datos.
+    """
+    directorio = tempfile.mkdtemp(prefix="benchmark_medicamentos_")
+    atexit.register(shutil.rmtree, directorio, ignore_errors=True)
+    copia = os.path.join(directorio, os.path.basename(ruta))
+    origen, destino = sqlite3.connect(ruta), sqlite3.connect(copia)
+    try:
+        origen.backup(destino) # Incluye lo que aún esté en el WAL
+    finally:
+        origen.close()
+        destino.close()
+    return copia
+
+def usar_base_de_datos(url: str):
+    """Apunta la aplicación a la base de datos de benchmark (nunca a la de data/)."""
+    database.configurar_base_de_datos(url)
+    migraciones.migrar() # Mismo esquema que la aplicación (ej. los ids sin reutilizar de la migración 0003)
+    database.crear_indices_faltantes()
+    database.crear_indice_busqueda()
+
+def _consultas_de_cabecera(response) -> Optional[int]:
+    coincidencia = re.search(r'(\d+) consultas', response.headers.get("Server-Timing", ""))
+    return int(coincidencia.group(1)) if coincidencia else None
+
+def construir_casos(client) -> List[Caso]:
+    db = database.SessionLocal()
+    try:
+        med_id = db.query(func.min(models.Medicamento.id)).scalar()
+        pedido_id = db.query(func.min(models.Pedido.id)).scalar()
+        lote_id = db.query(func.min(models.LoteStock.id)).filter(models.LoteStock.medicamento_id == med_id).scalar() \
+            or db.query(func.min(models.LoteStock.id)).scalar()
+        lote_medicamento_id = db.query(models.LoteStock.medicamento_id).filter(models.LoteStock.id == lote_id).scalar()
+        # Distinto de pedido_id: los casos que añaden o eliminan ítems necesitan que siga pendiente
+        pedido_pendiente_id = db.query(func.min(models.Pedido.id)).filter(
+            models.Pedido.estado == models.EstadoPedido.PENDIENTE, models.Pedido.id != pedido_id).scalar()
+        mes_con_pedidos = crud.obtener_meses_con_pedidos(db)[:1]
+    finally:
+        db.close()
+    if None in (med_id, pedido_id, lote_id, pedido_pendiente_id):
+        raise SystemExit("La base de datos no tiene datos suficientes. Genérela con benchmarks/generar_datos.py.")
+    anio_mes = mes_con_pedidos[0] if mes_con_pedidos else {"anio": date.today().year, "mes": date.today().month}
+
+    def get(url, ruta):
+        def ejecutar(_i, _preparado=None):
+            r = client.get(url, auth=AUTH)
+            assert r.status_code == 200, f"{url}: {r.status_code}"
+            return r
+        return Caso(f"GET {url}", "http", ejecutar, ruta=ruta)
+
+    def post(url_fn, datos_fn, ruta, preparar=None):
+        def ejecutar(i, preparado=None):
+            url = url_fn(preparado)
+            r = client.post(url, data=datos_fn(i, preparado), auth=AUTH, follow_redirects=False)
+            assert r.status_code in (200, 303), f"{url}: {r.status_code} {r.text[:200]}"
+            return r
+        return Caso(f"POST {ruta}", "http", ejecutar, preparar=preparar, ruta=ruta)
+
+    def con_sesion(funcion):
+        def preparar(i):
+            db = database.SessionLocal()
+            try:
+                return funcion(db, i)
+            finally:
+                db.close()
+        return preparar
+
+    manana = (date.today() + timedelta(days=365)).isoformat()
+    crear_med_tmp = con_sesion(lambda db, i: crud.crear_medicamento(
+        db, nombre=f"Bench eliminar {uuid.uuid4().hex}", marca=None, unidades_por_caja=10).id)
+    crear_pedido_tmp = con_sesion(lambda db, i: crud.crear_pedido(db, proveedor="Bench").id)
+    crear_lote_tmp = con_sesion(lambda db, i: crud.agregar_lote_stock(
+        db, medicamento_id=med_id, cantidad_cajas=1, unidades_por_caja_lote=10,
+        fecha_vencimiento_lote=date.today() + timedelta(days=365)).id)
+    crear_detalle_tmp = con_sesion(lambda db, i: crud.agregar_detalle_pedido(
+        db, pedido_id=pedido_pendiente_id, medicamento_id=med_id, cantidad_cajas_pedidas=1).id)
+
+    casos = [
+        get("/", "root"),
+        get("/medicamentos/", "listar_todos_medicamentos"),
+        get("/medicamentos/buscar/?q=ibup", "buscar_medicamentos"),
+        get("/medicamentos/nuevo/", "crear_medicamento_form"),
+        get(f"/medicamentos/{med_id}/", "detalle_medicamento"),
+        get(f"/medicamentos/{med_id}/editar/", "editar_medicamento_form"),
+        get(f"/medicamentos/{med_id}/eliminar/", "eliminar_medicamento_confirm_form"),
+        get(f"/medicamentos/{med_id}/lotes/nuevo/", "crear_lote_form"),
+        get(f"/lotes/{lote_id}/editar/", "editar_lote_form"),
+        get(f"/lotes/{lote_id}/eliminar/", "eliminar_lote_confirm_form"),
+        get("/pedidos/", "listar_todos_pedidos"),
+        get("/pedidos/nuevo/", "crear_pedido_form"),
+        get(f"/pedidos/{pedido_id}/", "detalle_pedido_ruta"),
+        get(f"/pedidos/{pedido_id}/editar/", "editar_pedido_form"),
+        get(f"/pedidos/{pedido_id}/eliminar/", "eliminar_pedido_confirm_form"),
+        get(f"/pedidos/{pedido_pendiente_id}/items/nuevo/", "crear_detalle_pedido_form"),
+        get("/stock/", "vista_stock_global"),
+        get("/reportes/costos-mensuales/", "reporte_costos_mensuales"),
+        get(f"/reportes/costos-mensuales/?anio={anio_mes['anio']}&mes={anio_mes['mes']}", "reporte_costos_mensuales"),
+        get("/reportes/stock-por-vencimiento/", "reporte_stock_vencimiento"),
+        get("/reportes/recetas-por-vencimiento/", "reporte_recetas_vencimiento"),
+        get("/metrics", "metricas"),
+        post(lambda _p: "/medicamentos/nuevo/",
+             lambda i, _p: {"nombre": f"Bench {uuid.uuid4().hex}", "unidades_por_caja": "20", "esta_activo": "true"},
+             "crear_medicamento_submit"),
+        post(lambda _p: f"/medicamentos/{med_id}/editar/",
+             lambda i, _p: {"nombre": f"Bench editado {uuid.uuid4().hex}", "unidades_por_caja": str(10 + i % 2),
+                            "esta_activo": "true"},
+             "editar_medicamento_submit"),
+        post(lambda p: f"/medicamentos/{p}/eliminar/", lambda i, _p: {}, "eliminar_medicamento_submit",
+             preparar=crear_med_tmp),
+        post(lambda _p: f"/medicamentos/{med_id}/lotes/nuevo/",
+             lambda i, _p: {"cantidad_cajas": "2", "unidades_por_caja_lote": "20", "fecha_vencimiento_lote": manana},
+             "crear_lote_submit"),
+        post(lambda _p: f"/lotes/{lote_id}/editar/",
+             lambda i, _p: {"cantidad_cajas": str(1 + i % 5), "unidades_por_caja_lote": "20",
+                            "fecha_compra_lote": date.today().isoformat(), "fecha_vencimiento_lote": manana,
+                            "medicamento_id": str(lote_medicamento_id)},
+             "editar_lote_submit"),
+        post(lambda p: f"/lotes/{p}/eliminar/", lambda i, _p: {}, "eliminar_lote_submit", preparar=crear_lote_tmp),
+        post(lambda _p: "/pedidos/nuevo/",
+             lambda i, _p: {"fecha_pedido": date.today().isoformat(), "proveedor": "Bench", "estado": "PENDIENTE"},
+             "crear_pedido_submit"),
+        # Sobre un pedido nuevo en cada repetición: marcarlo RECIBIDO no cambia los pedidos de los demás casos
+        post(lambda p: f"/pedidos/{p}/editar/",
+             lambda i, _p: {"fecha_pedido": date.today().isoformat(), "proveedor": f"Bench {i}", "estado": "RECIBIDO"},
+             "editar_pedido_submit", preparar=crear_pedido_tmp),
+        post(lambda p: f"/pedidos/{p}/eliminar/", lambda i, _p: {}, "eliminar_pedido_submit", preparar=crear_pedido_tmp),
+        post(lambda _p: f"/pedidos/{pedido_pendiente_id}/items/nuevo/",
+             lambda i, _p: {"medicamento_id": str(med_id), "cantidad_cajas_pedidas": "1"},
+             "crear_detalle_pedido_submit"),
+        post(lambda p: f"/pedidos/{pedido_pendiente_id}/items/{p}/eliminar/", lambda i, _p: {},
+             "eliminar_detalle_pedido_submit", preparar=crear_detalle_tmp),
+    ]
+
+    def caso_crud(nombre, funcion):
+        def ejecutar(_i, _preparado=None):
+            db = database.SessionLocal()
+            try:
+                return funcion(db)
+            finally:
+                db.close()
+        return Caso(f"crud.{nombre}", "crud", ejecutar)
+
+    casos += [
+        caso_crud("obtener_medicamentos(limit=1000)", lambda db: crud.obtener_medicamentos(db, limit=1000)),
+        caso_crud("obtener_medicamento_por_nombre", lambda db: crud.obtener_medicamento_por_nombre(db, "no existe")),
+        caso_crud("buscar_medicamentos", lambda db: crud.buscar_medicamentos(db, "paracet")),
+        caso_crud("calcular_stock_total_unidades", lambda db: crud.calcular_stock_total_unidades(db, med_id)),
+        caso_crud("calcular_fecha_vencimiento_proxima", lambda db: crud.calcular_fecha_vencimiento_proxima(db, med_id)),
+        caso_crud("obtener_lotes_stock_ordenados_por_vencimiento",
+                  lambda db: crud.obtener_lotes_stock_ordenados_por_vencimiento(db)),
+        caso_crud("obtener_pedidos(limit=1000)", lambda db: crud.obtener_pedidos(db, limit=1000)),
+        caso_crud("calcular_costo_total_pedido", lambda db: crud.calcular_costo_total_pedido(db, pedido_id)),
+        caso_crud("obtener_meses_con_pedidos", lambda db: crud.obtener_meses_con_pedidos(db)),
+        caso_crud("obtener_costos_pedidos_por_mes_anio",
+                  lambda db: crud.obtener_costos_pedidos_por_mes_anio(db, anio_mes["anio"], anio_mes["mes"])),
+        caso_crud("calcular_valor_total_stock", lambda db: crud.calcular_valor_total_stock(db)),
+        caso_crud("contar_lotes_por_vencer", lambda db: crud.contar_lotes_por_vencer(db)),
+        caso_archivar(med_id),
+    ]
+    return casos + casos_autenticacion(client)
+
+def caso_archivar(med_id: int) -> Caso:
+    """
+    archivo.archivar de un pedido cerrado y un lote vencido recién creados. Son las filas con el id más
+    alto, así que cada repetición comprueba que las nuevas no repiten el id de las archivadas en la anterior.
+    La primera ejecución archiva además todo lo antiguo de la base de datos generada.
+    """
+    antiguo = date.today() - timedelta(days=2 * 365)
+
+    def preparar(_i):
+        db = database.SessionLocal()
+        try:
+            pedido = crud.crear_pedido(db, fecha_pedido=antiguo, proveedor="Bench archivo",
+                                       estado=models.EstadoPedido.RECIBIDO)
+            crud.agregar_detalle_pedido(db, pedido_id=pedido.id, medicamento_id=med_id, cantidad_cajas_pedidas=1)
+            crud.agregar_lote_stock(db, medicamento_id=med_id, cantidad_cajas=1, unidades_por_caja_lote=10,
+                                    fecha_vencimiento_lote=antiguo)
+        finally:
+            db.close()
+
+    def ejecutar(_i, _preparado=None):
+        db = database.SessionLocal()
+        try:
+            resultado = archivo.archivar(db)
+        finally:
+            db.close()
+        assert resultado["pedidos"] >= 1 and resultado["lotes_stock"] >= 1, f"archivar: {resultado}"
+        return resultado
+    return Caso("archivo.archivar (ids reutilizados)", "crud", ejecutar, preparar=preparar)
+
+def casos_autenticacion(client) -> List[Caso]:
+    """
+    Coste de autenticar una petición por cada camino de app/autenticacion.py: hash PBKDF2 completo,
+    verificación en caché y cookie de sesión firmada, por separado y a través de una ruta real.
+    """
+    import main_web
+    backend = main_web.backend_autenticacion
+    usuario = autenticacion.verificar(backend, *AUTH)
+    if usuario is None:
+        raise SystemExit("Las credenciales de AUTH no son válidas para el backend de autenticación configurado.")
+    cookie = autenticacion.crear_cookie_sesion(usuario)
+
+    def sin_cache(_i):
+        autenticacion.CACHE_VERIFICACIONES.limpiar()
+
+    def sin_cookie(_i):
+        client.cookies.clear()
+
+    def con_cookie(_i):
+        client.cookies.set(autenticacion.COOKIE_SESION, cookie)
+
+    def get_raiz(**kwargs):
+        def ejecutar(_i, _preparado=None):
+            r = client.get("/", **kwargs)
+            assert r.status_code == 200, f"/: {r.status_code}"
+            return r
+        return ejecutar
+
+    return [
+        Caso("auth.verificar (PBKDF2, sin caché)", "auth", lambda _i, _p=None: autenticacion.verificar(backend, *AUTH),
+             preparar=sin_cache),
+        Caso("auth.verificar (en caché)", "auth", lambda _i, _p=None: autenticacion.verificar(backend, *AUTH)),
+        Caso("auth.usuario_de_cookie", "auth", lambda _i, _p=None: autenticacion.usuario_de_cookie(backend, cookie)),
+        Caso("GET / (Basic, sin cookie ni caché)", "http", get_raiz(auth=AUTH),
+             preparar=lambda i: (sin_cookie(i), sin_cache(i)), ruta="root"),
+        Caso("GET / (Basic, verificación en caché)", "http", get_raiz(auth=AUTH), preparar=sin_cookie, ruta="root"),
+        Caso("GET / (cookie de sesión)", "http", get_raiz(), preparar=con_cookie, ruta="root"),
+    ]
+
+DIRECTORIO_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # gestion_medicamentos
+
+# Comandos cuyo arranque se mide en un proceso nuevo (importaciones + creación del engine + trabajo).
+COMANDOS_ARRANQUE = {
+    "main_cli.py --help": ["main_cli.py", "--help"],
+    "main_cli.py med listar --limite 1": ["main_cli.py", "--formato", "json", "med", "listar", "--limite", "1"],
+    "import main_web": ["-c", "import main_web"],
+}
+
+def _ejecutar_python(argumentos: List[str], url: str, opciones: Optional[List[str]] = None):
+    entorno = dict(os.environ, GESTION_MEDICAMENTOS_DATABASE_URL=url)
+    resultado = subprocess.run([sys.executable, *(opciones or []), *argumentos], cwd=DIRECTORIO_APP,
+                               env=entorno, capture_output=True, text=True)
+    assert resultado.returncode == 0, f"{argumentos}: {resultado.stderr[-500:]}"
+    return resultado
+
+def casos_arranque(url: str) -> List[Caso]:
+    """Tiempo total de arranque de la CLI y de la web, cada repetición en un intérprete nuevo."""
+    return [
+        Caso(f"arranque: {nombre}", "arranque", lambda _i, _p=None, argumentos=argumentos: _ejecutar_python(argumentos, url))
+        for nombre, argumentos in COMANDOS_ARRANQUE.items()
+    ]
+
+def perfil_importacion(argumentos: List[str], url: str, maximo: int = 15) -> List[Dict]:
+    """
+    Módulos que más tardan en importarse según `python -X importtime`, ordenados por tiempo
+    acumulado (incluye sus propias importaciones). Sirve para ver qué añade un cambio al arranque.
+    """
+    resultado = _ejecutar_python(argumentos, url, opciones=["-X", "importtime"])
+    modulos = []
+    for linea in resultado.stderr.splitlines():
+        coincidencia = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)", linea)
+        if coincidencia:
+            propio, acumulado, sangria, modulo = coincidencia.groups()
+            modulos.append({"modulo": modulo, "nivel": len(sangria) // 2,
+                            "propio_ms": int(propio) / 1000, "acumulado_ms": int(acumulado) / 1000})
+    total_ms = sum(m["acumulado_ms"] for m in modulos if m["nivel"] == 0)
+    return [{"modulo": "(total)", "nivel": 0, "propio_ms": None, "acumulado_ms": round(total_ms, 3)}] + \
+        sorted(modulos, key=lambda m: m["acumulado_ms"], reverse=True)[:maximo]
+
+def medir(caso: Caso, repeticiones: int, calentamiento: int) -> Dict:
+    tiempos_ms = []
+    consultas = []
+    for i in range(calentamiento + repeticiones):
+        preparado = caso.preparar(i) if caso.preparar else None
+        estadisticas = database.EstadisticasConsultas(ruta=caso.nombre)
+        token = database.estadisticas_consultas.set(estadisticas)
+        inicio = time.perf_counter()
+        try:
+            resultado = caso.ejecutar(i, preparado)
+        finally:
+            transcurrido_ms = (time.perf_counter() - inicio) * 1000
+            database.estadisticas_consultas.reset(token)
+        if i < calentamiento:
+            continue
+        tiempos_ms.append(transcurrido_ms)
+        # En HTTP el middleware usa su propio contador y lo publica en Server-Timing
+        consultas.append(_consultas_de_cabecera(resultado) if caso.tipo == "http" else estadisticas.consultas)
+    tiempos_ordenados = sorted(tiempos_ms)
+    return {
+        "tipo": caso.tipo,
+        "ruta": caso.ruta,
+        "repeticiones": repeticiones,
+        "min_ms": round(tiempos_ordenados[0], 3),
+        "mediana_ms": round(statistics.median(tiempos_ordenados), 3),
+        "p95_ms": round(tiempos_ordenados[min(len(tiempos_ordenados) - 1, int(len(tiempos_ordenados) * 0.95))], 3),
+        "media_ms": round(statistics.fmean(tiempos_ordenados), 3),
+        # Rendimiento secuencial (un cliente): útil para comparar el coste de las escrituras entre versiones
+        "operaciones_por_segundo": round(1000 / statistics.fmean(tiempos_ordenados), 1),
+        "consultas_sql": max((c for c in consultas if c is not None), default=None),
+    }
+
+def volumenes(db) -> Dict[str, int]:
+    return {
+        "medicamentos": db.query(func.count(models.Medicamento.id)).scalar(),
+        "lotes_stock": db.query(func.count(models.LoteStock.id)).scalar(),
+        "pedidos": db.query(func.count(models.Pedido.id)).scalar(),
+        "detalles_pedido": db.query(func.count(models.DetallePedido.id)).scalar(),
+    }
+
+def comparar(actual: Dict, base: Dict, umbral: float) -> bool:
+    """Imprime la comparación con una ejecución anterior. Devuelve True si hay regresiones."""
+    print(f"\n{'Caso':<70} | {'Base (ms)':>10} | {'Actual (ms)':>11} | {'Ratio':>6}")
+    print("-" * 107)
+    hay_regresion = False
+    for nombre, resultado in actual["resultados"].items():
+        anterior = base.get("resultados", {}).get(nombre)
+        if not anterior:
+            continue
+        ratio = resultado["mediana_ms"] / anterior["mediana_ms"] if anterior["mediana_ms"] else float("inf")
+        marca = " <-- REGRESIÓN" if ratio > umbral else ""
+        hay_regresion = hay_regresion or ratio > umbral
+        print(f"{nombre[:70]:<70} | {anterior['mediana_ms']:>10.2f} | {resultado['mediana_ms']:>11.2f} | {ratio:>6.2f}{marca}")
+    return hay_regresion
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de las rutas web y funciones CRUD de gestion_medicamentos.")
+    parser.add_argument("--db", required=True, help="Base de datos SQLite generada con benchmarks/generar_datos.py.")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--calentamiento", type=int, default=1, help="Ejecuciones previas no medidas por caso.")
+    parser.add_argument("--filtro", default=None, help="Solo ejecutar los casos cuyo nombre contenga este texto.")
+    parser.add_argument("--salida", default=None, help="Archivo JSON donde guardar los resultados.")
+    parser.add_argument("--comparar", default=None, help="JSON de una ejecución anterior para detectar regresiones.")
+    parser.add_argument("--umbral", type=float, default=1.25,
+                        help="Ratio de mediana (actual/base) a partir del cual se considera regresión.")
+    parser.add_argument("--importtime", action="store_true",
+                        help="Incluir el perfil de importación (python -X importtime) de cada comando de arranque.")
+    args = parser.parse_args()
+
+    ruta = os.path.abspath(args.db)
+    if ruta == os.path.abspath(database.DATABASE_FILE_PATH):
+        parser.error("Use una base de datos generada con benchmarks/generar_datos.py, no la de la aplicación.")
+    if not os.path.exists(ruta):
+        parser.error(f"No existe '{ruta}'. Genérela con benchmarks/generar_datos.py.")
+    ruta = copiar_base_de_datos(ruta)
+    usar_base_de_datos(f"sqlite:///{ruta}")
+
+    from fastapi.testclient import TestClient
+    import main_web
+    client = TestClient(main_web.app)
+
+    casos = construir_casos(client) + casos_arranque(f"sqlite:///{ruta}")
+    rutas_cubiertas = {c.ruta for c in casos if c.ruta}
+    rutas_app = {r.name for r in main_web.app.routes if getattr(r, "name", None) not in RUTAS_EXCLUIDAS}
+    if rutas_app - rutas_cubiertas:
+        print(f"Advertencia: rutas sin benchmark: {sorted(rutas_app - rutas_cubiertas)}")
+    if args.filtro:
+        casos = [c for c in casos if args.filtro in c.nombre]
+
+    db = database.SessionLocal()
+    try:
+        metadatos = {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "plataforma": platform.platform(),
+            "repeticiones": args.repeticiones,
+            "volumenes": volumenes(db),
+        }
+    finally:
+        db.close()
+    print(f"Volúmenes: {metadatos['volumenes']}")
+
+    resultados = {}
+    print(f"\n{'Caso':<70} | {'Mediana (ms)':>12} | {'p95 (ms)':>9} | {'SQL':>5}")
+    print("-" * 105)
+    for caso in casos:
+        resultado = medir(caso, args.repeticiones, args.calentamiento)
+        resultados[caso.nombre] = resultado
+        print(f"{caso.nombre[:70]:<70} | {resultado['mediana_ms']:>12.2f} | {resultado['p95_ms']:>9.2f} | "
+              f"{resultado['consultas_sql'] if resultado['consultas_sql'] is not None else '-':>5}")
+
+    salida = {"metadatos": metadatos, "resultados": resultados}
+    if args.importtime:
+        salida["importtime"] = {}
+        for nombre, argumentos in COMANDOS_ARRANQUE.items():
+            if args.filtro and args.filtro not in f"arranque: {nombre}":
+                continue
+            perfil = perfil_importacion(argumentos, f"sqlite:///{ruta}")
+            salida["importtime"][nombre] = perfil
+            print(f"\nImportaciones de '{nombre}' (ms acumulados):")
+            for modulo in perfil:
+                print(f"  {'  ' * modulo['nivel']}{modulo['modulo']:<50} {modulo['acumulado_ms']:>9.1f}")
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(salida, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en '{args.salida}'")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        if comparar(salida, base, args.umbral):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
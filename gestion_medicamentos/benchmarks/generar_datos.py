@@ -0,0 +1,143 @@
+# Generador de datos sintéticos para benchmarks.
+# Llena una base de datos SQLite de prueba (nunca la de data/) con volúmenes configurables
+# de medicamentos, lotes, pedidos y detalles que respetan el esquema de app/models.py.
+#
+# Uso (desde el directorio gestion_medicamentos):
+#   python benchmarks/generar_datos.py --db /tmp/bench.db --medicamentos 10000 --lotes 500000 --pedidos 100000
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # gestion_medicamentos
+
+from sqlalchemy import create_engine
+from app import models, database
+
+PRINCIPIOS_ACTIVOS = [
+    "Ibuprofeno", "Paracetamol", "Amoxicilina", "Omeprazol", "Loratadina", "Metformina", "Atorvastatina",
+    "Enalapril", "Salbutamol", "Diclofenaco", "Levotiroxina", "Sertralina", "Losartán", "Cetirizina",
+    "Azitromicina", "Clonazepam", "Ranitidina", "Simvastatina", "Aspirina", "Dexametasona",
+]
+MARCAS = ["Bayer", "Pfizer", "Roemmers", "Bagó", "Sanofi", "Novartis", "Genérico", "Teva", "Elea", None]
+PROVEEDORES = ["Farmacia Central", "Farmacia del Pueblo", "Droguería Sur", "Online", None]
+ESTADOS_PEDIDO = [models.EstadoPedido.RECIBIDO] * 7 + [models.EstadoPedido.PENDIENTE] * 2 + [models.EstadoPedido.CANCELADO]
+
+TAMANO_LOTE_INSERCION = 10000
+
+def _insertar_en_bloques(conn, tabla, filas_iter, total: Optional[int], etiqueta: str):
+    bloque = []
+    insertadas = 0
+    for fila in filas_iter:
+        bloque.append(fila)
+        if len(bloque) >= TAMANO_LOTE_INSERCION:
+            conn.execute(tabla.insert(), bloque)
+            insertadas += len(bloque)
+            bloque = []
+            print(f"  {etiqueta}: {insertadas}/{total or '?'}", end="\r")
+    if bloque:
+        conn.execute(tabla.insert(), bloque)
+        insertadas += len(bloque)
+    print(f"  {etiqueta}: {insertadas}" + " " * 20)
+
+def generar(url: str, n_medicamentos: int, n_lotes: int, n_pedidos: int,
+            max_detalles_por_pedido: int = 5, semilla: int = 42):
+    """
+    Crea el esquema en `url` y lo llena con datos aleatorios reproducibles (misma semilla, mismos datos).
+    Los IDs se asignan explícitamente desde 1, por lo que la base de datos debe estar vacía.
+    """
+    rng = random.Random(semilla)
+    hoy = date.today()
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    database.crear_indices_faltantes(engine)
+
+    inicio = time.perf_counter()
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            # Solo para la carga inicial de una base de datos desechable
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+            conn.exec_driver_sql("PRAGMA journal_mode = MEMORY")
+
+        def medicamentos():
+            for i in range(1, n_medicamentos + 1):
+                unidades = rng.choice([10, 14, 20, 28, 30, 60])
+                yield {
+                    "id": i,
+                    "nombre": f"{rng.choice(PRINCIPIOS_ACTIVOS)} {rng.choice([5, 10, 20, 50, 100, 250, 500, 1000])} mg #{i}",
+                    "marca": rng.choice(MARCAS),
+                    "unidades_por_caja": unidades,
+                    "precio_por_caja_referencia": round(rng.uniform(1, 80), 2) if rng.random() < 0.9 else None,
+                    "esta_activo": rng.random() < 0.9,
+                    "vencimiento_receta": hoy + timedelta(days=rng.randint(-60, 365)) if rng.random() < 0.3 else None,
+                    "consumo_diario_unidades": rng.choice([0.5, 1, 2, 3]) if rng.random() < 0.6 else None,
+                }
+        _insertar_en_bloques(conn, models.Medicamento.__table__, medicamentos(), n_medicamentos, "medicamentos")
+
+        def lotes():
+            for i in range(1, n_lotes + 1):
+                fecha_compra = hoy - timedelta(days=rng.randint(0, 3 * 365))
+                yield {
+                    "id": i,
+                    "medicamento_id": rng.randint(1, n_medicamentos),
+                    "cantidad_cajas": rng.randint(1, 10),
+                    "unidades_por_caja_lote": rng.choice([10, 14, 20, 28, 30, 60]),
+                    "fecha_compra_lote": fecha_compra,
+                    "fecha_vencimiento_lote": fecha_compra + timedelta(days=rng.randint(180, 3 * 365)),
+                    "precio_compra_lote_por_caja": round(rng.uniform(1, 80), 2) if rng.random() < 0.8 else None,
+                }
+        _insertar_en_bloques(conn, models.LoteStock.__table__, lotes(), n_lotes, "lotes_stock")
+
+        def pedidos():
+            for i in range(1, n_pedidos + 1):
+                yield {
+                    "id": i,
+                    "fecha_pedido": hoy - timedelta(days=rng.randint(0, 3 * 365)),
+                    "proveedor": rng.choice(PROVEEDORES),
+                    "estado": rng.choice(ESTADOS_PEDIDO),
+                }
+        _insertar_en_bloques(conn, models.Pedido.__table__, pedidos(), n_pedidos, "pedidos")
+
+        def detalles():
+            detalle_id = 0
+            for pedido_id in range(1, n_pedidos + 1):
+                for _ in range(rng.randint(1, max_detalles_por_pedido)):
+                    detalle_id += 1
+                    yield {
+                        "id": detalle_id,
+                        "pedido_id": pedido_id,
+                        "medicamento_id": rng.randint(1, n_medicamentos),
+                        "cantidad_cajas_pedidas": rng.randint(1, 6),
+                        "precio_unitario_compra_caja": round(rng.uniform(1, 80), 2) if rng.random() < 0.85 else None,
+                    }
+        _insertar_en_bloques(conn, models.DetallePedido.__table__, detalles(), None, "detalles_pedido")
+
+    # El índice de búsqueda se crea al final: se construye una sola vez en lugar de fila a fila por los triggers.
+    database.crear_indice_busqueda(engine)
+    engine.dispose()
+    print(f"Datos generados en {time.perf_counter() - inicio:.1f} s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera una base de datos SQLite sintética para benchmarks.")
+    parser.add_argument("--db", required=True, help="Ruta del archivo SQLite a crear (no debe existir).")
+    parser.add_argument("--medicamentos", type=int, default=10000)
+    parser.add_argument("--lotes", type=int, default=500000)
+    parser.add_argument("--pedidos", type=int, default=100000)
+    parser.add_argument("--max-detalles", type=int, default=5, help="Máximo de ítems por pedido.")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    ruta = os.path.abspath(args.db)
+    if ruta == os.path.abspath(database.DATABASE_FILE_PATH):
+        parser.error("No se puede usar la base de datos de la aplicación para generar datos sintéticos.")
+    if os.path.exists(ruta):
+        parser.error(f"El archivo '{ruta}' ya existe. Elija otra ruta o elimínelo primero.")
+
+    generar(f"sqlite:///{ruta}", args.medicamentos, args.lotes, args.pedidos, args.max_detalles, args.semilla)
+
+if __name__ == "__main__":
+    main()
@@ -10,21 +10,18 @@ from contextlib import contextmanager # Importar contextmanager
 # Necesitaremos acceder a los módulos de la app
 # Esto asume que ejecutaremos main_cli.py desde el directorio raíz del repositorio,
 # o que gestion_medicamentos está en el PYTHONPATH.
-# Para simplificar, si ejecutamos desde gestion_medicamentos/, ajustamos path.
-try:
-    from app import crud, models, database
-except ImportError:
-    # Si estamos ejecutando directamente gestion_medicamentos/main_cli.py
-    # necesitamos añadir el directorio padre (gestion_medicamentos) al path
-    # para que encuentre el paquete 'app'.
-    import os
-    # Obtener el directorio del script actual (gestion_medicamentos/main_cli.py)
-    current_script_dir = os.path.dirname(os.path.abspath(__file__))
-    # Añadir el directorio padre (gestion_medicamentos) a sys.path
-    # Esto hace que 'app' sea importable como un paquete.
-    # sys.path.insert(0, os.path.dirname(current_script_dir)) # Esto añadiría el directorio raíz del repo
-    sys.path.insert(0, current_script_dir) # Esto añade gestion_medicamentos al path
-
+# Si ejecutamos directamente gestion_medicamentos/main_cli.py, añadimos su directorio
+# (gestion_medicamentos) al path para que encuentre el paquete 'app'.
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+if current_script_dir not in sys.path:
+    sys.path.insert(0, current_script_dir)
+
+# Los módulos de la app (y con ellos SQLAlchemy) se importan en `importar_app`, solo al abrir el
+# menú interactivo: los subcomandos de app/cli.py cargan lo que necesitan y `--help`, nada.
+crud = models = database = None
+
+def importar_app():
+    global crud, models, database
     from app import crud, models, database
 
 
@@ -91,6 +88,7 @@ def menu_medicamentos():
         print("4. Actualizar medicamento")
         print("5. Eliminar medicamento")
         print("6. Ver stock total y vencimiento próximo de un medicamento")
+        print("7. Buscar medicamento por nombre o marca")
         print("0. Volver al menú principal")
 
         opcion_med = input("Seleccione una opción: ").strip()
@@ -126,13 +124,11 @@ def menu_medicamentos():
                         print("Precio no válido, se guardará sin precio de referencia.")
 
                 try:
-                    medicamento_existente = crud.obtener_medicamento_por_nombre(db, nombre=nombre)
-                    if medicamento_existente:
-                        print(f"Error: Ya existe un medicamento con el nombre '{nombre}'.")
-                    else:
-                        medicamento = crud.crear_medicamento(db, nombre=nombre, marca=marca if marca else None,
-                                                             unidades_por_caja=unidades, precio_referencia=precio)
-                        print(f"Medicamento '{medicamento.nombre}' añadido con ID: {medicamento.id}")
+                    medicamento = crud.crear_medicamento(db, nombre=nombre, marca=marca if marca else None,
+                                                         unidades_por_caja=unidades, precio_por_caja_referencia=precio)
+                    print(f"Medicamento '{medicamento.nombre}' añadido con ID: {medicamento.id}")
+                except crud.MedicamentoDuplicadoError:
+                    print(f"Error: Ya existe un medicamento con el nombre '{nombre}'.")
                 except Exception as e:
                     print(f"Error al crear el medicamento: {e}")
 
@@ -216,16 +212,8 @@ def menu_medicamentos():
 
                     datos_actualizacion = {}
                     if nombre_nuevo:
-                        # Verificar que el nuevo nombre no exista ya (si es diferente al actual)
-                        if nombre_nuevo.lower() != medicamento.nombre.lower():
-                            existente = crud.obtener_medicamento_por_nombre(db, nombre=nombre_nuevo)
-                            if existente and existente.id != med_id:
-                                print(f"Error: Ya existe otro medicamento con el nombre '{nombre_nuevo}'. No se actualizará el nombre.")
-                                nombre_nuevo = medicamento.nombre # Mantener nombre anterior
-                            else:
-                                datos_actualizacion['nombre'] = nombre_nuevo
-                        else:
-                             datos_actualizacion['nombre'] = nombre_nuevo # Mismo nombre, diferente capitalización
+                        # Si el nombre ya pertenece a otro medicamento, el índice único lo rechaza al actualizar
+                        datos_actualizacion['nombre'] = nombre_nuevo
 
                     if marca_nueva:
                         datos_actualizacion['marca'] = marca_nueva
@@ -242,8 +230,13 @@ def menu_medicamentos():
 
 
                     if datos_actualizacion:
-                        crud.actualizar_medicamento(db, med_id, datos_actualizacion)
-                        print(f"Medicamento ID {med_id} actualizado.")
+                        try:
+                            crud.actualizar_medicamento(db, med_id, datos_actualizacion, version_esperada=medicamento.version)
+                            print(f"Medicamento ID {med_id} actualizado.")
+                        except crud.EdicionConcurrenteError as e:
+                            print(f"Error: {e}")
+                        except crud.MedicamentoDuplicadoError:
+                            print(f"Error: Ya existe otro medicamento con el nombre '{nombre_nuevo}'. No se actualizó el medicamento.")
                     else:
                         print("No se proporcionaron datos para actualizar.")
 
@@ -306,6 +299,25 @@ def menu_medicamentos():
                 except Exception as e:
                     print(f"Error al obtener stock/vencimiento: {e}")
 
+            elif opcion_med == '7':
+                # Buscar medicamento (índice FTS5: admite prefijos y errores de tipeo)
+                try:
+                    texto = input("Texto a buscar (nombre o marca): ").strip()
+                    if not texto:
+                        print("El texto de búsqueda no puede estar vacío.")
+                        continue
+                    resultados = crud.buscar_medicamentos(db, texto, limit=50)
+                    if not resultados:
+                        print(f"No se encontraron medicamentos para '{texto}'.")
+                    else:
+                        _imprimir_subtitulo(f"Resultados para '{texto}'")
+                        print(f"{'ID':<5} | {'Nombre':<30} | {'Marca':<20} | {'Unidades/Caja':<15}")
+                        print("-" * 75)
+                        for med in resultados:
+                            print(f"{med.id:<5} | {med.nombre:<30} | {(med.marca if med.marca else 'N/A'):<20} | {med.unidades_por_caja:<15}")
+                except Exception as e:
+                    print(f"Error al buscar medicamentos: {e}")
+
             elif opcion_med == '0':
                 break
             else:
@@ -486,8 +498,11 @@ def menu_stock():
                         datos_actualizacion['precio_compra_lote_por_caja'] = None
 
                     if datos_actualizacion:
-                        crud.actualizar_lote_stock(db, lote_id, datos_actualizacion)
-                        print(f"Lote ID {lote_id} actualizado.")
+                        try:
+                            crud.actualizar_lote_stock(db, lote_id, datos_actualizacion, version_esperada=lote.version)
+                            print(f"Lote ID {lote_id} actualizado.")
+                        except crud.EdicionConcurrenteError as e:
+                            print(f"Error: {e}")
                     else:
                         print("No se proporcionaron datos para actualizar.")
                 except ValueError:
@@ -707,8 +722,11 @@ def menu_pedidos():
                             print(f"Estado '{nuevo_estado_str}' no válido. No se actualizará el estado.")
 
                     if datos_actualizacion:
-                        crud.actualizar_pedido(db, pedido_id, datos_actualizacion)
-                        print(f"Pedido ID {pedido_id} actualizado.")
+                        try:
+                            crud.actualizar_pedido(db, pedido_id, datos_actualizacion, version_esperada=pedido.version)
+                            print(f"Pedido ID {pedido_id} actualizado.")
+                        except crud.EdicionConcurrenteError as e:
+                            print(f"Error: {e}")
                     else:
                         print("No se proporcionaron datos para actualizar.")
                 except ValueError:
@@ -750,6 +768,13 @@ def menu_pedidos():
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Con argumentos: CLI no interactiva para scripts y operaciones por lotes (ver app/cli.py)
+        from app import cli
+        sys.exit(cli.main(sys.argv[1:]))
+
+    importar_app()
+
     # Pequeña validación para la creación de la base de datos la primera vez
     # Esto es para que el mensaje de creación de BD no aparezca siempre si ya existe.
     # Ahora usamos DATABASE_FILE_PATH directamente desde database.py
@@ -760,13 +785,17 @@ if __name__ == "__main__":
         os.makedirs(database.DATA_DIR)
         print(f"Directorio '{database.DATA_DIR}' creado.")
 
-    if not os.path.exists(database.DATABASE_FILE_PATH):
+    if database.DATABASE_URL != database.DATABASE_URL_POR_DEFECTO:
+        # URL configurada con GESTION_MEDICAMENTOS_DATABASE_URL (ej. PostgreSQL): crear solo lo que falte.
+        database.create_db_and_tables()
+    elif not os.path.exists(database.DATABASE_FILE_PATH):
         print(f"Base de datos no encontrada en {database.DATABASE_FILE_PATH}, inicializando...")
         # database.create_db_and_tables() crea el directorio Y las tablas.
         database.create_db_and_tables()
     else:
-        # Si la base de datos ya existe, solo nos aseguramos que las tablas estén ahí.
-        # Base.metadata.create_all es seguro de llamar múltiples veces y no recreará tablas.
+        # Si la base de datos ya existe, solo se aplican las migraciones pendientes (tablas, columnas e
+        # índices nuevos, columnas derivadas). Con el esquema al día es una sola consulta.
         print(f"Usando base de datos existente: {database.DATABASE_FILE_PATH}")
-        database.Base.metadata.create_all(bind=database.engine) # Solo crea tablas si no existen
+        from app import migraciones
+        migraciones.migrar(database.engine)
     main()
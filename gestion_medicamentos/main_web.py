@@ -2,8 +2,9 @@
 
 import os
 import sys
+import time
 from fastapi import FastAPI, Request, Depends, Form, HTTPException
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from pydantic import ValidationError
@@ -16,39 +17,47 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from datetime import timedelta # Importar timedelta
 
 try:
-    from app import crud, models, database, schemas
+    from app import crud, models, database, schemas, metricas, hogares, migraciones
 except ImportError as e:
     print(f"Error importando módulos de app: {e}")
     print(f"sys.path actual: {sys.path}")
     raise
 
 # --- Configuración de Autenticación HTTP Basic ---
-import secrets
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from app import autenticacion
 
-security = HTTPBasic()
+# auto_error=False: con una cookie de sesión válida no hace falta la cabecera Authorization.
+security = HTTPBasic(auto_error=False)
 
 # !! ADVERTENCIA: Estas son credenciales de ejemplo. !!
-# !! NO USAR EN PRODUCCIÓN. Cambiar por un método seguro de gestión de credenciales. !!
+# !! Solo se usan si no hay archivo de usuarios ni backend configurado (ver app/autenticacion.py). !!
 CORRECT_USERNAME = "admin"
 CORRECT_PASSWORD = "securepassword123" # Cambiar esto en un entorno real
 
-async def verify_credentials(credentials: HTTPBasicCredentials = Depends(security)):
-    current_username_bytes = credentials.username.encode("utf8")
-    correct_username_bytes = CORRECT_USERNAME.encode("utf8")
-    is_correct_username = secrets.compare_digest(current_username_bytes, correct_username_bytes)
-
-    current_password_bytes = credentials.password.encode("utf8")
-    correct_password_bytes = CORRECT_PASSWORD.encode("utf8")
-    is_correct_password = secrets.compare_digest(current_password_bytes, correct_password_bytes)
-
-    if not (is_correct_username and is_correct_password):
+backend_autenticacion = autenticacion.cargar_backend((CORRECT_USERNAME, CORRECT_PASSWORD))
+
+def verify_credentials(request: Request, credentials: Optional[HTTPBasicCredentials] = Depends(security)):
+    # Función síncrona: si hay que calcular el hash (PBKDF2) corre en un thread, sin bloquear el event loop.
+    # La cookie vale si no llegan credenciales o si son del mismo usuario (el navegador reenvía las de
+    # Basic en cada petición); con credenciales de otro usuario se verifican estas.
+    usuario = autenticacion.usuario_de_cookie(backend_autenticacion, request.cookies.get(autenticacion.COOKIE_SESION))
+    if usuario is not None and credentials is not None and credentials.username != usuario.nombre:
+        usuario = None
+    if usuario is None and credentials is not None:
+        usuario = autenticacion.verificar(backend_autenticacion, credentials.username, credentials.password)
+        if usuario is not None:
+            # La cookie se añade a la respuesta en el middleware `renovar_cookie_sesion`
+            request.state.cookie_sesion = autenticacion.crear_cookie_sesion(usuario)
+    if usuario is None:
         raise HTTPException(
             status_code=401,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Basic"},
         )
-    return credentials.username
+    if usuario.hogar and hogares.multi_hogar() and hogares.hogar_de_peticion(request.headers) != usuario.hogar:
+        raise HTTPException(status_code=403, detail="El usuario no tiene acceso a este hogar.")
+    return usuario.nombre
 
 # Aplicar autenticación a toda la aplicación
 app = FastAPI(
@@ -57,21 +66,145 @@ app = FastAPI(
     dependencies=[Depends(verify_credentials)] # Proteger todas las rutas
 )
 
+# Con 0 las migraciones no se aplican al arrancar (ver `aplicar_migraciones`).
+MIGRAR_AL_INICIAR = os.environ.get("GESTION_MEDICAMENTOS_MIGRAR_AL_INICIAR", "1") != "0"
+
 current_dir = os.path.dirname(os.path.abspath(__file__))
 templates_dir = os.path.join(current_dir, "web", "templates")
 templates = Jinja2Templates(directory=templates_dir)
 templates.env.globals['py_date'] = py_date # Hacer py_date (datetime.date) accesible en todas las plantillas
 
+@app.middleware("http")
+async def renovar_cookie_sesion(request: Request, call_next):
+    """Entrega la cookie de sesión firmada tras una autenticación con usuario y contraseña."""
+    response = await call_next(request)
+    cookie = getattr(request.state, "cookie_sesion", None)
+    if cookie:
+        response.set_cookie(
+            autenticacion.COOKIE_SESION, cookie, max_age=autenticacion.DURACION_SESION_SEGUNDOS,
+            httponly=True, samesite="lax", secure=request.url.scheme == "https",
+        )
+    return response
+
+# --- Conteo de consultas SQL por petición ---
+@app.middleware("http")
+async def medir_consultas_sql(request: Request, call_next):
+    """
+    Activa un contador de consultas para la petición (ver database.EstadisticasConsultas)
+    y lo expone en la cabecera Server-Timing, visible en las herramientas de desarrollo del navegador.
+    """
+    estadisticas = database.EstadisticasConsultas(ruta=request.url.path)
+    token = database.estadisticas_consultas.set(estadisticas)
+    inicio = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        database.estadisticas_consultas.reset(token)
+    total_ms = (time.perf_counter() - inicio) * 1000
+    # Histograma de latencia por nombre de ruta (las URLs sin ruta se agrupan para no multiplicar series)
+    ruta = request.scope.get("route")
+    metricas.LATENCIA_PETICIONES.observar(total_ms / 1000, ruta=ruta.name if ruta is not None else "sin_ruta")
+    response.headers["Server-Timing"] = (
+        f'db;desc="{estadisticas.consultas} consultas";dur={estadisticas.tiempo_ms:.1f}, total;dur={total_ms:.1f}'
+    )
+    return response
+
+# --- Métricas (formato Prometheus) ---
+# Los gauges se calculan solo cuando se consulta /metrics, nunca en las rutas normales.
+def _gauge_pool_conexiones():
+    # Con varios hogares el engine por defecto no atiende peticiones: se suman los pools de los hogares abiertos.
+    engines = hogares.CACHE_HOGARES.engines() if hogares.multi_hogar() else [database.engine]
+    totales = {}
+    for engine in engines:
+        for estado, medir in (("en_uso", "checkedout"), ("tamano", "size"), ("desborde", "overflow")):
+            if hasattr(engine.pool, medir): # No todos los pools (ej. NullPool de SQLite) exponen estas medidas
+                totales[estado] = totales.get(estado, 0) + getattr(engine.pool, medir)()
+    return [({"estado": estado}, valor) for estado, valor in totales.items()]
+
+def _gauge_tasa_aciertos_cache():
+    tasa = metricas.tasa_aciertos(metricas.CONSULTAS_SQL)
+    return [({"cache": "compilacion_sql"}, tasa)] if tasa is not None else []
+
+def _gauges_negocio(funcion):
+    def medir():
+        # Solo leen: sesión de solo lectura, como las rutas de PREFIJOS_SOLO_LECTURA
+        db = (database.SessionLectura or database.SessionLocal)()
+        try:
+            return [({}, funcion(db))]
+        finally:
+            db.close()
+    return medir
+
+metricas.REGISTRO.gauge("db_pool_connections", "Conexiones del pool de SQLAlchemy por estado.", _gauge_pool_conexiones)
+metricas.REGISTRO.gauge("cache_hit_ratio", "Proporción de aciertos de caché.", _gauge_tasa_aciertos_cache)
+if hogares.multi_hogar():
+    # Con varios hogares los valores de negocio son de cada hogar: recorrerlos todos en cada
+    # consulta a /metrics sería caro, así que solo se expone cuántos están abiertos en el proceso.
+    metricas.REGISTRO.gauge("hogares_abiertos", "Hogares con engine abierto en la caché del proceso.",
+                            lambda: [({}, hogares.CACHE_HOGARES.abiertos())])
+else:
+    metricas.REGISTRO.gauge("stock_valor_total", "Valor total del stock activo a precio de referencia (como en /stock/).",
+                            _gauges_negocio(crud.calcular_valor_total_stock))
+    metricas.REGISTRO.gauge("lotes_por_vencer_30_dias", "Lotes no vencidos que vencen en los próximos 30 días.",
+                            _gauges_negocio(crud.contar_lotes_por_vencer))
+
+@app.get("/metrics", name="metricas", include_in_schema=False)
+def exponer_metricas():
+    # Función síncrona: FastAPI la ejecuta en un thread, así las consultas de los gauges no bloquean el event loop.
+    return PlainTextResponse(metricas.REGISTRO.exponer(), media_type="text/plain; version=0.0.4")
+
 # --- Dependencia de Sesión de BD ---
-def get_db_session_fastapi():
+# Mensaje cuando la versión enviada por un formulario de edición ya no es la actual (crud.EdicionConcurrenteError).
+MENSAJE_EDICION_CONCURRENTE = ("Este registro fue modificado por otra persona mientras lo editaba. "
+                               "Se muestran los datos actuales: revise y vuelva a aplicar sus cambios.")
+
+# Rutas que solo leen: usan la sesión de solo lectura (database.SessionLectura), que abre conexiones
+# aparte (o contra la réplica), para que los reportes pesados no compitan con los formularios.
+PREFIJOS_SOLO_LECTURA = ("/reportes/", "/stock/")
+
+def get_db_session_fastapi(request: Request):
+    # Identificar las consultas lentas por el nombre de la ruta (ej. 'listar_todos_medicamentos')
+    estadisticas = database.estadisticas_consultas.get()
+    ruta = request.scope.get("route")
+    if estadisticas is not None and ruta is not None:
+        estadisticas.ruta = ruta.name
+    # Con varios hogares (ver app/hogares.py) las sesiones salen de las factorías del hogar de la petición.
+    fabricas = database
+    if hogares.multi_hogar():
+        try:
+            fabricas = hogares.conexiones_de_peticion(request.headers)
+        except hogares.HogarNoEncontradoError as e:
+            raise HTTPException(status_code=404, detail=str(e))
     db = None
     try:
-        db = database.SessionLocal()
+        if request.method == "GET" and request.url.path.startswith(PREFIJOS_SOLO_LECTURA):
+            db = fabricas.SessionLectura()
+        else:
+            db = fabricas.SessionLocal()
         yield db
     finally:
         if db:
             db.close()
 
+@app.on_event("startup")
+def aplicar_migraciones():
+    # Aplica las migraciones pendientes (tablas, columnas e índices nuevos, columnas derivadas).
+    # Con el esquema al día es una sola consulta. Con GESTION_MEDICAMENTOS_MIGRAR_AL_INICIAR=0 solo se
+    # avisa de las pendientes, para aplicarlas aparte con `python -m app.migraciones` (ej. con varios workers).
+    # Con varios hogares cada uno se migra la primera vez que se usa (hogares.ConexionesHogar.preparar).
+    if hogares.multi_hogar():
+        return
+    if MIGRAR_AL_INICIAR:
+        migraciones.migrar(database.engine)
+        return
+    faltan = migraciones.pendientes(database.engine)
+    if faltan:
+        print(f"Advertencia: migraciones pendientes: {', '.join(m.id for m in faltan)}. Ejecute 'python -m app.migraciones'.")
+
+@app.on_event("shutdown")
+def cerrar_hogares():
+    hogares.CACHE_HOGARES.cerrar_todos()
+
 # --- Rutas Principales ---
 @app.get("/", name="root")
 async def root(request: Request):
@@ -98,6 +231,29 @@ async def listar_todos_medicamentos(request: Request, db: Session = Depends(get_
         "request": request, "medicamentos_info": medicamentos_info, "title": "Lista de Medicamentos"
     })
 
+# Debe declararse antes de /medicamentos/{medicamento_id}/ para que "buscar" no se interprete como un ID
+@app.get("/medicamentos/buscar/", name="buscar_medicamentos")
+async def buscar_medicamentos(
+    request: Request,
+    q: str = "",
+    formato: Optional[str] = None, # "json" para las sugerencias del typeahead
+    limite: int = 20,
+    db: Session = Depends(get_db_session_fastapi)
+):
+    limite = max(1, min(limite, 100))
+    resultados = crud.buscar_medicamentos(db, q, limit=limite) if q.strip() else []
+    if formato == "json":
+        return JSONResponse([
+            {
+                "id": med.id, "nombre": med.nombre, "marca": med.marca,
+                "url": str(request.url_for("detalle_medicamento", medicamento_id=med.id))
+            }
+            for med in resultados
+        ])
+    return templates.TemplateResponse("buscar_medicamentos.html", {
+        "request": request, "q": q, "resultados": resultados, "title": "Buscar Medicamentos"
+    })
+
 @app.get("/medicamentos/nuevo/", name="crear_medicamento_form")
 async def crear_medicamento_form(request: Request):
     return templates.TemplateResponse("form_medicamento.html", {
@@ -170,16 +326,9 @@ async def crear_medicamento_submit(
             "medicamento": form_data_repop, "errors": e.errors()
         }, status_code=422)
 
-    if crud.obtener_medicamento_por_nombre(db, nombre=medicamento_data.nombre):
-        errors.append({"loc": ["nombre"], "msg": "Ya existe un medicamento con este nombre."})
-        return templates.TemplateResponse("form_medicamento.html", {
-            "request": request, "form_title": "Añadir Nuevo Medicamento",
-            "form_action": request.url_for("crear_medicamento_submit"),
-            "medicamento": form_data_repop, "errors": errors
-        }, status_code=400)
-
     try:
-        # Pasar explícitamente todos los campos a la función CRUD
+        # Pasar explícitamente todos los campos a la función CRUD.
+        # El nombre duplicado lo detecta el índice único al insertar (ver crud.MedicamentoDuplicadoError).
         crud.crear_medicamento(db=db, nombre=medicamento_data.nombre, marca=medicamento_data.marca,
                                unidades_por_caja=medicamento_data.unidades_por_caja,
                                precio_por_caja_referencia=medicamento_data.precio_por_caja_referencia,
@@ -187,6 +336,13 @@ async def crear_medicamento_submit(
                                vencimiento_receta=medicamento_data.vencimiento_receta,
                                consumo_diario_unidades=medicamento_data.consumo_diario_unidades)
         return RedirectResponse(url=request.url_for("listar_todos_medicamentos"), status_code=303)
+    except crud.MedicamentoDuplicadoError:
+        errors.append({"loc": ["nombre"], "msg": "Ya existe un medicamento con este nombre."})
+        return templates.TemplateResponse("form_medicamento.html", {
+            "request": request, "form_title": "Añadir Nuevo Medicamento",
+            "form_action": request.url_for("crear_medicamento_submit"),
+            "medicamento": form_data_repop, "errors": errors
+        }, status_code=400)
     except Exception as e:
         errors.append({"loc": ["general"], "msg": f"Error inesperado: {e}"})
         return templates.TemplateResponse("form_medicamento.html", {
@@ -214,12 +370,22 @@ async def editar_medicamento_submit(
     esta_activo_sentinel: Optional[str] = Form(None), esta_activo: Optional[str] = Form(None),
     vencimiento_receta_str: Optional[str] = Form(None, alias="vencimiento_receta"),
     consumo_diario_unidades_str: Optional[str] = Form(None, alias="consumo_diario_unidades"),
+    version: Optional[int] = Form(None), # Versión cargada en el formulario (control de concurrencia optimista)
     db: Session = Depends(get_db_session_fastapi)
 ):
     errors = []
-    medicamento_original = crud.obtener_medicamento(db, medicamento_id=medicamento_id)
-    if not medicamento_original:
-        raise HTTPException(status_code=404, detail="Medicamento no encontrado para actualizar")
+
+    def mostrar_formulario(medicamento_form, status_code: int):
+        # El medicamento solo se consulta si hay que volver a mostrar el formulario (título, 404):
+        # una edición correcta es un único UPDATE.
+        medicamento_actual = crud.obtener_medicamento(db, medicamento_id=medicamento_id)
+        if not medicamento_actual:
+            raise HTTPException(status_code=404, detail="Medicamento no encontrado para actualizar")
+        return templates.TemplateResponse("form_medicamento.html", {
+            "request": request, "form_title": f"Editar Medicamento: {medicamento_actual.nombre}",
+            "form_action": request.url_for("editar_medicamento_submit", medicamento_id=medicamento_id),
+            "medicamento": medicamento_form if medicamento_form is not None else medicamento_actual, "errors": errors
+        }, status_code=status_code)
 
     esta_activo_bool = True if esta_activo == "true" else False
     vencimiento_receta_obj: Optional[py_date] = None
@@ -249,15 +415,12 @@ async def editar_medicamento_submit(
         "precio_por_caja_referencia": precio_por_caja_referencia,
         "esta_activo": esta_activo_bool,
         "vencimiento_receta": vencimiento_receta_obj,
-        "consumo_diario_unidades": consumo_diario_unidades_float
+        "consumo_diario_unidades": consumo_diario_unidades_float,
+        "version": version
     }
 
     if errors:
-        return templates.TemplateResponse("form_medicamento.html", {
-            "request": request, "form_title": f"Editar Medicamento: {medicamento_original.nombre}",
-            "form_action": request.url_for("editar_medicamento_submit", medicamento_id=medicamento_id),
-            "medicamento": form_data_repop, "errors": errors
-        }, status_code=422)
+        return mostrar_formulario(form_data_repop, 422)
 
     try:
         medicamento_dict_for_schema = {
@@ -270,122 +433,33 @@ async def editar_medicamento_submit(
         medicamento_data_update = schemas.MedicamentoUpdate(**medicamento_dict_for_schema)
 
     except ValidationError as e:
-        return templates.TemplateResponse("form_medicamento.html", {
-            "request": request, "form_title": f"Editar Medicamento: {medicamento_original.nombre}",
-            "form_action": request.url_for("editar_medicamento_submit", medicamento_id=medicamento_id),
-            "medicamento": form_data_repop, "errors": e.errors()
-        }, status_code=422)
-
-    if nombre.lower() != medicamento_original.nombre.lower():
-        db_medicamento_existente = crud.obtener_medicamento_por_nombre(db, nombre=nombre)
-        if db_medicamento_existente and db_medicamento_existente.id != medicamento_id:
-            errors.append({"loc": ["nombre"], "msg": "Ya existe otro medicamento con este nombre."})
-            return templates.TemplateResponse("form_medicamento.html", {
-                "request": request, "form_title": f"Editar Medicamento: {medicamento_original.nombre}",
-                "form_action": request.url_for("editar_medicamento_submit", medicamento_id=medicamento_id),
-                "medicamento": form_data_repop, "errors": errors
-            }, status_code=400)
+        errors = e.errors()
+        return mostrar_formulario(form_data_repop, 422)
 
     try:
-        # Construir el diccionario de actualización solo con los campos que realmente se quieren cambiar.
-        # El schema MedicamentoUpdate ya tiene esta_activo como Optional.
-        update_data_dict = medicamento_data_update.dict(exclude_unset=True) # exclude_unset es clave aquí
-
-        # Ajustes manuales si es necesario (como el manejo de string vacío para marca que ya existía)
+        # El formulario envía siempre todos los campos, así que se guardan todos: un campo vacío
+        # (marca, precio, fecha de receta, consumo) significa borrar el valor (None).
+        update_data_dict = medicamento_data_update.dict()
         if marca == "": update_data_dict['marca'] = None
-        if 'precio_por_caja_referencia' not in update_data_dict and precio_por_caja_referencia is None and medicamento_original.precio_por_caja_referencia is not None:
-            update_data_dict['precio_por_caja_referencia'] = None
-
-        # Importante: Pydantic con exclude_unset=True no incluirá `esta_activo` ni `vencimiento_receta`
-        # si sus valores son los default (None en MedicamentoUpdate).
-        # Pero nosotros queremos que se actualicen según el form (True/False para activo, y fecha o None para receta).
-        # Los valores ya están correctos en medicamento_data_update gracias a la creación del schema.
-        # El método .dict() de Pydantic es el que decide qué incluir basado en exclude_unset, etc.
-        # Para asegurar que estos campos se actualicen incluso si se setean a su valor "default" en el schema Update (como None),
-        # los añadimos explícitamente al diccionario si fueron proveídos (o si su valor es diferente al original).
-
-        update_data_dict = medicamento_data_update.dict(exclude_none=True) # exclude_none para campos que son None en el schema de update
-                                                                        # pero que queremos pasar a la BD como None (para borrar la fecha por ej.)
-                                                                        # No, mejor usar exclude_unset y añadir manualmente.
-
-        update_data_dict = medicamento_data_update.dict(exclude_unset=True)
-
-        # Asegurar que esta_activo siempre se considere para la actualización
-        update_data_dict['esta_activo'] = esta_activo_bool
-
-        # Manejar vencimiento_receta: si se envió un string vacío, vencimiento_receta_obj es None,
-        # y queremos que se guarde None en la BD. Si se envió una fecha válida, se guarda.
-        # Si no se envió nada para vencimiento_receta_str (es decir, el campo no estaba en el form o no se tocó),
-        # entonces vencimiento_receta_obj es None, y Pydantic (con exclude_unset) no lo incluiría.
-        # Pero si el usuario borró la fecha (enviando un string vacío), queremos pasar None.
-        if vencimiento_receta_str is not None: # Indica que el campo fue enviado, incluso si vacío
-            update_data_dict['vencimiento_receta'] = vencimiento_receta_obj
-        # Si vencimiento_receta_str es None (no se envió), y el original tenía fecha, no se actualiza.
-        # Si el original no tenía y no se envió, no se actualiza (queda None).
-        # Esto es un poco complejo. Simplifiquemos: siempre pasar el valor de vencimiento_receta_obj
-        # que ya hemos determinado (puede ser una fecha o None).
-        update_data_dict['vencimiento_receta'] = vencimiento_receta_obj
-        # Similar para consumo_diario_unidades
-        if consumo_diario_unidades_str is not None: # Campo fue enviado (incluso vacío)
-            update_data_dict['consumo_diario_unidades'] = consumo_diario_unidades_float
-        elif 'consumo_diario_unidades' in update_data_dict and consumo_diario_unidades_float is None:
-             # Asegurar que si Pydantic lo puso como None (porque era su default en Update), pero no se envió string vacío,
-             # y el original tenía un valor, no se borre.
-             # Esta lógica se complica. Es más simple: si el campo no fue enviado en el form, no lo incluyas en update_data_dict
-             # a menos que Pydantic lo haya puesto por un cambio válido.
-             # La línea `update_data_dict = medicamento_data_update.dict(exclude_unset=True)` es la clave.
-             # Solo necesitamos añadir explícitamente si el form envió un valor (incluso vacío para borrar).
-             pass # Ya está cubierto por la lógica anterior de `consumo_diario_unidades_float` y `medicamento_data_update`.
-        # Re-evaluación:
-        # `medicamento_data_update` ya tiene los valores correctos (incluyendo None si se borró un campo).
-        # `exclude_unset=True` podría quitar `consumo_diario_unidades=None` si el default en `MedicamentoUpdate` es `None`.
-        # Necesitamos asegurar que `None` se pase si el usuario borró el campo.
-        # La forma en que `form_data_repop` y `medicamento_dict_for_schema` se construyen ya asigna el `_float` o `_obj`
-        # que puede ser `None`. `MedicamentoUpdate(**medicamento_dict_for_schema)` lo capta.
-        # El `update_data_dict = medicamento_data_update.dict(exclude_unset=True)` es generalmente bueno.
-        # La adición explícita de `esta_activo` y `vencimiento_receta` (y ahora `consumo_diario_unidades`)
-        # es para asegurar que se incluyan incluso si el valor coincide con el default de `MedicamentoUpdate` (que es None).
-        update_data_dict['consumo_diario_unidades'] = consumo_diario_unidades_float
-
-
-        # Comprobar si hay cambios reales antes de hacer el update
-        # if not update_data_dict: # Esta comprobación es demasiado simple ahora
-        #      return RedirectResponse(url=request.url_for("detalle_medicamento", medicamento_id=medicamento_id), status_code=303)
-
-        # Lógica más precisa para "no cambios":
-        # Compara cada campo en update_data_dict con el original.
-        # Si todos los campos que se van a actualizar son iguales a los originales, entonces no hay cambio.
-
-        # Primero, asegurar que todos los campos relevantes estén en update_data_dict si se pretenden actualizar
-        # Esto ya se hace con las asignaciones explícitas de arriba para esta_activo, vencimiento_receta, consumo_diario
-
-        hay_cambios_efectivos = False
-        if not update_data_dict: # Si el diccionario está vacío
-            hay_cambios_efectivos = False
-        else:
-            for key, value in update_data_dict.items():
-                original_value = getattr(medicamento_original, key)
-                if original_value != value:
-                    # Tratar el caso de 0.0 vs None para campos float
-                    if isinstance(original_value, float) and original_value == 0.0 and value is None:
-                        pass # Considerar 0.0 y None como no cambio si el input vacío es None
-                    elif isinstance(value, float) and value == 0.0 and original_value is None:
-                         pass
-                    else:
-                        hay_cambios_efectivos = True; break
-
-        if not hay_cambios_efectivos:
-            return RedirectResponse(url=request.url_for("detalle_medicamento", medicamento_id=medicamento_id), status_code=303)
-
-        crud.actualizar_medicamento(db, medicamento_id=medicamento_id, datos_actualizacion=update_data_dict)
+
+        medicamento = crud.actualizar_medicamento(db, medicamento_id=medicamento_id, datos_actualizacion=update_data_dict,
+                                                  version_esperada=version)
+        if medicamento is None:
+            raise HTTPException(status_code=404, detail="Medicamento no encontrado para actualizar")
         return RedirectResponse(url=request.url_for("detalle_medicamento", medicamento_id=medicamento_id), status_code=303)
+    except HTTPException:
+        raise
+    except crud.EdicionConcurrenteError:
+        # Otra edición se guardó antes: mostrar los datos actuales (con su nueva versión) para que el usuario reaplique sus cambios.
+        errors.append({"loc": ["general"], "msg": MENSAJE_EDICION_CONCURRENTE})
+        return mostrar_formulario(None, 409)
+    except crud.MedicamentoDuplicadoError:
+        # El índice único sobre lower(nombre) rechazó el cambio: el nombre pertenece a otro medicamento.
+        errors.append({"loc": ["nombre"], "msg": "Ya existe otro medicamento con este nombre."})
+        return mostrar_formulario(form_data_repop, 400)
     except Exception as e:
         errors.append({"loc": ["general"], "msg": f"Error inesperado: {e}"})
-        return templates.TemplateResponse("form_medicamento.html", {
-            "request": request, "form_title": f"Editar Medicamento: {medicamento_original.nombre}",
-            "form_action": request.url_for("editar_medicamento_submit", medicamento_id=medicamento_id),
-            "medicamento": form_data_repop, "errors": errors
-        }, status_code=500)
+        return mostrar_formulario(form_data_repop, 500)
 
 @app.get("/medicamentos/{medicamento_id}/eliminar/", name="eliminar_medicamento_confirm_form")
 async def eliminar_medicamento_confirm_form(request: Request, medicamento_id: int, db: Session = Depends(get_db_session_fastapi)):
@@ -566,15 +640,13 @@ async def editar_pedido_form(request: Request, pedido_id: int, db: Session = Dep
 async def editar_pedido_submit(
     request: Request, pedido_id: int, fecha_pedido_str: str = Form(..., alias="fecha_pedido"),
     proveedor: Optional[str] = Form(None), estado_str: str = Form(..., alias="estado"),
+    version: Optional[int] = Form(None), # Versión cargada en el formulario (control de concurrencia optimista)
     db: Session = Depends(get_db_session_fastapi)
 ):
     errors = []
-    pedido_original = crud.obtener_pedido(db, pedido_id=pedido_id)
-    if not pedido_original:
-        raise HTTPException(status_code=404, detail="Pedido no encontrado para actualizar")
-
     fecha_pedido_obj: Optional[py_date] = None
-    form_data_repop = {"id": pedido_id, "fecha_pedido_str_form": fecha_pedido_str, "proveedor": proveedor, "estado_str_form": estado_str}
+    form_data_repop = {"id": pedido_id, "fecha_pedido_str_form": fecha_pedido_str, "proveedor": proveedor, "estado_str_form": estado_str,
+                       "version": version}
 
     try: fecha_pedido_obj = py_date.fromisoformat(fecha_pedido_str)
     except ValueError: errors.append({"loc": ["fecha_pedido"], "msg": "Formato de fecha inválido. Use YYYY-MM-DD."})
@@ -608,14 +680,23 @@ async def editar_pedido_submit(
 
     try:
         update_data_dict = pedido_data_update.dict(exclude_unset=True)
-        if proveedor == "": update_data_dict['proveedor'] = None
-        elif proveedor is None and 'proveedor' not in update_data_dict and pedido_original.proveedor is not None:
-             update_data_dict['proveedor'] = None
+        if not proveedor: update_data_dict['proveedor'] = None # Proveedor vacío en el formulario: se borra
 
-        if not update_data_dict:
-            return RedirectResponse(url=request.url_for("detalle_pedido_ruta", pedido_id=pedido_id), status_code=303)
-        crud.actualizar_pedido(db, pedido_id=pedido_id, datos_actualizacion=update_data_dict)
+        # Sin consulta previa: un único UPDATE, y None si el pedido no existe.
+        if crud.actualizar_pedido(db, pedido_id=pedido_id, datos_actualizacion=update_data_dict, version_esperada=version) is None:
+            raise HTTPException(status_code=404, detail="Pedido no encontrado para actualizar")
         return RedirectResponse(url=request.url_for("detalle_pedido_ruta", pedido_id=pedido_id), status_code=303)
+    except HTTPException:
+        raise
+    except crud.EdicionConcurrenteError:
+        errors.append({"loc": ["general"], "msg": MENSAJE_EDICION_CONCURRENTE})
+        pedido_original = crud.obtener_pedido(db, pedido_id=pedido_id)
+        return templates.TemplateResponse("form_pedido.html", {
+            "request": request, "form_title": f"Editar Pedido #{pedido_id}",
+            "form_action": request.url_for("editar_pedido_submit", pedido_id=pedido_id),
+            "pedido": pedido_original, "estados_posibles": list(schemas.EstadoPedidoEnum),
+            "today_date_iso": pedido_original.fecha_pedido.isoformat(), "errors": errors
+        }, status_code=409)
     except Exception as e:
         errors.append({"loc": ["general"], "msg": f"Error inesperado: {e}"})
         return templates.TemplateResponse("form_pedido.html", {
@@ -674,12 +755,6 @@ async def crear_detalle_pedido_submit(
     precio_unitario_compra_caja: Optional[float] = Form(None),
     db: Session = Depends(get_db_session_fastapi)
 ):
-    pedido = crud.obtener_pedido(db, pedido_id=pedido_id)
-    if not pedido:
-        raise HTTPException(status_code=404, detail=f"Pedido con ID {pedido_id} no encontrado.")
-    if pedido.estado != models.EstadoPedido.PENDIENTE:
-        raise HTTPException(status_code=403, detail="No se pueden añadir ítems a este pedido (estado no es Pendiente).")
-
     errors = []
     form_data_repop = {
         "medicamento_id": medicamento_id,
@@ -687,13 +762,7 @@ async def crear_detalle_pedido_submit(
         "precio_unitario_compra_caja": precio_unitario_compra_caja
     }
 
-    if not crud.obtener_medicamento(db, medicamento_id=medicamento_id):
-        errors.append({"loc": ["medicamento_id"], "msg": "El medicamento seleccionado no es válido."})
-
-    if cantidad_cajas_pedidas <= 0:
-         errors.append({"loc": ["cantidad_cajas_pedidas"], "msg": "La cantidad de cajas debe ser positiva."})
-
-    if errors:
+    def mostrar_formulario(status_code: int):
         medicamentos_disponibles = crud.obtener_medicamentos(db, limit=1000)
         return templates.TemplateResponse("form_detalle_pedido.html", {
             "request": request, "form_title": f"Añadir Ítem al Pedido #{pedido_id}",
@@ -701,37 +770,39 @@ async def crear_detalle_pedido_submit(
             "pedido_id": pedido_id, "medicamentos_disponibles": medicamentos_disponibles,
             "detalle_data": form_data_repop,
             "errors": errors
-        }, status_code=422)
+        }, status_code=status_code)
+
+    if cantidad_cajas_pedidas <= 0:
+         errors.append({"loc": ["cantidad_cajas_pedidas"], "msg": "La cantidad de cajas debe ser positiva."})
+
+    if errors:
+        return mostrar_formulario(422)
 
     try:
         detalle_data_schema = schemas.DetallePedidoCreate(**form_data_repop)
     except ValidationError as e:
-        medicamentos_disponibles = crud.obtener_medicamentos(db, limit=1000)
-        return templates.TemplateResponse("form_detalle_pedido.html", {
-            "request": request, "form_title": f"Añadir Ítem al Pedido #{pedido_id}",
-            "form_action": request.url_for("crear_detalle_pedido_submit", pedido_id=pedido_id),
-            "pedido_id": pedido_id, "medicamentos_disponibles": medicamentos_disponibles,
-            "detalle_data": form_data_repop,
-            "errors": e.errors()
-        }, status_code=422)
+        errors = e.errors()
+        return mostrar_formulario(422)
 
     try:
+        # Un único INSERT que comprueba a la vez que el pedido exista y esté Pendiente y que el medicamento exista.
         crud.agregar_detalle_pedido(
             db=db, pedido_id=pedido_id, medicamento_id=detalle_data_schema.medicamento_id,
             cantidad_cajas_pedidas=detalle_data_schema.cantidad_cajas_pedidas,
-            precio_unitario_compra_caja=detalle_data_schema.precio_unitario_compra_caja
+            precio_unitario_compra_caja=detalle_data_schema.precio_unitario_compra_caja,
+            estado_requerido=models.EstadoPedido.PENDIENTE
         )
         return RedirectResponse(url=request.url_for("detalle_pedido_ruta", pedido_id=pedido_id), status_code=303)
+    except crud.PedidoNoEditableError:
+        raise HTTPException(status_code=403, detail="No se pueden añadir ítems a este pedido (estado no es Pendiente).")
+    except ValueError:
+        if not crud.obtener_pedido(db, pedido_id=pedido_id):
+            raise HTTPException(status_code=404, detail=f"Pedido con ID {pedido_id} no encontrado.")
+        errors.append({"loc": ["medicamento_id"], "msg": "El medicamento seleccionado no es válido."})
+        return mostrar_formulario(422)
     except Exception as e:
         errors.append({"loc": ["general"], "msg": f"Error inesperado al añadir el ítem: {e}"})
-        medicamentos_disponibles = crud.obtener_medicamentos(db, limit=1000)
-        return templates.TemplateResponse("form_detalle_pedido.html", {
-            "request": request, "form_title": f"Añadir Ítem al Pedido #{pedido_id}",
-            "form_action": request.url_for("crear_detalle_pedido_submit", pedido_id=pedido_id),
-            "pedido_id": pedido_id, "medicamentos_disponibles": medicamentos_disponibles,
-            "detalle_data": form_data_repop,
-            "errors": errors
-        }, status_code=500)
+        return mostrar_formulario(500)
 
 @app.post("/pedidos/{pedido_id}/items/{detalle_id}/eliminar/", name="eliminar_detalle_pedido_submit")
 async def eliminar_detalle_pedido_submit(
@@ -789,12 +860,21 @@ async def crear_lote_submit(
     precio_compra_lote_por_caja: Optional[float] = Form(None),
     db: Session = Depends(get_db_session_fastapi)
 ):
-    medicamento = crud.obtener_medicamento(db, medicamento_id=medicamento_id)
-    if not medicamento:
-        # Esto no debería ocurrir si el GET funcionó, pero es una salvaguarda.
-        raise HTTPException(status_code=404, detail="Medicamento no encontrado para añadir lote.")
-
     errors = []
+
+    def mostrar_formulario(status_code: int):
+        # El medicamento solo se consulta si hay que volver a mostrar el formulario: un alta correcta es
+        # un único INSERT, que ya comprueba que el medicamento exista.
+        medicamento = crud.obtener_medicamento(db, medicamento_id=medicamento_id)
+        if not medicamento:
+            raise HTTPException(status_code=404, detail="Medicamento no encontrado para añadir lote.")
+        return templates.TemplateResponse("form_lote.html", {
+            "request": request, "form_title": f"Añadir Nuevo Lote para: {medicamento.nombre}",
+            "form_action": request.url_for("crear_lote_submit", medicamento_id=medicamento_id),
+            "medicamento_info": medicamento, "lote": form_data_repop,
+            "today_date_iso": py_date.today().isoformat(), "errors": errors
+        }, status_code=status_code)
+
     # Para repopular el formulario en caso de error
     form_data_repop = {
         "cantidad_cajas": cantidad_cajas, "unidades_por_caja_lote": unidades_por_caja_lote,
@@ -822,12 +902,7 @@ async def crear_lote_submit(
 
 
     if errors:
-        return templates.TemplateResponse("form_lote.html", {
-            "request": request, "form_title": f"Añadir Nuevo Lote para: {medicamento.nombre}",
-            "form_action": request.url_for("crear_lote_submit", medicamento_id=medicamento_id),
-            "medicamento_info": medicamento, "lote": form_data_repop,
-            "today_date_iso": py_date.today().isoformat(), "errors": errors
-        }, status_code=422)
+        return mostrar_formulario(422)
 
     try:
         lote_data = schemas.LoteStockCreate(
@@ -838,12 +913,8 @@ async def crear_lote_submit(
             # medicamento_id se pasa directamente a la función crud
         )
     except ValidationError as e:
-        return templates.TemplateResponse("form_lote.html", {
-            "request": request, "form_title": f"Añadir Nuevo Lote para: {medicamento.nombre}",
-            "form_action": request.url_for("crear_lote_submit", medicamento_id=medicamento_id),
-            "medicamento_info": medicamento, "lote": form_data_repop,
-            "today_date_iso": py_date.today().isoformat(), "errors": e.errors()
-        }, status_code=422)
+        errors = e.errors()
+        return mostrar_formulario(422)
 
     try:
         crud.agregar_lote_stock(
@@ -855,22 +926,12 @@ async def crear_lote_submit(
             precio_compra_lote_por_caja=lote_data.precio_compra_lote_por_caja
         )
         return RedirectResponse(url=request.url_for("detalle_medicamento", medicamento_id=medicamento_id), status_code=303)
-    except ValueError as ve: # Por ejemplo, si el medicamento_id no existe en la función crud
+    except ValueError as ve: # El medicamento no existe: mostrar_formulario responde 404
         errors.append({"loc": ["medicamento_id"], "msg": str(ve)})
-        return templates.TemplateResponse("form_lote.html", {
-            "request": request, "form_title": f"Añadir Nuevo Lote para: {medicamento.nombre}",
-            "form_action": request.url_for("crear_lote_submit", medicamento_id=medicamento_id),
-            "medicamento_info": medicamento, "lote": form_data_repop,
-            "today_date_iso": py_date.today().isoformat(), "errors": errors
-        }, status_code=400)
+        return mostrar_formulario(400)
     except Exception as e:
         errors.append({"loc": ["general"], "msg": f"Error inesperado al guardar el lote: {e}"})
-        return templates.TemplateResponse("form_lote.html", {
-            "request": request, "form_title": f"Añadir Nuevo Lote para: {medicamento.nombre}",
-            "form_action": request.url_for("crear_lote_submit", medicamento_id=medicamento_id),
-            "medicamento_info": medicamento, "lote": form_data_repop,
-            "today_date_iso": py_date.today().isoformat(), "errors": errors
-        }, status_code=500)
+        return mostrar_formulario(500)
 
 @app.get("/lotes/{lote_id}/editar/", name="editar_lote_form")
 async def editar_lote_form(request: Request, lote_id: int, db: Session = Depends(get_db_session_fastapi)):
@@ -901,21 +962,33 @@ async def editar_lote_submit(
     fecha_compra_lote_str: str = Form(..., alias="fecha_compra_lote"), # La fecha de compra es obligatoria en el form de edición
     fecha_vencimiento_lote_str: str = Form(..., alias="fecha_vencimiento_lote"),
     precio_compra_lote_por_caja: Optional[float] = Form(None),
+    version: Optional[int] = Form(None), # Versión cargada en el formulario (control de concurrencia optimista)
+    medicamento_id: Optional[int] = Form(None), # Para redirigir sin consultar el lote
     db: Session = Depends(get_db_session_fastapi)
 ):
-    lote_original = crud.obtener_lote_stock(db, lote_id=lote_id)
-    if not lote_original:
-        raise HTTPException(status_code=404, detail="Lote no encontrado para actualizar.")
+    errors = []
 
-    medicamento = crud.obtener_medicamento(db, medicamento_id=lote_original.medicamento_id) # Para re-renderizar si hay error
+    def mostrar_formulario(lote_form, status_code: int):
+        # El lote y su medicamento solo se consultan si hay que volver a mostrar el formulario:
+        # una edición correcta es un único UPDATE.
+        lote_actual = crud.obtener_lote_stock(db, lote_id=lote_id)
+        if not lote_actual:
+            raise HTTPException(status_code=404, detail="Lote no encontrado para actualizar.")
+        medicamento = lote_actual.medicamento
+        return templates.TemplateResponse("form_lote.html", {
+            "request": request, "form_title": f"Editar Lote #{lote_id} para: {medicamento.nombre}",
+            "form_action": request.url_for("editar_lote_submit", lote_id=lote_id),
+            "medicamento_info": medicamento, "lote": lote_form if lote_form is not None else lote_actual,
+            "today_date_iso": py_date.today().isoformat(), "errors": errors
+        }, status_code=status_code)
 
-    errors = []
     form_data_repop = { # Para repopular el formulario
         "id": lote_id, # Para que la plantilla sepa que es edición
         "cantidad_cajas": cantidad_cajas, "unidades_por_caja_lote": unidades_por_caja_lote,
         "fecha_compra_lote": fecha_compra_lote_str, # Pasar el string original
         "fecha_vencimiento_lote": fecha_vencimiento_lote_str,
-        "precio_compra_lote_por_caja": precio_compra_lote_por_caja
+        "precio_compra_lote_por_caja": precio_compra_lote_por_caja,
+        "version": version
     }
 
     fecha_compra_obj: Optional[py_date] = None
@@ -935,12 +1008,7 @@ async def editar_lote_submit(
     if unidades_por_caja_lote <=0: errors.append({"loc": ["unidades_por_caja_lote"], "msg": "Unidades por caja debe ser positivo."})
 
     if errors:
-        return templates.TemplateResponse("form_lote.html", {
-            "request": request, "form_title": f"Editar Lote #{lote_id} para: {medicamento.nombre}",
-            "form_action": request.url_for("editar_lote_submit", lote_id=lote_id),
-            "medicamento_info": medicamento, "lote": form_data_repop,
-            "today_date_iso": py_date.today().isoformat(), "errors": errors
-        }, status_code=422)
+        return mostrar_formulario(form_data_repop, 422)
 
     try:
         # Usamos LoteStockUpdate que tiene todos los campos opcionales.
@@ -952,33 +1020,33 @@ async def editar_lote_submit(
             precio_compra_lote_por_caja=precio_compra_lote_por_caja
         )
     except ValidationError as e: # Otros errores de Pydantic
-        return templates.TemplateResponse("form_lote.html", {
-            "request": request, "form_title": f"Editar Lote #{lote_id} para: {medicamento.nombre}",
-            "form_action": request.url_for("editar_lote_submit", lote_id=lote_id),
-            "medicamento_info": medicamento, "lote": form_data_repop,
-            "today_date_iso": py_date.today().isoformat(), "errors": e.errors()
-        }, status_code=422)
+        errors = e.errors()
+        return mostrar_formulario(form_data_repop, 422)
 
     try:
         update_data_dict = lote_data_update.dict(exclude_unset=True)
 
-        # Manejo especial para que un precio vacío signifique None
-        if precio_compra_lote_por_caja is None and 'precio_compra_lote_por_caja' not in update_data_dict and lote_original.precio_compra_lote_por_caja is not None:
+        # Un precio vacío en el formulario significa borrar el valor
+        if precio_compra_lote_por_caja is None:
             update_data_dict['precio_compra_lote_por_caja'] = None
 
-        if not update_data_dict: # Si no hay cambios efectivos
-             return RedirectResponse(url=request.url_for("detalle_medicamento", medicamento_id=lote_original.medicamento_id), status_code=303)
-
-        crud.actualizar_lote_stock(db, lote_id=lote_id, datos_actualizacion=update_data_dict)
-        return RedirectResponse(url=request.url_for("detalle_medicamento", medicamento_id=lote_original.medicamento_id), status_code=303)
+        # Sin consulta previa: un único UPDATE (con RETURNING donde el motor lo admite), y None si el lote no existe.
+        lote = crud.actualizar_lote_stock(db, lote_id=lote_id, datos_actualizacion=update_data_dict, version_esperada=version)
+        if lote is None:
+            raise HTTPException(status_code=404, detail="Lote no encontrado para actualizar.")
+        # Sin RETURNING (SQLite con SQLAlchemy 1.4) el lote solo tiene cargadas las columnas actualizadas: leer
+        # lote.medicamento_id haría un SELECT, así que se usa el medicamento_id que envía el formulario.
+        if medicamento_id is None:
+            medicamento_id = lote.medicamento_id
+        return RedirectResponse(url=request.url_for("detalle_medicamento", medicamento_id=medicamento_id), status_code=303)
+    except HTTPException:
+        raise
+    except crud.EdicionConcurrenteError:
+        errors.append({"loc": ["general"], "msg": MENSAJE_EDICION_CONCURRENTE})
+        return mostrar_formulario(None, 409)
     except Exception as e:
         errors.append({"loc": ["general"], "msg": f"Error inesperado al actualizar el lote: {e}"})
-        return templates.TemplateResponse("form_lote.html", {
-            "request": request, "form_title": f"Editar Lote #{lote_id} para: {medicamento.nombre}",
-            "form_action": request.url_for("editar_lote_submit", lote_id=lote_id),
-            "medicamento_info": medicamento, "lote": form_data_repop,
-            "today_date_iso": py_date.today().isoformat(), "errors": errors
-        }, status_code=500)
+        return mostrar_formulario(form_data_repop, 500)
 
 @app.get("/lotes/{lote_id}/eliminar/", name="eliminar_lote_confirm_form")
 async def eliminar_lote_confirm_form(request: Request, lote_id: int, db: Session = Depends(get_db_session_fastapi)):
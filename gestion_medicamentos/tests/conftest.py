@@ -0,0 +1,26 @@
+# Configuración común de los tests: `app` se importa igual que desde main_web.py o main_cli.py,
+# con gestion_medicamentos en sys.path, y cada test usa su propia base de datos SQLite en memoria.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # gestion_medicamentos
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import database, models
+
+
+@pytest.fixture
+def engine():
+    engine = database.crear_engine("sqlite://")
+    models.Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    sesion = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield sesion
+    sesion.close()
@@ -0,0 +1,99 @@
+# Las consultas y el esquema deben funcionar en SQLite (la base de datos local) y en PostgreSQL
+# (GESTION_MEDICAMENTOS_DATABASE_URL). Sin un servidor PostgreSQL a mano, cada consulta se ejecuta
+# en SQLite y la misma sentencia se compila con el dialecto de PostgreSQL.
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.sql.elements import TextClause
+
+from app import crud, models
+
+
+@pytest.fixture
+def sentencias(engine):
+    """Las sentencias (no SQL textual) que ejecuta el engine durante el test."""
+    capturadas = []
+
+    def capturar(_conexion, sentencia, *_args):
+        if not isinstance(sentencia, TextClause):
+            capturadas.append(sentencia)
+
+    event.listen(engine, "before_execute", capturar)
+    yield capturadas
+    event.remove(engine, "before_execute", capturar)
+
+
+def _sql_postgresql(sentencias) -> str:
+    return "\n".join(str(s.compile(dialect=postgresql.dialect())) for s in sentencias)
+
+
+@pytest.fixture
+def pedidos(db):
+    med = crud.crear_medicamento(db, "Ibuprofeno", "Genérico", 20)
+    for fecha, estado, cajas in [
+        (date(2024, 1, 10), models.EstadoPedido.RECIBIDO, 2),
+        (date(2024, 1, 31), models.EstadoPedido.RECIBIDO, 1),
+        (date(2024, 2, 1), models.EstadoPedido.PENDIENTE, 5),
+        (date(2023, 12, 31), models.EstadoPedido.RECIBIDO, 3),
+    ]:
+        pedido = crud.crear_pedido(db, fecha_pedido=fecha, proveedor="Droguería", estado=estado)
+        crud.agregar_detalle_pedido(db, pedido.id, med.id, cajas, precio_unitario_compra_caja=10.0)
+    return med
+
+
+@pytest.mark.parametrize("tabla", models.Base.metadata.sorted_tables, ids=lambda t: t.name)
+def test_ddl_compila_en_postgresql(tabla):
+    ddl = str(CreateTable(tabla).compile(dialect=postgresql.dialect()))
+    assert ddl.startswith(f"\nCREATE TABLE {tabla.name}")
+    assert "AUTOINCREMENT" not in ddl # Opción solo de SQLite (models.SIN_REUTILIZAR_IDS)
+    for indice in tabla.indexes:
+        CreateIndex(indice).compile(dialect=postgresql.dialect())
+
+
+def test_indice_nombre_sin_mayusculas_en_postgresql():
+    indice = next(i for i in models.Medicamento.__table__.indexes if i.name == models.UQ_MEDICAMENTO_NOMBRE)
+    ddl = str(CreateIndex(indice).compile(dialect=postgresql.dialect()))
+    assert ddl.startswith("CREATE UNIQUE INDEX")
+    assert "lower(nombre)" in ddl
+
+
+def test_costos_por_mes(db, pedidos, sentencias):
+    assert crud.obtener_costos_pedidos_por_mes_anio(db, 2024, 1) == 30.0
+    assert crud.obtener_costos_pedidos_por_mes_anio(db, 2024, 2) == 0.0
+    assert crud.obtener_costos_pedidos_por_mes_anio(db, 2024, 2, estado_filtro=None) == 50.0
+    assert crud.obtener_costos_pedidos_por_mes_anio(db, 2023, 12) == 30.0
+
+    sql = _sql_postgresql(sentencias)
+    assert "pedidos.fecha_pedido >=" in sql and "pedidos.fecha_pedido <" in sql
+    assert "EXTRACT" not in sql # Rango de fechas, no EXTRACT(...) = ...
+
+
+def test_meses_con_pedidos(db, pedidos, sentencias):
+    assert crud.obtener_meses_con_pedidos(db) == [{"anio": 2024, "mes": 1}, {"anio": 2023, "mes": 12}]
+    assert crud.obtener_meses_con_pedidos(db, estado_filtro=None) == [
+        {"anio": 2024, "mes": 2}, {"anio": 2024, "mes": 1}, {"anio": 2023, "mes": 12},
+    ]
+
+    sql = _sql_postgresql(sentencias)
+    assert "CAST(EXTRACT(year FROM pedidos.fecha_pedido) AS INTEGER)" in sql
+    assert f"CAST(EXTRACT(month FROM {models.PedidoArchivado.__tablename__}.fecha_pedido) AS INTEGER)" in sql
+    assert "UNION" in sql
+
+
+def test_busqueda_sin_indice_fts(db, sentencias):
+    # Sin la tabla FTS5 (create_all no la crea) la búsqueda usa el mismo ILIKE que en PostgreSQL
+    crud.crear_medicamento(db, "Paracetamol", "Tylenol", 10)
+    crud.crear_medicamento(db, "Amoxicilina", "Amoxil", 12)
+    crud.crear_medicamento(db, "Paracetamol Forte", "Genérico", 20)
+    sentencias.clear()
+
+    encontrados = crud.buscar_medicamentos(db, "PARACETAMOL")
+    assert [m.nombre for m in encontrados] == ["Paracetamol", "Paracetamol Forte"]
+    assert [m.nombre for m in crud.buscar_medicamentos(db, "amox")] == ["Amoxicilina"]
+    assert crud.buscar_medicamentos(db, "paracetamol tylenol")[0].marca == "Tylenol"
+
+    sql = _sql_postgresql(sentencias)
+    assert "medicamentos.nombre ILIKE" in sql and "medicamentos.marca ILIKE" in sql
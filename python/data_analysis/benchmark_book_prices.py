@@ -0,0 +1,253 @@
+# Benchmarks for book_price_analysis.py on a synthetic catalog.
+# Generates a raw catalog with the same columns and the same kind of dirty values as the real dumps
+# (text in numeric columns, unparseable dates, padded and mixed-case text, repeated ISBNs) and measures:
+#   - reading and cleaning the raw CSV with types inferred by pandas vs. the declared READ_SCHEMA
+#     (time and memory footprint);
+#   - loading the cleaned data from CSV, Parquet and Feather, with and without column projection;
+#   - processing the catalog with 1..N worker processes (--workers), to see how the parallel mode scales;
+#   - duplicate detection: the former duplicated() + sort check vs. the ISBN hash pass and the title
+#     MinHash-LSH matching of the quality checks;
+#   - a daily run of the script on a dump with 1% of the rows changed: full run vs. --incremental with
+#     the previous day's state (whole runs, so reading the CSV and writing the output count for both).
+#
+# Usage:
+#   python benchmark_book_prices.py --rows 1000000
+#   python benchmark_book_prices.py --rows 1000000 --workers 1,2,4,8 --json results.json
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import book_price_analysis as bpa
+
+# Columns loaded by the projected cases: what a price report by category needs.
+PROJECTED_COLUMNS = ['categoria', 'precio_eur']
+# Steps of the daily run cases: the cleaning steps whose results the incremental state keeps.
+DAILY_RUN_FLAGS = ['--run_type_conversions', '--run_data_imputation', '--run_price_conversion',
+                   '--run_text_cleaning', '--no_text_cache', '--save_processed_data']
+
+def generate_catalog(rows, seed=0):
+    """Raw catalog DataFrame, as read from a CSV dump (every column as text or mixed values)."""
+    rng = np.random.default_rng(seed)
+    categories = ['Negocios y cs. economicas', 'Literatura ', ' FICCION', 'Infantiles', 'Historia', 'Ciencias']
+    genres = ['Dep. extremos', 'Novela', 'Poesia', 'Ensayo', 'Biografia']
+    languages = ['Español', 'Ingles', ' español', 'Portugues', 'Frances']
+
+    isbn = rng.integers(9780000000000, 9790000000000, rows).astype(str).astype(object)
+    repeated = rng.random(rows) < 0.02
+    isbn[repeated] = isbn[rng.integers(0, rows, repeated.sum())]
+    pages = rng.integers(0, 900, rows).astype(object)
+    pages[rng.random(rows) < 0.03] = 'N/D'
+    prices = rng.lognormal(9.5, 0.8, rows).round(2).astype(object)
+    prices[rng.random(rows) < 0.02] = 'consultar'
+    dates = pd.Timestamp('2000-01-01') + pd.to_timedelta(rng.integers(0, 9000, rows), unit='D')
+    dates = np.array(dates.strftime('%Y-%m-%d'), dtype=object)
+    dates[rng.random(rows) < 0.02] = 'sin fecha'
+
+    return pd.DataFrame({
+        'titulo': [f'  Titulo {i} ' for i in rng.integers(0, rows // 2 + 1, rows)],
+        'autor': [f'Autor {i}' for i in rng.integers(0, max(rows // 50, 1), rows)],
+        'editorial': [f'Editorial {i}' for i in rng.integers(0, 300, rows)],
+        'idioma': rng.choice(languages, rows),
+        'encuadernacion': rng.choice(['Tapa blanda', 'Tapa dura', 'Rustica'], rows),
+        'categoria': rng.choice(categories, rows),
+        'genero': rng.choice(genres, rows),
+        'subgenero': rng.choice(['Clasicos', 'Contemporanea', 'Juvenil'], rows),
+        'codigo_isbn': isbn,
+        'nro_paginas': pages,
+        'precio': prices,
+        'fecha_publicacion': dates,
+    })
+
+def pipeline_args(workers=1):
+    return argparse.Namespace(run_all_processing=True, run_quality_checks=False, run_type_conversions=False,
+                              run_data_imputation=False, run_price_conversion=False, run_text_cleaning=False,
+                              run_outlier_detection=False, outlier_groups=bpa.DEFAULT_OUTLIER_GROUPS, run_price_model=False,
+                              workers=workers, text_mapping=bpa.DEFAULT_TEXT_MAPPING, text_cache=None)
+
+def clean_catalog(df):
+    args = pipeline_args()
+    df = bpa.process_dates(df, verbose=False)
+    df = bpa.process_numeric_columns(df, args, verbose=False)
+    return bpa.perform_text_cleaning(df, verbose=False, normalizer=bpa.text_normalizer_for(args))
+
+def best_of(function, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup() # Not timed
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 1e6
+
+def schema_cases(directory, raw, repeat):
+    """Reading and cleaning the raw CSV with inferred types vs. the declared schema."""
+    path = os.path.join(directory, 'raw.csv')
+    raw.to_csv(path, index=False)
+    readers = [
+        ('inferred', lambda: pd.read_csv(path)),
+        ('declared schema', lambda: bpa.read_csv_typed(path)),
+    ]
+    results = []
+    for name, reader in readers:
+        loaded = reader()
+        results.append({'case': f'read raw ({name})', 'seconds': best_of(reader, repeat), 'memory_mb': memory_mb(loaded)})
+        cleaned = clean_catalog(loaded.copy())
+        results.append({'case': f'clean ({name})', 'seconds': best_of(lambda: clean_catalog(loaded.copy()), repeat),
+                        'memory_mb': memory_mb(cleaned)})
+    return results
+
+def load_cases(directory, cleaned, repeat):
+    """Load time of the cleaned catalog per format, full and projected."""
+    paths = {name: os.path.join(directory, f'cleaned.{name}') for name in ('csv', 'parquet', 'feather')}
+    cleaned.to_csv(paths['csv'], index=False)
+    bpa.save_data(cleaned, paths['parquet'])
+    bpa.save_data(cleaned, paths['feather'])
+
+    def typed_csv():
+        # What a CSV consumer has to do to get the same types the columnar files already have.
+        return bpa.apply_schema(bpa.read_csv_typed(paths['csv']))
+
+    cases = [
+        ('csv', 'all', lambda: pd.read_csv(paths['csv'])),
+        ('csv + types', 'all', typed_csv),
+        ('parquet', 'all', lambda: pd.read_parquet(paths['parquet'])),
+        ('feather', 'all', lambda: bpa.apply_schema(pd.read_feather(paths['feather']))),
+        ('csv', 'projected', lambda: pd.read_csv(paths['csv'], usecols=PROJECTED_COLUMNS)),
+        ('parquet', 'projected', lambda: pd.read_parquet(paths['parquet'], columns=PROJECTED_COLUMNS)),
+        ('feather', 'projected', lambda: pd.read_feather(paths['feather'], columns=PROJECTED_COLUMNS)),
+    ]
+    results = []
+    for name, columns, function in cases:
+        file_name = paths[name.split()[0]]
+        results.append({
+            'case': f'load {name}', 'columns': columns,
+            'seconds': best_of(function, repeat),
+            'size_mb': os.path.getsize(file_name) / 1e6,
+        })
+    baseline = {r['columns']: r['seconds'] for r in results if r['case'] == 'load csv'}
+    for result in results:
+        result['speedup_vs_csv'] = baseline[result['columns']] / result['seconds']
+    return results
+
+def parallel_cases(raw_typed, workers_list, repeat):
+    """All processing steps on the loaded catalog with each number of workers, and the speedup over 1."""
+    results = []
+    for workers in workers_list:
+        args = pipeline_args(workers)
+        seconds = best_of(lambda: bpa.process_dataframe_parallel(raw_typed.copy(), args), repeat)
+        results.append({'workers': workers, 'seconds': seconds})
+    for result in results:
+        result['speedup'] = results[0]['seconds'] / result['seconds']
+    return results
+
+def dedup_cases(raw_typed, repeat):
+    """Duplicate detection on the loaded catalog."""
+    def sorted_duplicates():
+        # What check_data_quality used to do: two duplicated() calls and a sort of the duplicate rows.
+        duplicates = raw_typed[raw_typed.duplicated(subset=['codigo_isbn'], keep=False)].sort_values(by='codigo_isbn')
+        return duplicates, raw_typed.duplicated(subset=['codigo_isbn'], keep='first').sum()
+
+    cases = [
+        ('duplicated + sort (raw ISBN)', sorted_duplicates),
+        ('ISBN-13 hash pass', lambda: bpa.exact_isbn_groups(bpa.normalize_isbn(raw_typed['codigo_isbn']))),
+        ('title MinHash-LSH', lambda: bpa.similar_title_groups(raw_typed['titulo'], raw_typed['autor'])),
+        ('full dedup report', lambda: bpa.find_duplicates(raw_typed)),
+        # Every title compared against a missing author: no title groups, and no error
+        ('dedup report, no autor', lambda: bpa.find_duplicates(raw_typed.assign(autor=pd.NA).astype({'autor': bpa.TEXT_DTYPE}))),
+    ]
+    return [{'case': name, 'seconds': best_of(function, repeat)} for name, function in cases]
+
+def incremental_cases(directory, raw, repeat, changed_fraction=0.01):
+    """Whole script runs on a dump with `changed_fraction` of the rows changed, full and --incremental."""
+    rng = np.random.default_rng(1)
+    changed = raw.copy()
+    rows = rng.choice(len(raw), max(int(len(raw) * changed_fraction), 1), replace=False)
+    changed.loc[rows, 'precio'] = rng.lognormal(9.5, 0.8, len(rows)).round(2)
+    yesterday, today = os.path.join(directory, 'yesterday.csv'), os.path.join(directory, 'today.csv')
+    raw.to_csv(yesterday, index=False)
+    changed.to_csv(today, index=False)
+    state, saved_state = os.path.join(directory, 'state'), os.path.join(directory, 'state_yesterday')
+
+    def run(path, *options):
+        subprocess.run([sys.executable, os.path.abspath(bpa.__file__), path, *DAILY_RUN_FLAGS, *options,
+                        '--output', os.path.join(directory, 'daily.parquet')], check=True, stdout=subprocess.DEVNULL)
+
+    def restore_state():
+        shutil.rmtree(state, ignore_errors=True)
+        shutil.copytree(saved_state, state)
+
+    run(yesterday, '--incremental', saved_state)
+    cases = [
+        ('full run', lambda: run(today), None),
+        ('incremental, no state', lambda: run(today, '--incremental', state),
+         lambda: shutil.rmtree(state, ignore_errors=True)),
+        ('incremental, unchanged', lambda: run(yesterday, '--incremental', state), restore_state),
+        (f'incremental, {changed_fraction:.0%} changed', lambda: run(today, '--incremental', state), restore_state),
+    ]
+    results = [{'case': name, 'seconds': best_of(function, repeat, setup)} for name, function, setup in cases]
+    for result in results:
+        result['speedup_vs_full'] = results[0]['seconds'] / result['seconds']
+    return results
+
+def print_results(schema_results, results, parallel_results, dedup_results, incremental_results):
+    print(f"\n{'case':<26} {'seconds':>9} {'memory MB':>10}")
+    for r in schema_results:
+        print(f"{r['case']:<26} {r['seconds']:>9.3f} {r['memory_mb']:>10.1f}")
+    print(f"\n{'case':<22} {'columns':<10} {'seconds':>9} {'size MB':>9} {'vs CSV':>8}")
+    for r in results:
+        print(f"{r['case']:<22} {r['columns']:<10} {r['seconds']:>9.3f} {r['size_mb']:>9.1f} {r['speedup_vs_csv']:>7.1f}x")
+    print(f"\nAll processing steps, {os.cpu_count()} CPUs available")
+    print(f"{'workers':>7} {'seconds':>9} {'speedup':>8}")
+    for r in parallel_results:
+        print(f"{r['workers']:>7} {r['seconds']:>9.3f} {r['speedup']:>7.2f}x")
+    print(f"\n{'duplicate detection':<30} {'seconds':>9}")
+    for r in dedup_results:
+        print(f"{r['case']:<30} {r['seconds']:>9.3f}")
+    print(f"\n{'daily run':<30} {'seconds':>9} {'vs full':>8}")
+    for r in incremental_results:
+        print(f"{r['case']:<30} {r['seconds']:>9.3f} {r['speedup_vs_full']:>7.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark loading the cleaned book catalog in CSV, Parquet and Feather.')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Rows of the synthetic catalog (default 1,000,000).')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the best time is reported.')
+    parser.add_argument('--workers', type=lambda value: [int(n) for n in value.split(',')], default=[1, 2, 4],
+                        help='Comma-separated worker counts for the parallel cases (default 1,2,4).')
+    parser.add_argument('--json', metavar='FILE', help='Also save the results as JSON.')
+    args = parser.parse_args()
+
+    print(f"Generating a synthetic catalog of {args.rows} rows...")
+    raw = generate_catalog(args.rows)
+    directory = tempfile.mkdtemp(prefix='book_prices_bench_')
+    try:
+        schema_results = schema_cases(directory, raw, args.repeat)
+        raw_typed = bpa.read_csv_typed(os.path.join(directory, 'raw.csv'))
+        results = load_cases(directory, clean_catalog(raw_typed.copy()), args.repeat)
+        parallel_results = parallel_cases(raw_typed, args.workers, args.repeat)
+        dedup_results = dedup_cases(raw_typed, args.repeat)
+        incremental_results = incremental_cases(directory, raw, args.repeat)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print_results(schema_results, results, parallel_results, dedup_results, incremental_results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'rows': args.rows, 'cpus': os.cpu_count(), 'schema': schema_results, 'load': results,
+                       'parallel': parallel_results, 'dedup': dedup_results, 'incremental': incremental_results},
+                      f, indent=2)
+        print(f"\nResults saved to '{args.json}'")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,114 @@
+import hashlib
+import importlib.util
+import io
+import json
+import math
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import pandas as pd
 import numpy as np
 import argparse
+import re
 import matplotlib.pyplot as plt
 
-def load_data(csv_file):
+# Text columns normalized by perform_text_cleaning.
+TEXT_COLUMNS = ['titulo', 'autor', 'editorial', 'idioma', 'encuadernacion', 'categoria', 'genero', 'subgenero']
+# Low-cardinality text columns whose unique values are inspected after cleaning.
+KEY_CATEGORICAL_COLUMNS = ['idioma', 'encuadernacion', 'categoria', 'genero']
+# Text columns with few distinct values: stored as 'category' (one small integer code per row).
+CATEGORY_COLUMNS = ['editorial', 'idioma', 'encuadernacion', 'categoria', 'genero', 'subgenero']
+# Arrow-backed strings when pyarrow is installed: contiguous buffers instead of one Python object per value.
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+TEXT_DTYPE = 'string[pyarrow]' if HAS_PYARROW else 'string'
+# Declared schema of the raw catalog, applied by the CSV reader itself instead of converting after load.
+# ISBNs are identifiers, not numbers: text, so they keep leading zeros and the 'X' check digit.
+# 'nro_paginas' and 'precio' may hold placeholders like 'N/D' or 'consultar', so they are read as text
+# and process_numeric_columns turns them into nullable numbers.
+READ_SCHEMA = {
+    'titulo': TEXT_DTYPE, 'autor': TEXT_DTYPE, 'codigo_isbn': TEXT_DTYPE,
+    'nro_paginas': TEXT_DTYPE, 'precio': TEXT_DTYPE,
+    **{col: 'category' for col in CATEGORY_COLUMNS},
+}
+# Parsed by the reader when every value matches DATE_FORMAT; otherwise process_dates parses them.
+DATE_COLUMNS = ['fecha_publicacion']
+DATE_FORMAT = '%Y-%m-%d'
+# Types of the known columns once processed. Parquet and Feather files are written with these types
+# (dictionary-encoded categories, float prices, real dates), so later runs and downstream consumers
+# load them without parsing text again.
+BOOK_SCHEMA = {
+    'titulo': TEXT_DTYPE, 'autor': TEXT_DTYPE, 'codigo_isbn': TEXT_DTYPE,
+    **{col: 'category' for col in CATEGORY_COLUMNS},
+    'nro_paginas': 'Float64', 'precio': 'Float64', 'precio_eur': 'Float64',
+    'fecha_publicacion': 'datetime64[ns]', 'outlier': 'category', 'precio_por_pagina': 'Float64',
+}
+# Input/output format by file extension; anything else is CSV. Parquet and Feather need pyarrow.
+COLUMNAR_FORMATS = {'.parquet': 'parquet', '.pq': 'parquet', '.feather': 'feather', '.arrow': 'feather'}
+DEFAULT_OUTPUT_FILENAME = 'cleaned_dataset.csv'
+# Text normalization rules (see TextNormalizer) and the cache of normalized values kept between runs.
+DEFAULT_TEXT_MAPPING = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'text_normalization.json')
+DEFAULT_TEXT_CACHE = '.text_normalization_cache.json'
+# Dated exchange rates for 'precio_eur' (see ExchangeRates) and the currency of 'precio' when the data
+# has no 'moneda' column with one per row.
+DEFAULT_EXCHANGE_RATES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exchange_rates.csv')
+DEFAULT_PRICE_CURRENCY = 'ARS'
+CURRENCY_COLUMN = 'moneda'
+# Numeric columns summarized in the chunked mode.
+NUMERIC_SUMMARY_COLUMNS = ['nro_paginas', 'precio', 'precio_eur']
+
+def file_format(path):
+    return COLUMNAR_FORMATS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+def apply_schema(df):
+    """
+    Returns df with the known columns cast to their BOOK_SCHEMA type. Numeric and date columns are
+    only cast once a processing step has converted them (e.g. 'precio' read as text stays text).
+    """
+    dtypes = {}
+    for col, dtype in BOOK_SCHEMA.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        if dtype in (TEXT_DTYPE, 'category'):
+            dtypes[col] = dtype
+        elif dtype == 'Float64' and pd.api.types.is_numeric_dtype(df[col]):
+            dtypes[col] = dtype
+        elif dtype.startswith('datetime64') and pd.api.types.is_datetime64_any_dtype(df[col]):
+            dtypes[col] = dtype
+    return df.astype(dtypes) if dtypes else df
+
+def read_csv_typed(path, columns=None, chunksize=None, parse_dates=True):
+    """pd.read_csv with READ_SCHEMA and date parsing; the pyarrow engine (multithreaded) when possible."""
+    options = {'dtype': READ_SCHEMA, 'usecols': columns}
+    if parse_dates:
+        present = columns if columns is not None else pd.read_csv(path, nrows=0).columns # Header only
+        options['parse_dates'] = [col for col in DATE_COLUMNS if col in present]
+        options['date_format'] = DATE_FORMAT
+    if chunksize:
+        return pd.read_csv(path, chunksize=chunksize, **options) # The pyarrow engine cannot read in chunks
+    if HAS_PYARROW:
+        options['engine'] = 'pyarrow'
+    return pd.read_csv(path, **options)
+
+def load_data(csv_file, columns=None, parse_dates=True):
+    # columns: only load these columns (usecols for CSV; columnar formats skip the rest on disk).
     try:
-        df = pd.read_csv(csv_file)
+        input_format = file_format(csv_file)
+        if input_format == 'parquet':
+            df = pd.read_parquet(csv_file, columns=columns)
+        elif input_format == 'feather':
+            df = apply_schema(pd.read_feather(csv_file, columns=columns))
+        else:
+            df = read_csv_typed(csv_file, columns, parse_dates=parse_dates)
         print(f"Successfully loaded data from '{csv_file}'.")
         return df
     except FileNotFoundError:
         print(f"Error: The file '{csv_file}' was not found.")
         print("Please make sure the dataset file exists in the specified path.")
         return None
+    except ImportError as e:
+        print(f"Error: reading Parquet/Feather files requires pyarrow ({e}).")
+        return None
     except Exception as e:
         print(f"An error occurred during data loading: {e}")
         return None
@@ -23,7 +120,219 @@ def log_initial_info(df):
     print(df.columns)
     print(f"Dataset shape: {df.shape}")
 
-def check_data_quality(df):
+# --- Duplicate detection ---
+# Exact duplicates share an ISBN once ISBN-10s are converted to ISBN-13 (the same book is often listed
+# under both). Each ISBN is hashed once and the rows are grouped by hash, instead of running duplicated()
+# and sorting the frame. Near-duplicates (same book entered with a slightly different title, e.g. a
+# missing accent, a typo or an extra subtitle word) are found with MinHash-LSH: rows are blocked by
+# normalized author, each distinct title gets a MinHash signature of its character trigrams, and only
+# titles that share an LSH bucket are compared, so the cost grows with the number of rows rather than
+# with the number of pairs. The groups found are written to a report file instead of being printed.
+
+DEFAULT_DEDUP_REPORT = 'dedup_report.csv'
+# Estimated Jaccard similarity of the title trigrams above which two titles by the same author match.
+DEFAULT_TITLE_SIMILARITY = 0.8
+# Signature length and LSH bands: 8 bands of 4 hashes catch ~98% of the pairs with similarity 0.8
+# and ~8% of those with 0.4 (candidates are then checked against the threshold).
+MINHASH_PERMUTATIONS = 32
+LSH_BANDS = 8
+MINHASH_BLOCK_SIZE = 100_000 # Titles whose trigrams are hashed at once
+ISBN_13_WEIGHTS = np.array([1, 3] * 6, dtype=np.int64)
+
+def _digits(strings, width):
+    """Matrix of the digits of equal-length numeric strings (one row per string)."""
+    buffer = np.frombuffer(''.join(strings).encode('ascii'), dtype=np.uint8)
+    return (buffer.reshape(-1, width) - ord('0')).astype(np.int64)
+
+def normalize_isbn(series):
+    """
+    ISBNs as ISBN-13 text: separators removed, ISBN-10s converted (978 prefix and new check digit).
+    Values that are not 10 or 13 characters long after cleaning become <NA>.
+    """
+    cleaned = series.astype(TEXT_DTYPE).str.replace(r'\.0$', '', regex=True) # ISBNs once read as floats
+    cleaned = cleaned.str.replace(r'[^0-9Xx]', '', regex=True).str.upper()
+    lengths = cleaned.str.len()
+    isbn = cleaned.where(((lengths == 13) & cleaned.str.isdigit()).fillna(False))
+    isbn_10 = ((lengths == 10) & cleaned.str.match(r'^\d{9}[\dX]$')).fillna(False)
+    if isbn_10.any():
+        body = '978' + cleaned[isbn_10].str.slice(0, 9)
+        check = (10 - _digits(body.tolist(), 12) @ ISBN_13_WEIGHTS % 10) % 10
+        isbn[isbn_10] = body + pd.Series(check, index=body.index).astype(str)
+    return isbn
+
+def normalize_match_text(series):
+    """Lowercase ASCII words separated by single spaces (accents and punctuation removed), for matching."""
+    text = series.astype(TEXT_DTYPE).str.normalize('NFKD').str.lower()
+    text = text.str.replace('[\u0300-\u036f]', '', regex=True) # Combining accents left by NFKD
+    return text.str.replace(r'[^0-9a-z]+', ' ', regex=True).str.strip()
+
+def normalized_codes(series):
+    """
+    (codes, values) of series after normalize_match_text, like pd.factorize (-1 for missing or empty text).
+    Only the distinct values are normalized.
+    """
+    codes, uniques = pd.factorize(series)
+    normalized = normalize_match_text(pd.Series(uniques, dtype=TEXT_DTYPE))
+    normalized_codes, values = pd.factorize(normalized.mask(normalized == ''))
+    if len(values) == 0: # Every value missing or empty: nothing to index
+        return np.full(len(series), -1), values
+    return np.where(codes >= 0, normalized_codes[np.maximum(codes, 0)], -1), values
+
+def minhash_signatures(texts, permutations=MINHASH_PERMUTATIONS, seed=0):
+    """
+    (len(texts), permutations) uint32 MinHash signatures of the character trigrams of ASCII texts.
+    Trigrams are packed into integers and hashed with multiply-shift hashing, all in numpy.
+    """
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, 2 ** 63, permutations, dtype=np.uint64) | np.uint64(1) # Odd
+    offsets = rng.integers(0, 2 ** 63, permutations, dtype=np.uint64)
+    signatures = np.empty((len(texts), permutations), dtype=np.uint32)
+    for start in range(0, len(texts), MINHASH_BLOCK_SIZE):
+        block = [f' {text} ' for text in texts[start:start + MINHASH_BLOCK_SIZE]] # Padding: >= 1 trigram each
+        lengths = np.fromiter(map(len, block), dtype=np.int64, count=len(block))
+        buffer = np.frombuffer(''.join(block).encode('ascii'), dtype=np.uint8).astype(np.uint64)
+        trigrams = buffer[:-2] << np.uint64(16) | buffer[1:-1] << np.uint64(8) | buffer[2:]
+        # Drop the trigrams that straddle two texts; each text keeps len - 2 of them
+        ends = np.cumsum(lengths)
+        valid = np.ones(len(trigrams), dtype=bool)
+        valid[np.concatenate([ends[:-1] - 2, ends[:-1] - 1])] = False
+        trigrams = trigrams[valid]
+        run_starts = np.concatenate([[0], np.cumsum(lengths - 2)[:-1]])
+        with np.errstate(over='ignore'): # uint64 arithmetic wraps around, as multiply-shift hashing needs
+            for i in range(permutations):
+                hashes = (trigrams * multipliers[i] + offsets[i]) >> np.uint64(32)
+                signatures[start:start + len(block), i] = np.minimum.reduceat(hashes, run_starts)
+    return signatures
+
+def connected_components(size, left, right):
+    """Component label (smallest member) of each of `size` nodes, given the edges left[i]-right[i]."""
+    labels = np.arange(size)
+    while True:
+        smallest = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, smallest)
+        np.minimum.at(updated, right, smallest)
+        updated = updated[updated] # Pointer jumping: follow labels to their own label
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+def exact_isbn_groups(isbn):
+    """Group number of the rows whose normalized ISBN is repeated (-1 otherwise), from one hash pass."""
+    present = isbn.notnull().to_numpy()
+    groups = np.full(len(isbn), -1)
+    hashes = pd.util.hash_pandas_object(isbn[present], index=False, categorize=False).to_numpy()
+    codes, uniques = pd.factorize(hashes)
+    repeated = np.bincount(codes, minlength=len(uniques)) > 1
+    # Renumber the repeated hashes 0..k-1, in order of first appearance
+    group_numbers = np.cumsum(repeated) - 1
+    groups[present] = np.where(repeated[codes], group_numbers[codes], -1)
+    return groups
+
+def similar_title_groups(titles, authors, threshold=DEFAULT_TITLE_SIMILARITY):
+    """
+    (group number or -1, estimated similarity to the group's first title) of each row, for rows with
+    the same normalized author and titles at least `threshold` similar (MinHash-LSH).
+    """
+    groups = np.full(len(titles), -1)
+    similarity = np.full(len(titles), np.nan)
+    title_codes, unique_titles = normalized_codes(titles)
+    author_codes, _ = normalized_codes(authors)
+    present = title_codes >= 0
+    if not present.any():
+        return groups, similarity
+    # Work on the distinct (title, author) pairs; signatures only on the distinct titles.
+    title_codes = title_codes[present]
+    author_codes = author_codes[present] + 1 # Missing authors (-1) form one more block
+    author_count = author_codes.max() + 1
+    pair_codes, pairs = pd.factorize(title_codes.astype(np.int64) * author_count + author_codes)
+    pair_authors = pairs % author_count
+    signatures = minhash_signatures(unique_titles.tolist())[pairs // author_count]
+
+    # Candidates: pairs sharing a bucket in some band (same author and same slice of the signature).
+    # Each member of a bucket is checked against the bucket's first member.
+    rows_per_band = MINHASH_PERMUTATIONS // LSH_BANDS
+    left, right = [], []
+    for band in range(LSH_BANDS):
+        band_columns = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        bucket_frame = pd.DataFrame(band_columns)
+        bucket_frame['author'] = pair_authors
+        buckets, _ = pd.factorize(pd.util.hash_pandas_object(bucket_frame, index=False).to_numpy())
+        _, first_member = np.unique(buckets, return_index=True)
+        first = first_member[buckets]
+        candidates = np.flatnonzero(first != np.arange(len(buckets)))
+        matches = (signatures[candidates] == signatures[first[candidates]]).mean(axis=1) >= threshold
+        left.append(candidates[matches])
+        right.append(first[candidates[matches]])
+    labels = connected_components(len(pairs), np.concatenate(left), np.concatenate(right))
+
+    row_labels = labels[pair_codes]
+    counts = np.bincount(row_labels, minlength=len(pairs))
+    in_group = counts[row_labels] > 1
+    if in_group.any():
+        _, group_numbers = np.unique(row_labels[in_group], return_inverse=True)
+        present_rows = np.flatnonzero(present)
+        groups[present_rows[in_group]] = group_numbers
+        representative = signatures[row_labels[in_group]]
+        similarity[present_rows[in_group]] = (signatures[pair_codes[in_group]] == representative).mean(axis=1)
+    return groups, similarity
+
+def find_duplicates(df, title_similarity=DEFAULT_TITLE_SIMILARITY):
+    """
+    Dedup report: one row per book in a duplicate group, with the match type ('isbn' for the same
+    normalized ISBN, 'title_author' for similar titles by the same author listed under different
+    ISBNs), the group number and the source row.
+    """
+    report_columns = ['match_type', 'group', 'row', 'codigo_isbn', 'isbn_13', 'titulo', 'autor', 'similarity']
+    shown = [col for col in ['codigo_isbn', 'titulo', 'autor'] if col in df.columns]
+    isbn = normalize_isbn(df['codigo_isbn']) if 'codigo_isbn' in df.columns else pd.Series(pd.NA, index=df.index, dtype=TEXT_DTYPE)
+    parts = []
+
+    groups = exact_isbn_groups(isbn) if 'codigo_isbn' in df.columns else np.full(len(df), -1)
+    rows = np.flatnonzero(groups >= 0)
+    parts.append(pd.DataFrame({'match_type': 'isbn', 'group': groups[rows], 'row': df.index[rows],
+                               'isbn_13': isbn.to_numpy()[rows], **{col: df[col].to_numpy()[rows] for col in shown},
+                               'similarity': 1.0}))
+
+    if 'titulo' in df.columns and 'autor' in df.columns:
+        groups, similarity = similar_title_groups(df['titulo'], df['autor'], title_similarity)
+        rows = np.flatnonzero(groups >= 0)
+        similar = pd.DataFrame({'match_type': 'title_author', 'group': groups[rows], 'row': df.index[rows],
+                                'isbn_13': isbn.to_numpy()[rows], **{col: df[col].to_numpy()[rows] for col in shown},
+                                'similarity': similarity[rows]})
+        # Groups whose rows all share one ISBN are already in the exact report
+        by_group = similar.groupby('group')['isbn_13']
+        new_groups = (by_group.nunique() > 1) | similar['isbn_13'].isnull().groupby(similar['group']).any()
+        parts.append(similar[similar['group'].map(new_groups)])
+
+    report = pd.concat(parts, ignore_index=True).reindex(columns=report_columns)
+    return report.sort_values(['match_type', 'group', 'row'], kind='stable').reset_index(drop=True)
+
+def save_report(report, path):
+    # Reports are small tables: one file in the format of the extension, CSV by default.
+    if file_format(path) == 'parquet':
+        report.to_parquet(path, index=False)
+    elif file_format(path) == 'feather':
+        report.to_feather(path)
+    else:
+        report.to_csv(path, index=False)
+
+def report_duplicates(df, report_path=DEFAULT_DEDUP_REPORT, title_similarity=DEFAULT_TITLE_SIMILARITY):
+    """Finds the duplicate groups of df, prints how many there are and writes them to report_path."""
+    report = find_duplicates(df, title_similarity)
+    for match_type, description in [('isbn', "same ISBN (ISBN-10 and ISBN-13 forms compared as ISBN-13)"),
+                                    ('title_author', "similar title and same author, different ISBNs")]:
+        found = report[report['match_type'] == match_type]
+        print(f"Duplicate groups by {description}: {found['group'].nunique()} "
+              f"({len(found) - found['group'].nunique()} entries excluding first occurrences)")
+    try:
+        save_report(report, report_path)
+        print(f"Dedup report with {len(report)} rows saved to '{report_path}'.")
+    except (OSError, ImportError) as e:
+        print(f"Error saving the dedup report to '{report_path}': {e}")
+    return report
+
+def check_data_quality(df, report_path=DEFAULT_DEDUP_REPORT, title_similarity=DEFAULT_TITLE_SIMILARITY):
     print("\n--- Running Data Quality Checks ---")
     # Identify empty rows (all values are NaN)
     empty_rows = df.isnull().all(axis=1)
@@ -33,145 +342,375 @@ def check_data_quality(df):
         print("Indices of empty rows:")
         print(df[empty_rows].index.tolist())
 
-    # Identify duplicate rows based on 'codigo_isbn'
-    if 'codigo_isbn' in df.columns:
-        duplicates_isbn = df[df.duplicated(subset=['codigo_isbn'], keep=False)]
-        num_duplicate_isbn_entries = df.duplicated(subset=['codigo_isbn'], keep='first').sum()
-        print(f"Number of duplicate entries based on 'codigo_isbn' (excluding first occurrences): {num_duplicate_isbn_entries}")
-        if num_duplicate_isbn_entries > 0:
-            print("Duplicate rows (based on 'codigo_isbn', showing all occurrences of duplicates):")
-            print(duplicates_isbn.sort_values(by='codigo_isbn'))
-    else:
+    # Identify duplicate books (same normalized ISBN, or similar title by the same author)
+    if 'codigo_isbn' not in df.columns:
         print("Column 'codigo_isbn' not found, skipping duplicate check based on it.")
+    report_duplicates(df, report_path, title_similarity)
     print("--- Data Quality Checks Complete ---")
 
-def process_dates(df):
-    print("\n--- Processing 'fecha_publicacion' (Date Column) ---")
+def parse_dates(series):
+    """Dates in DATE_FORMAT (vectorized); only values in other formats go through the slower mixed parser."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series # Already parsed by the reader
+    dates = pd.to_datetime(series, errors='coerce', format=DATE_FORMAT)
+    other_format = dates.isnull() & series.notnull()
+    if other_format.any():
+        dates[other_format] = pd.to_datetime(series[other_format], errors='coerce', format='mixed')
+    return dates
+
+def process_dates(df, verbose=True):
+    if verbose: print("\n--- Processing 'fecha_publicacion' (Date Column) ---")
     if 'fecha_publicacion' in df.columns:
-        df['fecha_publicacion'] = pd.to_datetime(df['fecha_publicacion'], errors='coerce')
-        num_nat = df['fecha_publicacion'].isnull().sum()
-        print(f"Number of rows with unparseable dates (NaT) in 'fecha_publicacion': {num_nat}")
-        print(f"Data type of 'fecha_publicacion' after conversion: {df['fecha_publicacion'].dtype}")
-        if len(df) - num_nat > 0:
-            print("First 5 values of 'fecha_publicacion' after conversion:")
-            print(df['fecha_publicacion'].head())
-        else:
-            print("No valid dates found in 'fecha_publicacion' after conversion.")
-    else:
+        df['fecha_publicacion'] = parse_dates(df['fecha_publicacion'])
+        if verbose:
+            num_nat = df['fecha_publicacion'].isnull().sum()
+            print(f"Number of rows with unparseable dates (NaT) in 'fecha_publicacion': {num_nat}")
+            print(f"Data type of 'fecha_publicacion' after conversion: {df['fecha_publicacion'].dtype}")
+            if len(df) - num_nat > 0:
+                print("First 5 values of 'fecha_publicacion' after conversion:")
+                print(df['fecha_publicacion'].head())
+            else:
+                print("No valid dates found in 'fecha_publicacion' after conversion.")
+    elif verbose:
         print("Column 'fecha_publicacion' not found.")
-    print("--- Date Processing Complete ---")
+    if verbose: print("--- Date Processing Complete ---")
     return df
 
-def process_numeric_columns(df, args):
-    print("\n--- Processing Numeric Columns ---")
+# Decimal numbers as written in the dumps ('350', '12.5', '1e3'), with optional surrounding spaces.
+NUMBER_PATTERN = r'^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$'
+
+def to_float(series):
+    """
+    Numeric values of a column as nullable Float64; anything that is not a number ('N/D', 'consultar')
+    becomes <NA>, like pd.to_numeric(errors='coerce'). Arrow strings are converted with pyarrow compute
+    kernels, several times faster than to_numeric on them.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype('Float64')
+    if series.dtype != 'string[pyarrow]':
+        return pd.to_numeric(series, errors='coerce').astype('Float64')
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    values = pa.array(series.array)
+    numbers = pc.if_else(pc.match_substring_regex(values, NUMBER_PATTERN), pc.utf8_trim_whitespace(values), None)
+    return pd.Series(pc.cast(numbers, pa.float64()).to_numpy(zero_copy_only=False),
+                     index=series.index, name=series.name).astype('Float64')
+
+class ExchangeRates:
+    """
+    Dated exchange rates from a local table (see exchange_rates.csv): one row per date and currency with
+    the units of that currency per EUR, valid until the next date of the same currency. Each price is
+    converted with the rate in force on its 'fecha_publicacion', looked up for all rows at once with
+    pd.merge_asof. The table is loaded once per process (see get_exchange_rates).
+    """
+
+    def __init__(self, path=DEFAULT_EXCHANGE_RATES):
+        with open(path, 'rb') as f:
+            content = f.read()
+        self.path = path
+        self.fingerprint = hashlib.sha256(content).hexdigest()
+        table = pd.read_csv(io.BytesIO(content), comment='#', skipinitialspace=True)
+        missing = {'date', 'currency', 'per_eur'} - set(table.columns)
+        if missing:
+            raise ValueError(f"Exchange rate table '{path}' is missing the columns: {', '.join(sorted(missing))}")
+        table = pd.DataFrame({
+            'date': pd.to_datetime(table['date'], errors='coerce', format=DATE_FORMAT).astype('datetime64[ns]'),
+            'currency': table['currency'].astype(str).str.strip().str.upper().to_numpy(dtype=object),
+            'per_eur': pd.to_numeric(table['per_eur'], errors='coerce'),
+        }).dropna()
+        self.table = table[table['per_eur'] > 0].sort_values('date', kind='stable').reset_index(drop=True)
+        # For prices without a date: the latest rate of each currency, like the former fixed rate.
+        self.latest = self.table.groupby('currency')['per_eur'].last()
+        self.latest['EUR'] = 1.0
+        self.currencies = set(self.latest.index)
+
+    def per_eur(self, dates, currency):
+        """
+        Units of currency per EUR for each row: the rate in force on its date, the earliest rate for dates
+        before the table starts and the latest rate for rows without a date. `currency` is a currency code
+        or a Series with one per row; unknown currencies get NaN.
+        """
+        dates = parse_dates(dates)
+        left = pd.DataFrame({'date': dates.to_numpy(dtype='datetime64[ns]'), 'row': np.arange(len(dates))})
+        table = self.table
+        by = None
+        if isinstance(currency, pd.Series):
+            left['currency'] = currency.astype(TEXT_DTYPE).str.strip().str.upper().fillna('').to_numpy(dtype=object)
+            table = pd.concat([table, self._euro_rows(left['currency'])], ignore_index=True).sort_values('date', kind='stable')
+            by = 'currency'
+        else:
+            currency = currency.upper()
+            table = self._euro_rows(pd.Series([currency])) if currency == 'EUR' else table[table['currency'] == currency]
+
+        rates = np.full(len(left), np.nan)
+        dated = left[left['date'].notnull()].sort_values('date', kind='stable')
+        for direction in ('backward', 'forward'): # Forward: dates before the first rate of their currency
+            if dated.empty or table.empty:
+                break
+            merged = pd.merge_asof(dated, table.drop(columns=[] if by else ['currency']), on='date', by=by,
+                                   direction=direction)
+            found = merged['per_eur'].notnull().to_numpy()
+            rates[merged['row'].to_numpy()[found]] = merged['per_eur'].to_numpy()[found]
+            dated = dated[~found]
+
+        undated = left['date'].isnull().to_numpy()
+        if undated.any():
+            if by:
+                rates[undated] = left.loc[undated, 'currency'].map(self.latest).to_numpy(dtype='float64')
+            else:
+                rates[undated] = self.latest.get(currency, np.nan)
+        return rates
+
+    def _euro_rows(self, currencies):
+        # EUR prices need no table entry: rate 1 since any date.
+        if not (currencies == 'EUR').any():
+            return self.table.iloc[:0]
+        return pd.DataFrame({'date': pd.to_datetime(['1900-01-01']).astype('datetime64[ns]'),
+                             'currency': np.array(['EUR'], dtype=object), 'per_eur': [1.0]})
+
+@lru_cache(maxsize=None)
+def get_exchange_rates(path=DEFAULT_EXCHANGE_RATES):
+    # One per process (and per worker process), shared by every chunk.
+    return ExchangeRates(path)
+
+def exchange_rates_for(args):
+    return get_exchange_rates(getattr(args, 'exchange_rates', DEFAULT_EXCHANGE_RATES))
+
+def convert_prices(df, args):
+    """
+    'precio_eur' from 'precio' with the dated exchange rates. The price currency is the 'moneda' column
+    when the data has one, otherwise --price_currency. Returns df and the rate of each row.
+    """
+    rates = exchange_rates_for(args)
+    if 'fecha_publicacion' in df.columns:
+        dates = df['fecha_publicacion']
+    else:
+        dates = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    currency = df[CURRENCY_COLUMN] if CURRENCY_COLUMN in df.columns else getattr(args, 'price_currency', DEFAULT_PRICE_CURRENCY)
+    per_eur = rates.per_eur(dates, currency)
+    df['precio_eur'] = (df['precio'] / pd.array(per_eur, dtype='Float64')).round(2)
+    return df, per_eur
+
+def process_numeric_columns(df, args, verbose=True):
+    # verbose=False skips the per-stage reports (describe, outlier listings); the chunked mode
+    # reports the merged statistics of the whole file instead (see StreamSummary).
+    if verbose: print("\n--- Processing Numeric Columns ---")
     # --- Validating and Imputing 'nro_paginas' ---
     if 'nro_paginas' in df.columns:
-        print("Processing 'nro_paginas':")
         original_nans_nro_paginas = df['nro_paginas'].isnull().sum()
-        df['nro_paginas'] = pd.to_numeric(df['nro_paginas'], errors='coerce')
-        coerced_nans_nro_paginas = df['nro_paginas'].isnull().sum() - original_nans_nro_paginas
-        print(f"  Number of rows with non-numeric 'nro_paginas' (coerced to NaN): {coerced_nans_nro_paginas}")
-        print(f"  Total NaN values in 'nro_paginas' after coercion: {df['nro_paginas'].isnull().sum()}")
-        print(f"  Data type of 'nro_paginas' after coercion: {df['nro_paginas'].dtype}")
-        print("  Descriptive statistics for 'nro_paginas' before imputation:")
-        print(df['nro_paginas'].describe())
+        # Always nullable Float64, so every chunk of the chunked mode gets the same type.
+        df['nro_paginas'] = to_float(df['nro_paginas'])
+        if verbose:
+            print("Processing 'nro_paginas':")
+            coerced_nans_nro_paginas = df['nro_paginas'].isnull().sum() - original_nans_nro_paginas
+            print(f"  Number of rows with non-numeric 'nro_paginas' (coerced to NaN): {coerced_nans_nro_paginas}")
+            print(f"  Total NaN values in 'nro_paginas' after coercion: {df['nro_paginas'].isnull().sum()}")
+            print(f"  Data type of 'nro_paginas' after coercion: {df['nro_paginas'].dtype}")
+            print("  Descriptive statistics for 'nro_paginas' before imputation:")
+            print(df['nro_paginas'].describe())
 
         if args.run_data_imputation or args.run_all_processing: # Specific check for imputation part
             nan_count_before_imputation = df['nro_paginas'].isnull().sum()
             if nan_count_before_imputation > 0:
-                df['nro_paginas'].fillna(0, inplace=True)
-                print(f"  Imputed {nan_count_before_imputation} NaN values in 'nro_paginas' with 0.")
-                print("  Descriptive statistics for 'nro_paginas' after imputation:")
-                print(df['nro_paginas'].describe())
-            else:
+                df['nro_paginas'] = df['nro_paginas'].fillna(0)
+                if verbose:
+                    print(f"  Imputed {nan_count_before_imputation} NaN values in 'nro_paginas' with 0.")
+                    print("  Descriptive statistics for 'nro_paginas' after imputation:")
+                    print(df['nro_paginas'].describe())
+            elif verbose:
                 print("  No NaN values to impute in 'nro_paginas'.")
 
-        print("  Potential outliers in 'nro_paginas' (e.g., 1 page or 0 page books post-imputation):")
-        one_page_books = df[df['nro_paginas'] == 1]
-        zero_page_books = df[df['nro_paginas'] == 0]
-        print(f"  Number of books with 1 page: {len(one_page_books)}")
-        if not one_page_books.empty: print(one_page_books.head())
-        print(f"  Number of books with 0 pages (often due to imputation): {len(zero_page_books)}")
-        if not zero_page_books.empty and len(zero_page_books) < 10: print(zero_page_books.head())
+        if verbose:
+            print("  Potential outliers in 'nro_paginas' (e.g., 1 page or 0 page books post-imputation):")
+            one_page_books = df[df['nro_paginas'] == 1]
+            zero_page_books = df[df['nro_paginas'] == 0]
+            print(f"  Number of books with 1 page: {len(one_page_books)}")
+            if not one_page_books.empty: print(one_page_books.head())
+            print(f"  Number of books with 0 pages (often due to imputation): {len(zero_page_books)}")
+            if not zero_page_books.empty and len(zero_page_books) < 10: print(zero_page_books.head())
 
 
-    else:
+    elif verbose:
         print("Column 'nro_paginas' not found.")
 
     # --- Validating 'precio' ---
     if 'precio' in df.columns:
-        print("\nProcessing 'precio':")
         original_nans_precio = df['precio'].isnull().sum()
-        df['precio'] = pd.to_numeric(df['precio'], errors='coerce')
-        coerced_nans_precio = df['precio'].isnull().sum() - original_nans_precio
-        print(f"  Number of rows with non-numeric 'precio' (coerced to NaN): {coerced_nans_precio}")
-        print(f"  Total NaN values in 'precio' after coercion: {df['precio'].isnull().sum()}")
-        print(f"  Data type of 'precio' after coercion: {df['precio'].dtype}")
-        print("  Descriptive statistics for 'precio':")
-        print(df['precio'].describe())
-
-        print("  Potential outliers in 'precio' (max price books):")
-        max_price_val = df['precio'].max()
-        if pd.notna(max_price_val):
-            max_price_books = df[df['precio'] == max_price_val]
-            if not max_price_books.empty:
-                print(max_price_books)
+        df['precio'] = to_float(df['precio'])
+        if verbose:
+            print("\nProcessing 'precio':")
+            coerced_nans_precio = df['precio'].isnull().sum() - original_nans_precio
+            print(f"  Number of rows with non-numeric 'precio' (coerced to NaN): {coerced_nans_precio}")
+            print(f"  Total NaN values in 'precio' after coercion: {df['precio'].isnull().sum()}")
+            print(f"  Data type of 'precio' after coercion: {df['precio'].dtype}")
+            print("  Descriptive statistics for 'precio':")
+            print(df['precio'].describe())
+
+            print("  Potential outliers in 'precio' (max price books):")
+            max_price_val = df['precio'].max()
+            if pd.notna(max_price_val):
+                max_price_books = df[df['precio'] == max_price_val]
+                if not max_price_books.empty:
+                    print(max_price_books)
+                else:
+                    print("  No books found at the maximum price (this is unexpected if max price was calculated).")
             else:
-                print("  No books found at the maximum price (this is unexpected if max price was calculated).")
-        else:
-            print("  Cannot determine maximum price as 'precio' column might be all NaN or empty.")
-    else:
+                print("  Cannot determine maximum price as 'precio' column might be all NaN or empty.")
+    elif verbose:
         print("Column 'precio' not found.")
 
-    # --- Currency Conversion for 'precio' (ARS to EUR) ---
+    # --- Currency Conversion for 'precio' (to EUR, with the rate of each row's date) ---
     if (args.run_price_conversion or args.run_all_processing) and 'precio' in df.columns:
-        print("\n--- Currency Conversion 'precio' ARS to EUR ---")
-        ars_to_eur_rate = 1340  # 1 EUR = 1340 ARS
-        df['precio_eur'] = (df['precio'] / ars_to_eur_rate).round(2)
-        print(f"Converted 'precio' to 'precio_eur' using rate: 1 EUR = {ars_to_eur_rate} ARS.")
-        print("First 5 rows with ARS and EUR prices:")
-        columns_for_price_display = ['precio', 'precio_eur']
-        if 'titulo' in df.columns:
-            columns_for_price_display.insert(0, 'titulo')
-        print(df[columns_for_price_display].head())
-
-        print("\nDescriptive statistics for 'precio_eur':")
-        print(df['precio_eur'].describe())
-    elif 'precio' not in df.columns and (args.run_price_conversion or args.run_all_processing) :
+        df, per_eur = convert_prices(df, args)
+        if verbose:
+            print("\n--- Currency Conversion 'precio' to EUR ---")
+            print(f"Converted 'precio' to 'precio_eur' using the rate of each 'fecha_publicacion' "
+                  f"in '{exchange_rates_for(args).path}'.")
+            known = per_eur[~np.isnan(per_eur)]
+            if len(known):
+                print(f"  Rates used: from {known.min():.2f} to {known.max():.2f} per EUR.")
+            no_rate = int((np.isnan(per_eur) & df['precio'].notnull().to_numpy()).sum())
+            if no_rate:
+                print(f"  {no_rate} prices have no rate for their currency and were left as NaN.")
+            print("First 5 rows with original and EUR prices:")
+            columns_for_price_display = ['precio', 'precio_eur']
+            if 'titulo' in df.columns:
+                columns_for_price_display.insert(0, 'titulo')
+            print(df[columns_for_price_display].head())
+
+            print("\nDescriptive statistics for 'precio_eur':")
+            print(df['precio_eur'].describe())
+    elif 'precio' not in df.columns and (args.run_price_conversion or args.run_all_processing) and verbose:
          print("Column 'precio' not found, skipping currency conversion.")
-    print("--- Numeric Column Processing Complete ---")
+    if verbose: print("--- Numeric Column Processing Complete ---")
     return df
 
-def perform_text_cleaning(df):
-    print("\n--- Performing Text Column Cleaning ---")
-    text_columns_to_clean = [
-        'titulo', 'autor', 'editorial', 'idioma',
-        'encuadernacion', 'categoria', 'genero', 'subgenero'
-    ]
-    actual_text_columns_to_clean = [col for col in text_columns_to_clean if col in df.columns]
-    print(f"Identified text columns for cleaning: {actual_text_columns_to_clean}")
+def map_categories(series, function):
+    """
+    Applies `function` (Index of strings -> Index of strings) to the categories of a category column,
+    merging those that become equal. Costs O(distinct values) instead of O(rows). Missing values become ''.
+    """
+    mapped = function(series.cat.categories.astype(TEXT_DTYPE))
+    categories = pd.Index(mapped.unique())
+    codes = series.cat.codes.to_numpy()
+    missing = (codes < 0).any()
+    if missing and '' not in categories:
+        categories = categories.append(pd.Index([''], dtype=categories.dtype))
+    # Old code -> new code; the extra last element is where code -1 (missing) lands.
+    remap = np.append(categories.get_indexer(mapped), categories.get_loc('') if missing else -1)
+    return pd.Series(pd.Categorical.from_codes(remap[codes], categories=categories),
+                     index=series.index, name=series.name)
+
+class TextNormalizer:
+    """
+    Table-driven text normalization, with the rules in a JSON mapping file (see text_normalization.json):
+    strip + lower (+ collapsed whitespace) for every column, then per column accent removal, whole-word
+    abbreviations ("cs." -> "ciencias") and whole-value synonyms.
+
+    Rules are applied to the distinct values of a column with vectorized string operations and mapped
+    back to the rows, so the cost is O(distinct values). Results for category columns are memoized (their
+    values repeat across chunks and runs) and saved to `cache_path`, which later runs reuse as long as the
+    mapping file does not change.
+    """
+
+    def __init__(self, mapping_path=DEFAULT_TEXT_MAPPING, cache_path=None):
+        with open(mapping_path, 'rb') as f:
+            content = f.read()
+        mapping = json.loads(content)
+        self.mapping_path = mapping_path
+        self.fingerprint = hashlib.sha256(content).hexdigest()
+        self.collapse_whitespace = mapping.get('collapse_whitespace', True)
+        self.strip_accents = set(mapping.get('strip_accents', []))
+        self.abbreviations = {col: {key.lower(): value for key, value in table.items()}
+                              for col, table in mapping.get('abbreviations', {}).items() if table}
+        # One regex per column for all its abbreviations; a match must be a whole whitespace-separated word.
+        self.abbreviation_patterns = {
+            col: r'(?<!\S)(' + '|'.join(re.escape(key) for key in sorted(table, key=len, reverse=True)) + r')(?!\S)'
+            for col, table in self.abbreviations.items()
+        }
+        self.synonyms = {col: table for col, table in mapping.get('synonyms', {}).items() if table}
+        self.cache_path = cache_path
+        self.memo = self._load_cache()
+        self._memo_changed = False
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return cache.get('values', {}) if cache.get('mapping') == self.fingerprint else {}
+
+    def save_cache(self):
+        if not self.cache_path or not self._memo_changed:
+            return
+        temporary = f"{self.cache_path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({'mapping': self.fingerprint, 'values': self.memo}, f, ensure_ascii=False)
+        os.replace(temporary, self.cache_path) # Atomic: a concurrent run never reads a half-written cache
+        self._memo_changed = False
+
+    def rule_count(self):
+        return (sum(len(table) for table in self.abbreviations.values())
+                + sum(len(table) for table in self.synonyms.values()))
+
+    def normalize(self, column, values):
+        """Normalized version of `values` (Index of distinct strings), in the same order."""
+        values = values.str.strip().str.lower()
+        if self.collapse_whitespace:
+            values = values.str.replace(r'\s+', ' ', regex=True)
+        if column in self.strip_accents:
+            values = values.str.normalize('NFKD').str.replace(r'[\u0300-\u036f]', '', regex=True)
+        if column in self.abbreviations:
+            table = self.abbreviations[column]
+            values = values.str.replace(self.abbreviation_patterns[column], lambda m: table[m.group(1)], regex=True)
+        if column in self.synonyms:
+            values = pd.Index(values.map(lambda value: self.synonyms[column].get(value, value)), dtype=values.dtype)
+        return values
+
+    def normalize_memoized(self, column, values):
+        memo = self.memo.setdefault(column, {})
+        new_values = [value for value in values if value not in memo]
+        if new_values:
+            memo.update(zip(new_values, self.normalize(column, pd.Index(new_values, dtype=TEXT_DTYPE))))
+            self._memo_changed = True
+        return pd.Index([memo[value] for value in values], dtype=TEXT_DTYPE)
+
+    def normalize_series(self, series):
+        """Normalizes a text column; missing values become ''."""
+        column = series.name
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Only the categories are normalized; the rows keep their integer codes.
+            return map_categories(series, lambda values: self.normalize_memoized(column, values))
+        codes, uniques = pd.factorize(series.astype(TEXT_DTYPE).fillna(''))
+        normalized = self.normalize(column, pd.Index(uniques, dtype=TEXT_DTYPE))
+        return pd.Series(normalized.take(codes), index=series.index, name=column)
+
+@lru_cache(maxsize=None)
+def get_text_normalizer(mapping_path=DEFAULT_TEXT_MAPPING, cache_path=None):
+    # One per process (and per worker process), shared by every chunk.
+    return TextNormalizer(mapping_path, cache_path)
+
+def text_normalizer_for(args):
+    return get_text_normalizer(getattr(args, 'text_mapping', DEFAULT_TEXT_MAPPING), getattr(args, 'text_cache', None))
+
+def perform_text_cleaning(df, verbose=True, normalizer=None):
+    if verbose: print("\n--- Performing Text Column Cleaning ---")
+    normalizer = normalizer or get_text_normalizer()
+    actual_text_columns_to_clean = [col for col in TEXT_COLUMNS if col in df.columns]
+    if verbose: print(f"Identified text columns for cleaning: {actual_text_columns_to_clean}")
 
     for col in actual_text_columns_to_clean:
-        df[col] = df[col].astype(str).fillna('')
-        if pd.api.types.is_string_dtype(df[col]) or df[col].dtype == 'object':
-            df[col] = df[col].str.strip()
-            df[col] = df[col].str.lower()
-            # print(f"Applied basic cleaning (strip, lower) to column: '{col}'") # Verbose
-    print("Basic cleaning (strip, lower, astype str) applied to identified text columns.")
-
-    # Specific value replacements
-    print("\nApplying Specific Value Replacements...")
-    if 'categoria' in df.columns:
-        df['categoria'] = df['categoria'].replace('negocios y cs. economicas', 'negocios y ciencias economicas')
-        print("  Standardized 'negocios y cs. economicas' to 'negocios y ciencias economicas' in 'categoria'.")
-    if 'genero' in df.columns:
-        df['genero'] = df['genero'].replace('dep. extremos', 'deportes extremos')
-        print("  Standardized 'dep. extremos' to 'deportes extremos' in 'genero'.")
-    print("Specific Value Replacements Complete.")
+        df[col] = normalizer.normalize_series(df[col])
+    if not verbose:
+        return df
+    print(f"Normalization (strip, lower, {normalizer.rule_count()} abbreviation/synonym rules from "
+          f"'{normalizer.mapping_path}') applied to identified text columns.")
 
     print("\nInspecting Unique Values in Key Categorical Columns After Cleaning...")
-    key_categorical_columns = ['idioma', 'encuadernacion', 'categoria', 'genero']
-    for col in key_categorical_columns:
+    for col in KEY_CATEGORICAL_COLUMNS:
         if col in df.columns:
             unique_values = df[col].unique()
             print(f"  Unique values in '{col}' (sample of up to 10):")
@@ -185,6 +724,312 @@ def perform_text_cleaning(df):
     print("--- Text Column Cleaning and Inspection Complete ---")
     return df
 
+# --- Outlier detection ---
+# Flags prices and page counts that are unusual within their group of books (by default each
+# categoria/genero pair): outside the IQR fences, with a robust z-score (from the MAD) above 3.5, or with
+# a z-score above 3. The statistics of each group are kept as sums and a histogram (OutlierStatistics),
+# which can be built one chunk at a time and merged, so the chunked and parallel modes flag the same rows
+# as a full run. Quantiles (quartiles, median, MAD) are read from log-spaced histogram bins: within ~0.5%
+# of the exact value, and the memory used depends on the number of groups, not of rows.
+
+OUTLIER_COLUMN = 'outlier'
+DEFAULT_OUTLIER_GROUPS = ['categoria', 'genero']
+OUTLIER_METHODS = ['iqr', 'mad', 'zscore']
+IQR_FACTOR = 1.5
+MAD_THRESHOLD = 3.5 # Iglewicz and Hoaglin's cut-off for the modified z-score
+ZSCORE_THRESHOLD = 3.0
+MIN_GROUP_SIZE = 20 # Smaller groups are compared with the statistics of all rows instead
+ALL_ROWS = '(all)' # Group key of the statistics of all rows
+# Histogram bins: HISTOGRAM_BINS_PER_UNIT per unit of sign(x) * log1p(|x| / HISTOGRAM_RESOLUTION), so bins
+# are ~1% wide from 0.1 (e.g. a price per page) up to ~1e9; larger values share the last bin.
+HISTOGRAM_BINS_PER_UNIT = 100
+HISTOGRAM_RESOLUTION = 0.001
+HISTOGRAM_MAX_BIN = 28 * HISTOGRAM_BINS_PER_UNIT
+
+def price_column(df):
+    """The EUR price, or 'precio' if it was not converted."""
+    return 'precio_eur' if 'precio_eur' in df.columns else 'precio'
+
+def outlier_value_columns(df):
+    """Numeric columns checked for outliers: the price (see price_column) and the page count."""
+    return [col for col in [price_column(df), 'nro_paginas']
+            if col in df.columns and pd.api.types.is_numeric_dtype(df[col])]
+
+def group_keys(df, groups):
+    # Group values as text, missing values as '' (like the cleaned category columns); category columns
+    # stay categorical, so grouping them costs O(categories) string work instead of O(rows).
+    keys = {}
+    for col in groups:
+        if col not in df.columns:
+            keys[col] = ''
+        elif isinstance(df[col].dtype, pd.CategoricalDtype):
+            keys[col] = map_categories(df[col], lambda categories: categories)
+        else:
+            keys[col] = df[col].astype(TEXT_DTYPE).fillna('')
+    return pd.DataFrame(keys, index=df.index)
+
+def histogram_bins(values):
+    scaled = np.sign(values) * np.log1p(np.abs(values) / HISTOGRAM_RESOLUTION) * HISTOGRAM_BINS_PER_UNIT
+    return np.clip(np.rint(scaled), -HISTOGRAM_MAX_BIN, HISTOGRAM_MAX_BIN).astype(np.int64)
+
+def histogram_values(bins):
+    return np.sign(bins) * np.expm1(np.abs(bins) / HISTOGRAM_BINS_PER_UNIT) * HISTOGRAM_RESOLUTION
+
+def grouped_weighted_quantile(data, groups, q):
+    """Per group of data[groups], the smallest 'value' whose cumulative 'weight' reaches the fraction q."""
+    data = data.sort_values(groups + ['value'], kind='stable')
+    by_group = data.groupby(groups, sort=False)['weight']
+    reached = data[by_group.cumsum() >= q * by_group.transform('sum')]
+    return reached.groupby(groups, sort=False)['value'].first()
+
+def histogram_quantiles(histogram, groups, quantiles):
+    """
+    DataFrame indexed by group with the quantiles {name: fraction} of a grouped histogram (Series of
+    counts indexed by (group..., 'bins'), as built by OutlierStatistics and PriceModelStatistics).
+    """
+    data = histogram.rename('weight').reset_index()
+    data['value'] = histogram_values(data['bins'].to_numpy())
+    return pd.DataFrame({name: grouped_weighted_quantile(data, groups, q) for name, q in quantiles.items()})
+
+class OutlierStatistics:
+    """Per group and column: count, sum, sum of squares and histogram of the values, mergeable across chunks."""
+
+    def __init__(self, groups=DEFAULT_OUTLIER_GROUPS):
+        self.groups = list(groups)
+        self.moments = {} # column -> DataFrame indexed by group: count, sum, sum_squares
+        self.histograms = {} # column -> Series of counts indexed by (group..., bin)
+
+    def update(self, df):
+        keys = group_keys(df, self.groups)
+        for col in outlier_value_columns(df):
+            values = df[col].to_numpy(dtype='float64', na_value=np.nan)
+            present = ~np.isnan(values)
+            data = keys[present].assign(value=values[present], bins=histogram_bins(values[present]))
+            data['square'] = data['value'] ** 2
+            moments = data.groupby(self.groups, observed=True).agg(count=('value', 'size'), sum=('value', 'sum'),
+                                                    sum_squares=('square', 'sum'))
+            histogram = data.groupby(self.groups + ['bins'], observed=True).size()
+            self._add(col, moments, histogram)
+        return self
+
+    def merge(self, other):
+        for col in other.moments:
+            self._add(col, other.moments[col], other.histograms[col])
+
+    def _add(self, col, moments, histogram):
+        if col in self.moments:
+            moments = self.moments[col].add(moments, fill_value=0)
+            histogram = self.histograms[col].add(histogram, fill_value=0)
+        self.moments[col] = moments
+        self.histograms[col] = histogram.astype('int64')
+
+    def thresholds(self):
+        """
+        Per column, a DataFrame indexed by group with the statistics the flags are computed from
+        (count, median, q1, q3, mad, mean, std). The group ALL_ROWS in every key holds those of all rows.
+        """
+        everything = {col: ALL_ROWS for col in self.groups}
+        result = {}
+        for col, moments in self.moments.items():
+            moments = moments.reset_index()
+            moments = pd.concat([moments, moments.assign(**everything)]).groupby(self.groups).sum()
+            data = self.histograms[col].rename('weight').reset_index()
+            data = pd.concat([data, data.assign(**everything)])
+            data = data.groupby(self.groups + ['bins'], as_index=False)['weight'].sum()
+            data['value'] = histogram_values(data['bins'].to_numpy())
+            stats = pd.DataFrame({
+                'median': grouped_weighted_quantile(data, self.groups, 0.5),
+                'q1': grouped_weighted_quantile(data, self.groups, 0.25),
+                'q3': grouped_weighted_quantile(data, self.groups, 0.75),
+            })
+            # MAD: median of the distances of the bin values to the group median
+            data['value'] = (data['value'] - data.join(stats['median'], on=self.groups)['median']).abs()
+            stats['mad'] = grouped_weighted_quantile(data, self.groups, 0.5)
+            stats = stats.join(moments)
+            stats['mean'] = stats['sum'] / stats['count']
+            variance = (stats['sum_squares'] - stats['count'] * stats['mean'] ** 2) / (stats['count'] - 1)
+            stats['std'] = np.sqrt(variance.clip(lower=0))
+            result[col] = stats[['count', 'median', 'q1', 'q3', 'mad', 'mean', 'std']]
+        return result
+
+def outlier_labels(columns):
+    """Flag label of each bit mask: 'precio_eur_iqr,nro_paginas_zscore', '' for none."""
+    names = [f'{col}_{method}' for col in columns for method in OUTLIER_METHODS]
+    return [','.join(name for bit, name in enumerate(names) if mask >> bit & 1) for mask in range(2 ** len(names))]
+
+def flag_outliers(df, thresholds, groups=DEFAULT_OUTLIER_GROUPS):
+    """Adds the OUTLIER_COLUMN category column: the column_method pairs for which each row is an outlier."""
+    columns = [col for col in thresholds if col in df.columns]
+    mask = np.zeros(len(df), dtype=np.int64)
+    keys = group_keys(df, groups)
+    row_groups = pd.MultiIndex.from_frame(keys) if len(groups) > 1 else pd.Index(keys[groups[0]])
+    for c, col in enumerate(columns):
+        stats = thresholds[col]
+        overall = stats.loc[[(ALL_ROWS,) * len(groups) if len(groups) > 1 else ALL_ROWS]]
+        stats = stats[stats['count'] >= MIN_GROUP_SIZE]
+        positions = stats.index.get_indexer(row_groups)
+        table = np.vstack([stats.to_numpy(dtype='float64'), overall.to_numpy(dtype='float64')])
+        row_stats = pd.DataFrame(table[np.where(positions >= 0, positions, len(stats))], columns=stats.columns)
+        values = df[col].to_numpy(dtype='float64', na_value=np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'): # NaN values and zero spreads never flag
+            spread = row_stats['q3'] - row_stats['q1']
+            iqr = (values < row_stats['q1'] - IQR_FACTOR * spread) | (values > row_stats['q3'] + IQR_FACTOR * spread)
+            mad = np.abs(0.6745 * (values - row_stats['median']) / row_stats['mad']) > MAD_THRESHOLD
+            zscore = np.abs((values - row_stats['mean']) / row_stats['std']) > ZSCORE_THRESHOLD
+        for m, flags in enumerate([iqr, mad, zscore]):
+            mask |= flags.to_numpy(dtype=bool).astype(np.int64) << (c * len(OUTLIER_METHODS) + m)
+    df[OUTLIER_COLUMN] = pd.Categorical.from_codes(mask, categories=outlier_labels(columns))
+    return df
+
+def print_outlier_report(flag_counts, rows):
+    """Rows flagged per column and method, from the value counts of OUTLIER_COLUMN."""
+    flagged = int(flag_counts[flag_counts.index != ''].sum())
+    print(f"Rows flagged as outliers in '{OUTLIER_COLUMN}': {flagged} of {rows}")
+    per_flag = {}
+    for label, count in flag_counts[flag_counts > 0].items():
+        for name in filter(None, str(label).split(',')):
+            per_flag[name] = per_flag.get(name, 0) + int(count)
+    for name, count in sorted(per_flag.items()):
+        print(f"  {name}: {count}")
+
+def detect_outliers(df, groups=DEFAULT_OUTLIER_GROUPS, verbose=True):
+    """Outlier stage on a DataFrame in memory: group statistics of df, then the flags."""
+    if verbose: print(f"\n--- Detecting Outliers by {'/'.join(groups)} ---")
+    if not outlier_value_columns(df):
+        if verbose: print("No numeric 'precio_eur', 'precio' or 'nro_paginas' column: run the type conversions first.")
+        return df
+    df = flag_outliers(df, OutlierStatistics(groups).update(df).thresholds(), groups)
+    if verbose:
+        print_outlier_report(df[OUTLIER_COLUMN].value_counts(), len(df))
+        print("--- Outlier Detection Complete ---")
+    return df
+
+# --- Price model ---
+# A compact price summary for readers who do not need the rows: for every value of editorial, categoria
+# and idioma (and for all books), the price quantiles, the median price per page and a least-squares fit
+# of the price on the page count, price = intercept + slope * pages. Like the outlier stage it is built
+# from grouped sums and histograms (PriceModelStatistics) that are merged across chunks and partitions,
+# so every mode writes the same table; the quantiles are read from the histograms (within ~0.5%).
+
+PRICE_PER_PAGE_COLUMN = 'precio_por_pagina'
+PRICE_SUMMARY_DIMENSIONS = ['editorial', 'categoria', 'idioma']
+DEFAULT_PRICE_SUMMARY = 'price_summary.csv'
+PRICE_QUANTILES = {'price_q10': 0.1, 'price_q25': 0.25, 'price_median': 0.5, 'price_q75': 0.75, 'price_q90': 0.9}
+MIN_REGRESSION_SIZE = 10 # Books with price and pages needed to report a fit
+REGRESSION_SUMS = ['fitted', 'x', 'y', 'xx', 'xy', 'yy'] # x: pages, y: price, over the books with both
+PRICE_SUMMARY_COLUMNS = ['dimension', 'value', 'books', 'priced', *PRICE_QUANTILES, 'price_per_page_median',
+                         'fitted', 'slope', 'intercept', 'r2']
+
+def add_price_per_page(df):
+    """Adds PRICE_PER_PAGE_COLUMN (price / nro_paginas, <NA> without pages) when both columns are numeric."""
+    price = price_column(df)
+    if not all(col in df.columns and pd.api.types.is_numeric_dtype(df[col]) for col in [price, 'nro_paginas']):
+        return df
+    pages = df['nro_paginas'].astype('Float64')
+    df[PRICE_PER_PAGE_COLUMN] = (df[price].astype('Float64') / pages.where(pages > 0)).round(4)
+    return df
+
+class PriceModelStatistics:
+    """Per dimension value: book counts, regression sums and histograms of the price and the price per page."""
+
+    def __init__(self, dimensions=PRICE_SUMMARY_DIMENSIONS):
+        self.dimensions = list(dimensions)
+        self.sums = {} # dimension -> DataFrame indexed by group (dimension value): books, priced and REGRESSION_SUMS
+        self.histograms = {} # (dimension, 'price' or 'price_per_page') -> Series of counts indexed by (group, bins)
+
+    def update(self, df):
+        if PRICE_PER_PAGE_COLUMN not in df.columns:
+            return self
+        price = df[price_column(df)].to_numpy(dtype='float64', na_value=np.nan)
+        pages = df['nro_paginas'].to_numpy(dtype='float64', na_value=np.nan)
+        per_page = df[PRICE_PER_PAGE_COLUMN].to_numpy(dtype='float64', na_value=np.nan)
+        priced = ~np.isnan(price)
+        fitted = priced & (pages > 0)
+        x = np.where(fitted, pages, 0.0)
+        y = np.where(fitted, price, 0.0)
+        values = pd.DataFrame({'priced': priced, 'fitted': fitted, 'x': x, 'y': y,
+                               'xx': x * x, 'xy': x * y, 'yy': y * y}, index=df.index)
+        keys = group_keys(df, self.dimensions).assign(**{ALL_ROWS: ALL_ROWS})
+        for dimension in self.dimensions + [ALL_ROWS]:
+            group = keys[dimension].rename('group')
+            sums = values.groupby(group, observed=True).agg(
+                books=('priced', 'size'), priced=('priced', 'sum'), **{name: (name, 'sum') for name in REGRESSION_SUMS})
+            histograms = {}
+            for name, data in [('price', price), ('price_per_page', per_page)]:
+                present = ~np.isnan(data)
+                bins = pd.DataFrame({'group': group[present], 'bins': histogram_bins(data[present])})
+                histograms[name] = bins.groupby(['group', 'bins'], observed=True).size()
+            self._add(dimension, sums, histograms)
+        return self
+
+    def merge(self, other):
+        for dimension in other.sums:
+            self._add(dimension, other.sums[dimension],
+                      {name: histogram for (d, name), histogram in other.histograms.items() if d == dimension})
+
+    def _add(self, dimension, sums, histograms):
+        if dimension in self.sums:
+            sums = self.sums[dimension].add(sums, fill_value=0)
+            histograms = {name: self.histograms[dimension, name].add(histogram, fill_value=0)
+                          for name, histogram in histograms.items()}
+        self.sums[dimension] = sums
+        for name, histogram in histograms.items():
+            self.histograms[dimension, name] = histogram.astype('int64')
+
+    def summary(self):
+        """The summary table: one row per dimension value (PRICE_SUMMARY_COLUMNS), the ALL_ROWS row last."""
+        tables = []
+        for dimension, sums in self.sums.items():
+            n, x, y = sums['fitted'], sums['x'], sums['y']
+            with np.errstate(divide='ignore', invalid='ignore'):
+                sxx = sums['xx'] - x * x / n
+                sxy = sums['xy'] - x * y / n
+                syy = sums['yy'] - y * y / n
+                fit = (n >= MIN_REGRESSION_SIZE) & (sxx > 0) # Pages all equal: no slope
+                slope = (sxy / sxx).where(fit)
+                table = pd.DataFrame({
+                    'books': sums['books'], 'priced': sums['priced'], 'fitted': n,
+                    'slope': slope, 'intercept': ((y - slope * x) / n).where(fit),
+                    'r2': (sxy * sxy / (sxx * syy)).where(fit & (syy > 0)).clip(upper=1),
+                })
+            table = table.join(histogram_quantiles(self.histograms[dimension, 'price'], ['group'], PRICE_QUANTILES))
+            table = table.join(histogram_quantiles(self.histograms[dimension, 'price_per_page'], ['group'],
+                                                   {'price_per_page_median': 0.5}))
+            table.index = table.index.astype(str)
+            tables.append(table.sort_index().rename_axis('value').reset_index().assign(dimension=dimension))
+        if not tables:
+            return pd.DataFrame(columns=PRICE_SUMMARY_COLUMNS)
+        summary = pd.concat(tables, ignore_index=True)[PRICE_SUMMARY_COLUMNS]
+        summary[['books', 'priced', 'fitted']] = summary[['books', 'priced', 'fitted']].astype('int64')
+        return summary.round({**{name: 2 for name in PRICE_QUANTILES}, 'price_per_page_median': 4,
+                              'slope': 4, 'intercept': 2, 'r2': 4})
+
+def report_price_model(statistics, summary_path=DEFAULT_PRICE_SUMMARY):
+    """Prints the overall and per-categoria rows of the price summary and writes it to summary_path."""
+    summary = statistics.summary()
+    if summary.empty:
+        print("No numeric price and 'nro_paginas' columns: run the type conversions first.")
+        return summary
+    shown = ['value', 'books', 'price_median', 'price_per_page_median', 'slope', 'intercept', 'r2']
+    print("Price model for all books and by 'categoria' (largest 10):")
+    overall = summary[summary['dimension'] == ALL_ROWS]
+    by_category = summary[summary['dimension'] == 'categoria'].nlargest(10, 'books')
+    print(pd.concat([overall, by_category])[shown].to_string(index=False))
+    try:
+        save_report(summary, summary_path)
+        print(f"Price summary with {len(summary)} rows saved to '{summary_path}'.")
+    except (OSError, ImportError) as e:
+        print(f"Error saving the price summary to '{summary_path}': {e}")
+    return summary
+
+def model_prices(df, summary_path=DEFAULT_PRICE_SUMMARY, verbose=True):
+    """Price model stage on a DataFrame in memory: adds PRICE_PER_PAGE_COLUMN and writes the price summary."""
+    if verbose: print(f"\n--- Modeling Prices by {'/'.join(PRICE_SUMMARY_DIMENSIONS)} ---")
+    df = add_price_per_page(df)
+    report_price_model(PriceModelStatistics().update(df), summary_path)
+    if verbose: print("--- Price Modeling Complete ---")
+    return df
+
 def generate_and_save_plots(df):
     print("\n--- Generating and Saving EDA Plots ---")
 
@@ -282,29 +1127,643 @@ def generate_and_save_plots(df):
 def save_data(df, output_filename):
     print(f"\n--- Saving Processed DataFrame to '{output_filename}' ---")
     try:
-        df.to_csv(output_filename, index=False)
+        output_format = file_format(output_filename)
+        if output_format == 'parquet':
+            apply_schema(df).to_parquet(output_filename, index=False)
+        elif output_format == 'feather':
+            apply_schema(df).reset_index(drop=True).to_feather(output_filename)
+        else:
+            df.to_csv(output_filename, index=False)
         print(f"Successfully saved cleaned data to '{output_filename}'")
     except Exception as e:
         print(f"Error saving cleaned data to '{output_filename}': {e}")
     print("--- Data Saving Complete ---")
 
+# --- Chunked (streaming) mode ---
+# With --chunksize the CSV is read and processed chunk by chunk, so memory stays bounded by the
+# chunk size instead of the file size. Statistics that need the whole file (duplicate ISBNs,
+# descriptive stats, value counts) are kept in accumulators that can be updated one chunk at a
+# time and merged with each other, and the cleaned rows are appended to the output as they are ready.
+
+class NumericAccumulator:
+    """count/mean/std/min/max of a numeric column, mergeable (Chan et al. parallel variance)."""
+
+    def __init__(self):
+        self.count = 0
+        self.missing = 0
+        self.mean = 0.0
+        self.m2 = 0.0 # Sum of squared deviations from the mean
+        self.min = np.nan
+        self.max = np.nan
+
+    def update(self, series):
+        values = pd.to_numeric(series, errors='coerce')
+        other = NumericAccumulator()
+        other.missing = int(values.isnull().sum())
+        values = values.dropna().to_numpy(dtype='float64')
+        if len(values):
+            other.count = len(values)
+            other.mean = float(values.mean())
+            other.m2 = float(((values - other.mean) ** 2).sum())
+            other.min = float(values.min())
+            other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other):
+        self.missing += other.missing
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2, self.min, self.max = other.count, other.mean, other.m2, other.min, other.max
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def describe(self):
+        # Like Series.describe(), without the quartiles, which cannot be merged exactly across chunks.
+        std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+        return pd.Series({'count': self.count, 'mean': self.mean if self.count else np.nan, 'std': std,
+                          'min': self.min, 'max': self.max, 'missing': self.missing})
+
+def _sorted_unique(values, kind=None):
+    """np.unique for 1-D arrays, via a plain sort (np.unique hashes first, which is slower for 64-bit hashes)."""
+    values = np.sort(values, kind=kind)
+    if len(values) < 2:
+        return values
+    keep = np.empty(len(values), dtype=bool)
+    keep[0] = True
+    np.not_equal(values[1:], values[:-1], out=keep[1:])
+    return values[keep]
+
+class DuplicateKeyAccumulator:
+    """Counts repeated values of a key column across chunks, keeping only a sorted array of 64-bit hashes."""
+
+    def __init__(self):
+        self.seen = np.empty(0, dtype='uint64')
+        self.duplicates = 0 # Repeated entries, excluding first occurrences (like duplicated(keep='first'))
+
+    def update(self, series):
+        # categorize=False: with mostly distinct keys, factorizing first costs more than it saves.
+        hashes = pd.util.hash_pandas_object(series, index=False, categorize=False).to_numpy()
+        unique = _sorted_unique(hashes)
+        self.duplicates += len(hashes) - len(unique)
+        other = DuplicateKeyAccumulator()
+        other.seen = unique
+        self.merge(other)
+
+    def merge(self, other):
+        # Keys present on both sides are duplicates of each other; add them once.
+        common = 0
+        if len(self.seen) and len(other.seen):
+            positions = np.searchsorted(self.seen, other.seen)
+            inside = positions < len(self.seen)
+            common = int((self.seen[positions[inside]] == other.seen[inside]).sum())
+        self.duplicates += other.duplicates + common
+        # Both arrays are sorted: a stable sort of the concatenation just merges the two runs.
+        self.seen = _sorted_unique(np.concatenate([self.seen, other.seen]), kind='stable')
+
+class ValueCountsAccumulator:
+    """value_counts() of a low-cardinality column, summed across chunks."""
+
+    def __init__(self):
+        self.counts = pd.Series(dtype='int64')
+
+    def update(self, series):
+        counts = series.value_counts(dropna=False)
+        counts = counts[counts > 0] # Category columns also list their unused categories
+        self.counts = self.counts.add(counts, fill_value=0).astype('int64')
+
+    def merge(self, other):
+        self.counts = self.counts.add(other.counts, fill_value=0).astype('int64')
+
+class StreamSummary:
+    """Quality checks and statistics of the whole file, built from per-chunk summaries."""
+
+    def __init__(self):
+        self.rows = 0
+        self.empty_rows = 0
+        self.unparseable_dates = 0
+        self.isbn = DuplicateKeyAccumulator()
+        self.numeric = {col: NumericAccumulator() for col in NUMERIC_SUMMARY_COLUMNS}
+        self.categories = {col: ValueCountsAccumulator() for col in KEY_CATEGORICAL_COLUMNS}
+        self.outliers = None # OutlierStatistics, when the chunks are not flagged yet
+        self.outlier_flags = ValueCountsAccumulator()
+        self.price_model = None # PriceModelStatistics, with --run_price_model
+
+    def update_quality(self, raw_chunk):
+        self.empty_rows += int(raw_chunk.isnull().all(axis=1).sum())
+        if 'codigo_isbn' in raw_chunk.columns:
+            self.isbn.update(normalize_isbn(raw_chunk['codigo_isbn']).dropna())
+
+    def update_values(self, chunk):
+        self.rows += len(chunk)
+        if 'fecha_publicacion' in chunk.columns and pd.api.types.is_datetime64_any_dtype(chunk['fecha_publicacion']):
+            self.unparseable_dates += int(chunk['fecha_publicacion'].isnull().sum())
+        for col, accumulator in self.numeric.items():
+            if col in chunk.columns:
+                accumulator.update(chunk[col])
+        for col, accumulator in self.categories.items():
+            if col in chunk.columns:
+                accumulator.update(chunk[col])
+        if OUTLIER_COLUMN in chunk.columns:
+            self.outlier_flags.update(chunk[OUTLIER_COLUMN])
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.empty_rows += other.empty_rows
+        self.unparseable_dates += other.unparseable_dates
+        self.isbn.merge(other.isbn)
+        for col, accumulator in self.numeric.items():
+            accumulator.merge(other.numeric[col])
+        for col, accumulator in self.categories.items():
+            accumulator.merge(other.categories[col])
+        if other.outliers is not None:
+            if self.outliers is None:
+                self.outliers = other.outliers
+            else:
+                self.outliers.merge(other.outliers)
+        self.outlier_flags.merge(other.outlier_flags)
+        if other.price_model is not None:
+            if self.price_model is None:
+                self.price_model = other.price_model
+            else:
+                self.price_model.merge(other.price_model)
+
+    def report(self, args):
+        print(f"\n--- Summary of {self.rows} rows ---")
+        if args.run_quality_checks or args.run_all_processing:
+            print(f"Number of empty rows (all values NaN): {self.empty_rows}")
+            print(f"Number of duplicate entries based on 'codigo_isbn' as ISBN-13 (excluding first occurrences): {self.isbn.duplicates}")
+        if args.run_type_conversions or args.run_all_processing:
+            print(f"Number of rows with unparseable dates (NaT) in 'fecha_publicacion': {self.unparseable_dates}")
+        for col, accumulator in self.numeric.items():
+            if accumulator.count or accumulator.missing:
+                print(f"Descriptive statistics for '{col}':")
+                print(accumulator.describe())
+        if args.run_text_cleaning or args.run_all_processing:
+            for col, accumulator in self.categories.items():
+                if len(accumulator.counts):
+                    print(f"Total unique values in '{col}': {len(accumulator.counts)}")
+                    print(accumulator.counts.nlargest(10))
+        if len(self.outlier_flags.counts):
+            print_outlier_report(self.outlier_flags.counts, self.rows)
+        print("--- Summary Complete ---")
+
+def iter_chunks(path, chunksize, columns=None):
+    """Yields DataFrames of up to `chunksize` rows from a CSV, Parquet or Feather file."""
+    input_format = file_format(path)
+    if input_format == 'csv':
+        yield from read_csv_typed(path, columns, chunksize)
+        return
+    import pyarrow as pa
+    if input_format == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+    # Feather (Arrow IPC): memory-mapped, so slicing only reads the pages each chunk touches.
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+        if columns:
+            table = table.select(columns)
+        for offset in range(0, table.num_rows, chunksize):
+            yield apply_schema(table.slice(offset, chunksize).to_pandas())
+
+def input_columns(path):
+    """Column names of a CSV, Parquet or Feather file, without reading its rows."""
+    input_format = file_format(path)
+    if input_format == 'csv':
+        return list(pd.read_csv(path, nrows=0).columns)
+    import pyarrow as pa
+    if input_format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema.names
+
+class ChunkWriter:
+    """Writes processed chunks to one CSV, Parquet or Feather file as they are produced."""
+
+    def __init__(self, path):
+        self.path = path
+        self.format = file_format(path)
+        self.schema = None
+        self._writer = None
+        self._first = True
+
+    def write(self, chunk):
+        if self.format == 'csv':
+            # The first chunk creates the file (with header), the rest are appended.
+            chunk.to_csv(self.path, mode='w' if self._first else 'a', header=self._first, index=False)
+        else:
+            self._write_arrow(apply_schema(chunk))
+        self._first = False
+
+    def _write_arrow(self, chunk):
+        import pyarrow as pa
+        if self.format == 'feather':
+            # The Arrow IPC file format cannot change a dictionary between batches, and each chunk has
+            # its own categories: store them as strings (load_data casts them back to category).
+            chunk = chunk.astype({col: 'string' for col in chunk.columns if chunk[col].dtype == 'category'})
+        if self.schema is None:
+            # The schema of the first chunk is fixed for the whole file; every chunk is converted to it.
+            schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+            for i, field in enumerate(schema):
+                if pa.types.is_dictionary(field.type):
+                    # Same index width in every chunk, whatever its number of categories.
+                    schema = schema.set(i, field.with_type(pa.dictionary(pa.int32(), field.type.value_type)))
+            self.schema = schema
+            if self.format == 'parquet':
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.path, self.schema)
+            else:
+                # lz4, like DataFrame.to_feather
+                self._writer = pa.ipc.new_file(self.path, self.schema, options=pa.ipc.IpcWriteOptions(compression='lz4'))
+        self._writer.write_table(pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+def process_chunk(chunk, args, outlier_thresholds=None):
+    """
+    Runs the selected processing steps on one chunk. Returns the processed chunk and its StreamSummary.
+    The outlier stage needs statistics of the whole data: without `outlier_thresholds` (from
+    OutlierStatistics.thresholds) the chunk's statistics are added to the summary; with them, the chunk
+    is flagged. The price model statistics of the chunk are added to the summary too.
+    """
+    summary = StreamSummary()
+    if args.run_quality_checks or args.run_all_processing:
+        summary.update_quality(chunk)
+    if args.run_type_conversions or args.run_all_processing:
+        chunk = process_dates(chunk, verbose=False)
+    if args.run_type_conversions or args.run_data_imputation or args.run_price_conversion or args.run_all_processing:
+        chunk = process_numeric_columns(chunk, args, verbose=False)
+    if args.run_text_cleaning or args.run_all_processing:
+        chunk = perform_text_cleaning(chunk, verbose=False, normalizer=text_normalizer_for(args))
+    if args.run_price_model:
+        chunk = add_price_per_page(chunk)
+        summary.price_model = PriceModelStatistics().update(chunk)
+    if args.run_outlier_detection or args.run_all_processing:
+        if outlier_thresholds is None:
+            # Flags of a previous run are stale and must not be counted: the caller flags the rows again
+            chunk = chunk.drop(columns=OUTLIER_COLUMN, errors='ignore')
+            summary.outliers = OutlierStatistics(args.outlier_groups).update(chunk)
+        else:
+            chunk = flag_outliers(chunk, outlier_thresholds, args.outlier_groups)
+    summary.update_values(chunk)
+    return chunk, summary
+
+# --- Parallel mode (--workers N) ---
+# The data is split into partitions that run process_chunk in a pool of worker processes (pandas
+# holds the GIL, so threads would not help). Results are consumed in partition order, so the merged
+# data and statistics are the same on every run and for any number of workers.
+
+# Partitions per worker when splitting a loaded DataFrame: some slack so a slow partition does not
+# leave the other workers idle at the end.
+PARTITIONS_PER_WORKER = 4
+
+def process_partitions(partitions, args, workers, outlier_thresholds=None):
+    """
+    Yields process_chunk(partition, args, outlier_thresholds) for each partition, in input order,
+    using `workers` processes.
+    """
+    if workers <= 1:
+        for partition in partitions:
+            yield process_chunk(partition, args, outlier_thresholds)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for partition in partitions:
+            pending.append(pool.submit(process_chunk, partition, args, outlier_thresholds))
+            # At most 2 partitions per worker in flight: memory stays bounded when reading in chunks.
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def concat_partitions(frames):
+    """pd.concat that keeps category columns as category (union of the partitions' categories)."""
+    category_columns = [col for col in frames[0].columns if isinstance(frames[0][col].dtype, pd.CategoricalDtype)]
+    result = pd.concat([frame.drop(columns=category_columns) for frame in frames])
+    for col in category_columns:
+        # Categories read back from Parquet may be another string type than freshly processed ones
+        categories_dtype = frames[0][col].cat.categories.dtype
+        merged = pd.api.types.union_categoricals(
+            [frame[col] if frame[col].cat.categories.dtype == categories_dtype
+             else frame[col].cat.rename_categories(frame[col].cat.categories.astype(categories_dtype))
+             for frame in frames], ignore_order=True)
+        result[col] = pd.Series(merged, index=result.index)
+    return result[frames[0].columns]
+
+def process_dataframe_parallel(df, args):
+    """Runs the selected processing steps on a loaded DataFrame in args.workers processes."""
+    size = max(math.ceil(len(df) / (args.workers * PARTITIONS_PER_WORKER)), 1)
+    partitions = (df.iloc[start:start + size] for start in range(0, len(df), size))
+    summary = StreamSummary()
+    frames = []
+    for frame, partition_summary in process_partitions(partitions, args, args.workers):
+        frames.append(frame)
+        summary.merge(partition_summary)
+    return (concat_partitions(frames) if frames else df), summary
+
+def chunked_outlier_thresholds(csv_file, args):
+    """
+    First pass of the chunked outlier stage: processes only the columns the outlier statistics depend on
+    and merges the statistics of every chunk. The second pass flags each chunk with the thresholds.
+    """
+    needed = ['precio', 'precio_eur', 'nro_paginas', 'fecha_publicacion', CURRENCY_COLUMN] + args.outlier_groups
+    columns = [col for col in (args.columns or input_columns(csv_file)) if col in needed]
+    statistics = OutlierStatistics(args.outlier_groups)
+    first_pass_args = argparse.Namespace(**{**vars(args), 'run_price_model': False}) # Modeled in the second pass
+    chunks = iter_chunks(csv_file, args.chunksize, columns)
+    for _, chunk_summary in process_partitions(chunks, first_pass_args, args.workers):
+        statistics.merge(chunk_summary.outliers)
+    return statistics.thresholds()
+
+def analyze_book_prices_chunked(csv_file, args):
+    output_filename = args.output
+    summary = StreamSummary()
+    writer = ChunkWriter(output_filename) if args.save_processed_data else None
+    try:
+        outlier_thresholds = None
+        if args.run_outlier_detection or args.run_all_processing:
+            print("Computing the outlier statistics (first pass over the file)...")
+            outlier_thresholds = chunked_outlier_thresholds(csv_file, args)
+        chunks = iter_chunks(csv_file, args.chunksize, args.columns)
+        processed = process_partitions(chunks, args, args.workers, outlier_thresholds)
+        for chunk_number, (chunk, chunk_summary) in enumerate(processed):
+            summary.merge(chunk_summary)
+            if writer is not None:
+                writer.write(chunk)
+            print(f"Processed chunk {chunk_number + 1} ({summary.rows} rows so far).")
+    except FileNotFoundError:
+        print(f"Error: The file '{csv_file}' was not found.")
+        return
+    except Exception as e:
+        print(f"An critical error occurred during chunked analysis: {e}")
+        return
+    finally:
+        if writer is not None:
+            writer.close()
+
+    summary.report(args)
+    if summary.price_model is not None:
+        report_price_model(summary.price_model, args.price_summary)
+    if args.run_quality_checks or args.run_all_processing:
+        print("The dedup report (duplicate groups, similar titles) needs the full dataset and is not written "
+              "with --chunksize; run --run_quality_checks on the saved cleaned data instead.")
+    if args.run_text_cleaning or args.run_all_processing:
+        text_normalizer_for(args).save_cache()
+    if args.save_processed_data:
+        print(f"Successfully saved cleaned data to '{output_filename}'")
+    if args.run_eda_plots:
+        print("EDA plots need the full dataset and are not generated with --chunksize; "
+              "run them on the saved cleaned data instead.")
+    print("\nBook price analysis script execution finished.")
+
+# --- Incremental mode (--incremental STATE_DIR) ---
+# Keeps the previous runs' cleaned rows in a state directory, each with a hash of its raw values and
+# a key from codigo_isbn (plus its occurrence number, since a dump may repeat an ISBN). A new run hashes
+# the raw rows, compares them with the state and only processes the new and changed ones; unchanged rows
+# are taken from the state as they were cleaned, and rows no longer in the dump are dropped.
+# The state is a list of Feather segments, read once per run. A run appends one segment with its new and
+# changed rows, plus a copy of each removed row with REMOVED_ROW_HASH as a tombstone; for each key the
+# last segment wins. Once the segments hold twice the rows of the dump (or MAX_STATE_SEGMENTS files), the
+# live rows are rewritten as one segment, so writing the state costs O(changes) amortized. Reading and
+# hashing the dump and writing the output are still O(rows), but the processing steps cost O(changes).
+
+STATE_INFO_FILE = 'state.json'
+STATE_SEGMENT_FILE = 'segment-{:06d}.feather'
+STATE_COLUMNS = ['_key', '_row_hash']
+REMOVED_ROW_HASH = 0
+MAX_STATE_SEGMENTS = 32
+# Options that change the processed output: the state is only reused when they are the same (and so are
+# the text mapping and exchange rate files, see processing_fingerprint).
+PROCESSING_OPTIONS = ['run_type_conversions', 'run_data_imputation', 'run_price_conversion',
+                      'run_text_cleaning', 'run_all_processing', 'run_price_model', 'columns']
+
+def processing_fingerprint(args):
+    options = {name: getattr(args, name) for name in PROCESSING_OPTIONS}
+    if args.run_text_cleaning or args.run_all_processing:
+        options['text_mapping'] = text_normalizer_for(args).fingerprint
+    if args.run_price_conversion or args.run_all_processing:
+        options['exchange_rates'] = exchange_rates_for(args).fingerprint
+        options['price_currency'] = args.price_currency
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode()).hexdigest()
+
+# Masks that keep the first 0 to 8 bytes of a little-endian 64-bit word.
+WORD_MASKS = np.array([(1 << 8 * size) - 1 for size in range(9)], dtype=np.uint64)
+
+def column_hashes(series):
+    """
+    uint64 hash of each value of a column. Arrow strings are hashed on their buffers: the bytes of every
+    value are read as 8-byte words and folded into the hash of its length with pd.util.hash_array, one
+    word position at a time. Several times faster than hash_pandas_object, which hashes Python strings.
+    """
+    if not (isinstance(series.dtype, pd.StringDtype) and series.dtype.storage == 'pyarrow'):
+        return pd.util.hash_pandas_object(series, index=False, categorize=False).to_numpy()
+    import pyarrow as pa
+    values = pa.array(series.array)
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    values = values.cast(pa.large_binary())
+    offsets = np.frombuffer(values.buffers()[1], dtype=np.int64)[values.offset:values.offset + len(values) + 1]
+    data = values.buffers()[2]
+    padded = np.zeros((len(data) if data is not None else 0) + 8, dtype=np.uint8) # A word can start at any byte
+    if data is not None:
+        padded[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+    words = np.ndarray(shape=(len(padded) - 7,), dtype='<u8', buffer=padded, strides=(1,))
+    lengths = np.diff(offsets)
+    lengths[values.is_null().to_numpy(zero_copy_only=False)] = -1 # Missing is not ''
+    hashes = pd.util.hash_array(lengths)
+    starts = offsets[:-1]
+    for start in range(0, int(lengths.max(initial=0)), 8):
+        word = words[np.minimum(starts + start, len(words) - 1)] & WORD_MASKS[np.clip(lengths - start, 0, 8)]
+        hashes = pd.util.hash_array(hashes ^ word)
+    return hashes
+
+def row_keys(raw):
+    """
+    (key, row hash) arrays for the raw rows, before any processing step. The key hashes codigo_isbn and
+    its occurrence number, so keys are unique (up to 64-bit hash collisions) and can index the state.
+    """
+    # Each column is hashed once; the row hash and the key combine the uint64 column hashes, and the
+    # occurrence numbers group by the ISBN hash, much faster than grouping (factorizing) the strings again.
+    hashes = pd.DataFrame({col: column_hashes(raw[col]) for col in raw.columns})
+    row_hash = pd.util.hash_pandas_object(hashes, index=False).to_numpy()
+    row_hash = np.where(row_hash == REMOVED_ROW_HASH, np.uint64(1), row_hash) # Reserved for the tombstones
+    isbn_hash = hashes['codigo_isbn']
+    occurrence = isbn_hash.groupby(isbn_hash, sort=False).cumcount()
+    key = pd.util.hash_pandas_object(pd.DataFrame({'isbn': isbn_hash, 'occurrence': occurrence}), index=False).to_numpy()
+    return key, row_hash
+
+def load_state_info(state_dir):
+    try:
+        with open(os.path.join(state_dir, STATE_INFO_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def load_state(state_dir, info, fingerprint):
+    """
+    (rows of every segment, positions of the live ones) of the saved state, or (None, None) if there is
+    none or it was built with other options. Live rows are the last one of each key that is not a tombstone.
+    """
+    if not info.get('segments'):
+        return None, None
+    if info.get('fingerprint') != fingerprint:
+        print("Processing options or text mapping changed since the saved state: reprocessing every row.")
+        return None, None
+    segments = [pd.read_feather(os.path.join(state_dir, name)) for name in info['segments']]
+    state = apply_schema(concat_partitions(segments) if len(segments) > 1 else segments[0])
+    latest = ~pd.Index(state['_key'].to_numpy()).duplicated(keep='last')
+    live = np.flatnonzero(latest & (state['_row_hash'].to_numpy() != REMOVED_ROW_HASH))
+    return state, live
+
+def save_state(state_dir, info, segment, fingerprint, rows, stored_rows):
+    """
+    Appends `segment` to the state, or makes it the only segment when stored_rows (rows of the segments
+    before it) is 0. Segments left out of the new state are deleted once state.json no longer lists them.
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    number = info.get('next_segment', 0)
+    name = STATE_SEGMENT_FILE.format(number)
+    apply_schema(segment).reset_index(drop=True).to_feather(os.path.join(state_dir, name))
+    previous = info.get('segments', [])
+    segments = previous + [name] if stored_rows else [name]
+    info_path = os.path.join(state_dir, STATE_INFO_FILE)
+    with open(f"{info_path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump({'fingerprint': fingerprint, 'segments': segments, 'next_segment': number + 1,
+                   'rows': rows, 'stored_rows': stored_rows + len(segment),
+                   'updated': pd.Timestamp.now().isoformat()}, f)
+    os.replace(f"{info_path}.tmp", info_path)
+    for old in set(previous) - set(segments):
+        os.remove(os.path.join(state_dir, old))
+
+def analyze_book_prices_incremental(csv_file, args):
+    state_dir = args.incremental
+    # Dates stay as text until process_dates: the reader only parses them when every value is valid,
+    # so parsing there would make the raw hashes depend on the rest of the file.
+    raw = load_data(csv_file, args.columns, parse_dates=False)
+    if raw is None:
+        print("Exiting script due to data loading failure.")
+        return
+    if 'codigo_isbn' not in raw.columns:
+        print("Error: the incremental mode needs the 'codigo_isbn' column.")
+        return
+    key, row_hash = row_keys(raw)
+    fingerprint = processing_fingerprint(args)
+    if args.run_quality_checks or args.run_all_processing:
+        report_duplicates(raw, args.dedup_report, args.title_similarity) # Duplicates span old and new rows
+
+    info = load_state_info(state_dir)
+    state, live = load_state(state_dir, info, fingerprint)
+    if state is None:
+        positions = np.full(len(raw), -1)
+        live = np.empty(0, dtype=np.intp)
+    else:
+        # Row of the state for each row of the dump (-1 if new); live keys are unique, so no join is needed
+        found_live = pd.Index(state['_key'].to_numpy()[live]).get_indexer(key)
+        positions = np.where(found_live >= 0, live[found_live], -1)
+    found = positions >= 0
+    unchanged = found.copy()
+    if found.any():
+        unchanged[found] = state['_row_hash'].to_numpy()[positions[found]] == row_hash[found]
+    new_rows = int((~found).sum())
+    changed_rows = int(found.sum() - unchanged.sum())
+    removed_rows = len(live) - int(found.sum())
+    print(f"\n--- Incremental Run: {new_rows} new, {changed_rows} changed, {removed_rows} removed, "
+          f"{int(unchanged.sum())} unchanged rows ---")
+    if not len(raw):
+        print("The input is empty.")
+        return
+
+    processed = None
+    if not unchanged.all():
+        to_process = ~unchanged
+        processed, summary = process_dataframe_parallel(raw[to_process].reset_index(drop=True), args)
+        processed = apply_schema(processed)
+        processed['_key'] = key[to_process]
+        processed['_row_hash'] = row_hash[to_process]
+        summary.report(args)
+    # Output in the order of the dump: one take over the state rows followed by the processed ones.
+    order = positions.copy()
+    if processed is None:
+        result = state
+    else:
+        result = concat_partitions([state[processed.columns], processed]) if unchanged.any() else processed
+        order[~unchanged] = len(result) - len(processed) + np.arange(len(processed))
+    result = result.take(order).reset_index(drop=True)
+
+    if new_rows or changed_rows or removed_rows:
+        segment = processed
+        if removed_rows:
+            removed = np.setdiff1d(live, positions[found], assume_unique=True)
+            tombstones = state.iloc[removed][processed.columns if processed is not None else state.columns]
+            tombstones = tombstones.assign(_row_hash=np.uint64(REMOVED_ROW_HASH))
+            segment = concat_partitions([segment, tombstones]) if segment is not None else tombstones
+        stored_rows = info.get('stored_rows', 0) if state is not None else 0
+        if stored_rows + len(segment) > 2 * len(result) or len(info.get('segments', [])) >= MAX_STATE_SEGMENTS:
+            segment, stored_rows = result, 0 # Compaction: only the live rows are kept
+        save_state(state_dir, info, segment, fingerprint, len(result), stored_rows)
+        print(f"State with {len(result)} rows saved in '{state_dir}' ({len(segment)} rows written).")
+    else:
+        print(f"No changes since the previous run; state in '{state_dir}' left as is.")
+    if args.run_text_cleaning or args.run_all_processing:
+        text_normalizer_for(args).save_cache()
+    cleaned = result.drop(columns=STATE_COLUMNS)
+    if args.run_price_model:
+        # Summary of every row, not only the processed ones (the price per page column is in the state)
+        report_price_model(PriceModelStatistics().update(cleaned), args.price_summary)
+    if args.run_outlier_detection or args.run_all_processing:
+        # The flags depend on every row, so they are not kept in the state but recomputed on each run.
+        cleaned = detect_outliers(cleaned, args.outlier_groups)
+    if args.save_processed_data:
+        save_data(cleaned, args.output)
+    if args.run_eda_plots:
+        generate_and_save_plots(cleaned)
+    print("\nBook price analysis script execution finished.")
+
 def analyze_book_prices(df, args):
     try:
         log_initial_info(df)
 
-        output_filename = 'cleaned_dataset.csv' # Default output filename
+        output_filename = args.output
 
-        if args.run_all_processing:
+        if args.workers > 1:
+            if args.run_quality_checks or args.run_all_processing:
+                # Duplicates can span partitions: looked for on the whole frame, before splitting it.
+                report_duplicates(df, args.dedup_report, args.title_similarity)
+            # Per-stage reports are replaced by the merged statistics of all partitions.
+            print(f"\n--- Running Processing Steps on {args.workers} Workers ---")
+            df, summary = process_dataframe_parallel(df, args)
+            if summary.outliers is not None:
+                # Statistics merged from all partitions; the flags need them, so they are set here.
+                df = flag_outliers(df, summary.outliers.thresholds(), args.outlier_groups)
+                summary.outlier_flags.update(df[OUTLIER_COLUMN])
+            summary.report(args)
+            if summary.price_model is not None:
+                report_price_model(summary.price_model, args.price_summary)
+        elif args.run_all_processing:
             print("\n--- Running ALL Processing Steps ---")
-            check_data_quality(df)
+            check_data_quality(df, args.dedup_report, args.title_similarity)
             df = process_dates(df)
             # process_numeric_columns needs args for its internal imputation/conversion flags
             df = process_numeric_columns(df, args)
-            df = perform_text_cleaning(df)
+            df = perform_text_cleaning(df, normalizer=text_normalizer_for(args))
+            if args.run_price_model:
+                df = model_prices(df, args.price_summary)
+            df = detect_outliers(df, args.outlier_groups)
             print("\n--- ALL Processing Steps Complete ---")
         else:
             if args.run_quality_checks:
-                check_data_quality(df)
+                check_data_quality(df, args.dedup_report, args.title_similarity)
             if args.run_type_conversions: # This implies date conversion and initial numeric conversion
                 df = process_dates(df)
                 # Call process_numeric_columns but rely on its internal logic for what to do if specific sub-flags aren't set
@@ -315,7 +1774,15 @@ def analyze_book_prices(df, args):
                  df = process_numeric_columns(df, args)
 
             if args.run_text_cleaning:
-                df = perform_text_cleaning(df)
+                df = perform_text_cleaning(df, normalizer=text_normalizer_for(args))
+            if args.run_price_model:
+                df = model_prices(df, args.price_summary)
+            if args.run_outlier_detection:
+                df = detect_outliers(df, args.outlier_groups)
+        if args.run_text_cleaning or args.run_all_processing:
+            # Normalized category values are reused by the next run. With --workers each worker process
+            # has its own normalizer, so only single-process runs add new values to the cache.
+            text_normalizer_for(args).save_cache()
 
         if args.save_processed_data:
             save_data(df, output_filename)
@@ -332,22 +1799,94 @@ def analyze_book_prices(df, args):
 
 def main():
     parser = argparse.ArgumentParser(description='Clean, process, and analyze book price data from a CSV file.')
-    parser.add_argument('csv_file', type=str, help='Path to the CSV file to analyze')
+    parser.add_argument('csv_file', type=str,
+                        help='Path to the CSV, Parquet (.parquet) or Feather (.feather) file to analyze')
 
-    parser.add_argument('--run_quality_checks', action='store_true', help="Run data quality checks (empty rows, duplicates).")
+    parser.add_argument('--run_quality_checks', action='store_true', help="Run data quality checks (empty rows, duplicates; see --dedup_report).")
     parser.add_argument('--run_type_conversions', action='store_true', help="Run data type conversions (dates, initial numeric processing).")
     parser.add_argument('--run_data_imputation', action='store_true', help="Run data imputation for 'nro_paginas' (NaN to 0).")
-    parser.add_argument('--run_price_conversion', action='store_true', help="Run price conversion from ARS to EUR for 'precio'.")
+    parser.add_argument('--run_price_conversion', action='store_true',
+                        help="Convert 'precio' to EUR ('precio_eur') with the exchange rate of each book's publication date.")
     parser.add_argument('--run_text_cleaning', action='store_true', help="Run text cleaning operations.")
+    parser.add_argument('--run_outlier_detection', action='store_true',
+                        help=f"Flag unusual prices and page counts per group (IQR, MAD and z-score) in a '{OUTLIER_COLUMN}' column.")
+    parser.add_argument('--outlier_groups', type=lambda value: [col.strip() for col in value.split(',') if col.strip()],
+                        default=DEFAULT_OUTLIER_GROUPS,
+                        help=f"Comma-separated columns whose value combinations form the outlier groups "
+                             f"(default '{','.join(DEFAULT_OUTLIER_GROUPS)}').")
+    parser.add_argument('--run_price_model', action='store_true',
+                        help=f"Add the price per page ('{PRICE_PER_PAGE_COLUMN}') and write a summary of price quantiles, "
+                             f"price per page and a price-on-pages regression by {'/'.join(PRICE_SUMMARY_DIMENSIONS)} "
+                             "(see --price_summary). Needs numeric prices and pages (type conversions).")
+    parser.add_argument('--price_summary', default=DEFAULT_PRICE_SUMMARY,
+                        help=f"File where the price model writes its summary table (default '{DEFAULT_PRICE_SUMMARY}'; "
+                             ".parquet/.feather for columnar).")
     parser.add_argument('--run_eda_plots', action='store_true', help="Generate and save EDA plots.")
-    parser.add_argument('--save_processed_data', action='store_true', help="Save the processed DataFrame to CSV.")
+    parser.add_argument('--save_processed_data', action='store_true', help="Save the processed DataFrame (see --output).")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_FILENAME,
+                        help=f"File for --save_processed_data (default '{DEFAULT_OUTPUT_FILENAME}'). A .parquet or .feather "
+                             "extension writes a typed columnar file that later runs load without parsing text.")
+    parser.add_argument('--columns', type=lambda value: [col.strip() for col in value.split(',') if col.strip()],
+                        help="Comma-separated columns to load (e.g. 'precio,nro_paginas,categoria'); "
+                             "with Parquet/Feather input the other columns are not read from disk.")
 
+    parser.add_argument('--chunksize', type=int,
+                        help="Process the CSV in chunks of this many rows, keeping memory bounded (for files larger than RAM). "
+                             "Statistics are merged across chunks and the cleaned data is written incrementally.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Process partitions of the data (or the chunks, with --chunksize) in this many "
+                             "processes. Results are merged in partition order, so every run gives the same output.")
+    parser.add_argument('--text_mapping', default=DEFAULT_TEXT_MAPPING,
+                        help="JSON file with the text normalization rules (abbreviations, synonyms, accents); "
+                             "default: text_normalization.json next to this script.")
+    parser.add_argument('--text_cache', default=DEFAULT_TEXT_CACHE,
+                        help=f"Cache of normalized category values reused between runs (default '{DEFAULT_TEXT_CACHE}'). "
+                             "It is discarded automatically when the mapping file changes.")
+    parser.add_argument('--exchange_rates', default=DEFAULT_EXCHANGE_RATES,
+                        help="CSV with the dated exchange rates (date,currency,per_eur) used by the price conversion; "
+                             "default: exchange_rates.csv next to this script.")
+    parser.add_argument('--price_currency', type=str.upper, default=DEFAULT_PRICE_CURRENCY,
+                        help=f"Currency of 'precio' when the data has no '{CURRENCY_COLUMN}' column (default {DEFAULT_PRICE_CURRENCY}).")
+    parser.add_argument('--no_text_cache', action='store_true', help="Do not read or write the text normalization cache.")
+    parser.add_argument('--incremental', metavar='STATE_DIR',
+                        help="Keep the cleaned rows in STATE_DIR, keyed by 'codigo_isbn', and on later runs only process "
+                             "the rows that are new or changed since the previous run (requires pyarrow).")
+    parser.add_argument('--dedup_report', default=DEFAULT_DEDUP_REPORT,
+                        help=f"File where the quality checks write the duplicate groups (default '{DEFAULT_DEDUP_REPORT}'; "
+                             ".parquet/.feather for columnar).")
+    parser.add_argument('--title_similarity', type=float, default=DEFAULT_TITLE_SIMILARITY,
+                        help="Similarity (0-1, of the title trigrams) from which two titles by the same author are "
+                             f"reported as near-duplicates (default {DEFAULT_TITLE_SIMILARITY}).")
     parser.add_argument('--run_all_processing', action='store_true',
-                        help="Run all core data processing steps: quality checks, type conversions (dates & numeric), 'nro_paginas' imputation, 'precio' to EUR conversion, and text cleaning. This does NOT automatically save data or generate plots unless those specific flags are also set.")
+                        help="Run all core data processing steps: quality checks, type conversions (dates & numeric), 'nro_paginas' imputation, 'precio' to EUR conversion, text cleaning and outlier detection. This does NOT automatically save data or generate plots unless those specific flags are also set.")
 
     args = parser.parse_args()
+    if args.chunksize is not None and args.chunksize < 1:
+        parser.error("--chunksize must be a positive number of rows.")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1.")
+    if not args.outlier_groups:
+        parser.error("--outlier_groups needs at least one column.")
+    if not 0 < args.title_similarity <= 1:
+        parser.error("--title_similarity must be between 0 and 1.")
+    if args.no_text_cache:
+        args.text_cache = None
+    if args.incremental and args.chunksize:
+        parser.error("--incremental cannot be combined with --chunksize.")
+    if args.run_price_conversion or args.run_all_processing:
+        try:
+            exchange_rates_for(args)
+        except (OSError, ValueError) as e:
+            parser.error(f"Cannot load the exchange rates: {e}")
+
+    if args.chunksize:
+        analyze_book_prices_chunked(args.csv_file, args)
+        return
+    if args.incremental:
+        analyze_book_prices_incremental(args.csv_file, args)
+        return
 
-    df = load_data(args.csv_file)
+    df = load_data(args.csv_file, args.columns)
 
     if df is not None:
         analyze_book_prices(df, args)